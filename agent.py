@@ -1,10 +1,47 @@
-import openai
+import asyncio
+import contextlib
+import contextvars
+import copy
 import json
-import re
-import os
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator
 import xml_utils
 import uuid
+from clients import get_client_manager
+import tool_runner
+import tool_backends
+import request_template
+from tool_cache import get_tool_cache
+from concurrency import get_limiter
+from response_cache import get_response_cache, request_key
+from journal import Journal, replay
+from conversation import Conversation
+from history import TRUNCATION_MARKER
+from single_flight import get_single_flight
+from budget import RunCancelled, RunStopped
+import resilience
+import telemetry
+import streaming
+
+log = telemetry.logger
+
+# Servers only report token usage for a stream when asked (in a last chunk without choices)
+_STREAM_OPTIONS = {"include_usage": True}
+
+# Runs non-streamed LLM calls of sync agents with a cancel token, so the agent's
+# thread can stop waiting when the token is cancelled
+_call_executor: Optional[ThreadPoolExecutor] = None
+_call_executor_lock = threading.Lock()
+
+
+def _get_call_executor() -> ThreadPoolExecutor:
+    global _call_executor
+    with _call_executor_lock:
+        if _call_executor is None:
+            _call_executor = ThreadPoolExecutor(max_workers=256, thread_name_prefix="llm-call")
+        return _call_executor
 
 class Agent:
     """
@@ -12,6 +49,9 @@ class Agent:
     Designed to be run in parallel with other agent instances using thread pools.
     """
     
+    # Whether LLM calls can be hedged (needs the losing request to be cancellable)
+    _hedges = False
+    
     def __init__(
         self,
         messages,
@@ -20,7 +60,26 @@ class Agent:
         model,
         temperature,
         client = None,
-        system_message = "You are a helpful assistant. Use available tools when appropriate."
+        system_message = "You are a helpful assistant. Use available tools when appropriate.",
+        parallel_tools = True,
+        stop_after_tool_call = False,
+        tool_cache = None,
+        history = None,
+        lean_http = False,
+        tool_selector = None,
+        limiter = None,
+        call_timeout = None,
+        run_timeout = None,
+        retry = None,
+        hedge = None,
+        response_cache = None,
+        journal = None,
+        single_flight = None,
+        endpoints = None,
+        tool_messages = False,
+        max_tool_result_chars = None,
+        budget = None,
+        cancel_token = None
     ):
         """
         Initialize the agent with conversation context and configuration.
@@ -29,33 +88,650 @@ class Agent:
             messages: List of conversation messages
             tools: List of tool definitions
             tool_funcs: Dictionary of tool functions
-            model: Model name to use for completions
+            model: Model name to use for completions (None to use the server's default model)
             temperature: Temperature for model responses
-            client: OpenAI client instance (optional, will create default if not provided)
+            client: OpenAI client instance (optional, uses the shared pooled client if not provided)
             system_message: System message to prepend to conversation
+            parallel_tools: Run independent tool calls from one response concurrently
+                (tools declare their traits with tool_runner.tool_traits)
+            stop_after_tool_call: Send stop sequences so the server stops decoding as soon
+                as an XML tool call is closed (at most one XML call per turn)
+            tool_cache: ToolResultCache to memoize read-only tool results in, or True
+                for the process-wide shared cache (optional, off by default)
+            history: HistoryManager that keeps the conversation within a token budget
+                (optional, history grows without bound if not provided)
+            lean_http: Send pre-serialized request bodies straight over the client's
+                connection pool and parse the reply as plain JSON, skipping the SDK's
+                request validation and pydantic response objects
+            tool_selector: Function mapping the system message plus user message to the
+                subset of tools to send for that run, e.g. default_registry.selector()
+                (optional, every tool is sent if not provided)
+            limiter: AdaptiveLimiter gating in-flight completions, or True for the
+                process-wide limiter shared by all agents (optional, off by default)
+            call_timeout: Seconds allowed for each LLM call (optional)
+            run_timeout: Seconds allowed for a whole run; LLM calls are cut short and
+                no new turn starts once it has passed (optional)
+            retry: resilience.RetryPolicy for transient errors (connection resets, 429,
+                5xx), or True for the default policy (optional, no retries by default)
+            hedge: resilience.HedgePolicy sending a duplicate of a slow non-streamed call,
+                or True for the default p95 policy (AsyncAgent only, since a sync call
+                can't cancel the losing request; optional, off by default)
+            response_cache: ResponseCache to serve and record non-streamed completions
+                from, or True for the process-wide on-disk cache (optional, off by default)
+            journal: journal.Journal (or a path for one) to log the conversation and each
+                turn's progress to, so resume() can continue after a crash (optional)
+            single_flight: SingleFlight that lets identical concurrent non-streamed calls
+                share one completion, or True for the process-wide one (optional, off by default)
+            endpoints: EndpointPool to route each LLM call across several servers; the
+                conversation stays on one endpoint while it is healthy (optional, `client`
+                is used for every call if not provided)
+            tool_messages: Record tool turns as an assistant message with `tool_calls` plus
+                one `tool` message per result (XML calls get generated ids), instead of
+                a placeholder assistant message and the results as user prose
+            max_tool_result_chars: Longest tool result put into the conversation; longer
+                results are truncated with a marker (optional, tools can set their own
+                limit with max_result_chars)
+            budget: budget.RunBudget limiting each run's turns, tokens, tool calls and time;
+                a run that reaches a limit raises BudgetExceeded (optional)
+            cancel_token: budget.CancelToken through which other code can stop the agent's
+                runs; a cancelled run raises RunCancelled (optional). With a token, sync
+                non-streamed calls are made as streams (and not over lean_http) so a
+                cancelled call can close its request
+        
+        After each run `status` says how it ended: "completed", "max_turns", "max_tokens",
+        "max_tool_calls", "timeout", "cancelled" or "error".
         """
-        self.messages = messages.copy() if messages else []
+        self.messages = Conversation(messages or ())
         self.tools = tools
         self.tool_funcs = tool_funcs
         self.model = model
         self.temperature = temperature
-        self.client = client or openai.OpenAI(
-            base_url="http://localhost:1234/v1",
-            api_key="lm-studio"
-        )
+        self.parallel_tools = parallel_tools
+        self.stop_after_tool_call = stop_after_tool_call
+        self.tool_cache = get_tool_cache() if tool_cache is True else tool_cache
+        self.history = history
+        self.lean_http = lean_http
+        self.tool_selector = tool_selector
+        self.limiter = get_limiter() if limiter is True else (limiter or None)
+        self.call_timeout = call_timeout
+        self.run_timeout = run_timeout
+        self.retry = resilience.RetryPolicy() if retry is True else retry
+        if hedge and not self._hedges:
+            raise ValueError("hedge needs an AsyncAgent: a sync call can't cancel the losing request")
+        self.hedge = resilience.HedgePolicy() if hedge is True else hedge
+        self._deadline = resilience.Deadline(None)
+        self._request_client_cache = {}
+        self._run_span = None
+        self.response_cache = get_response_cache() if response_cache is True else response_cache
+        self.journal = Journal(journal) if isinstance(journal, str) else journal
+        self.single_flight = get_single_flight() if single_flight is True else single_flight
+        self.endpoints = endpoints
+        self.tool_messages = tool_messages
+        self.max_tool_result_chars = max_tool_result_chars
+        self.budget = budget
+        self.cancel_token = cancel_token
+        self.status = None
+        # Turns, tool calls and tokens of the current (or last) run
+        self.run_usage = {"turns": 0, "tool_calls": 0, "tokens": 0}
+        # Keeps this conversation on one endpoint of the pool
+        self._conversation_id = uuid.uuid4()
+        # The message list (and its length) the journal last recorded
+        self._journal_list = None
+        self._journal_len = 0
+        self._request_tools = tools
+        self._compiled = None
+        self._compiled_key = None
+        # Token usage summed over every completion this agent has made
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0}
+        self.client = client or self._default_client()
         
         # Add system message if not already present
         if not self.messages or self.messages[0].get("role") != "system":
             self.messages.insert(0, {"role": "system", "content": system_message})
     
     def execute_function(self, function_name, arguments):
-        if function_name in self.tool_funcs:
-            result = self.tool_funcs[function_name](arguments)
-        else:
-            print(f"Unknown function: {function_name}")
-            return "Unknown function"
-        return result
+        if self.cancel_token is None:
+            return self._execute_function(function_name, arguments)
+        event = tool_backends.cancel_event.get()
+        if event is not None:
+            # A caller (e.g. a streaming dispatcher) already cancels the call
+            # through its own event; have the cancel token set that one too
+            remove = self.cancel_token.add_callback(event.set)
+            try:
+                return self._execute_function(function_name, arguments)
+            finally:
+                remove()
+        # Let the cancel token stop the call in its tool backend
+        token = tool_backends.cancel_event.set(self.cancel_token.event)
+        try:
+            return self._execute_function(function_name, arguments)
+        finally:
+            tool_backends.cancel_event.reset(token)
+
+    def _execute_function(self, function_name, arguments):
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+        run_span = self._run_span
+        agent_id = run_span.attributes.get("agent_id") if run_span is not None else None
+        with telemetry.span("tool_call", run_span, tool=function_name, agent_id=agent_id) as span:
+            if function_name in self.tool_funcs:
+                func = self.tool_funcs[function_name]
+                if self.tool_cache is not None:
+                    result = self.tool_cache.call(function_name, func, arguments)
+                else:
+                    result = func(arguments)
+            else:
+                log.warning("Unknown function: %s", function_name)
+                result = "Unknown function"
+            if isinstance(result, str) and (result.startswith("Error") or result == "Unknown function"):
+                # Tools report failures as text; count them as errors all the same
+                span.status = "error"
+            return result
     
+    def _default_client(self):
+        """Return the shared pooled client used when none is passed in."""
+        return get_client_manager().client()
+
+    def _resolve_model(self):
+        """Fill in the model from the shared (cached) model list if unset."""
+        if self.model is None:
+            self.model = self.endpoints.get_model() if self.endpoints is not None else get_client_manager().get_model()
+
+    def _completion_kwargs(self) -> Dict[str, Any]:
+        """
+        Build the keyword arguments for a chat completion request,
+        compacting the conversation first if a history manager is set.
+        """
+        if self.history is not None:
+            self.messages = self.history.compact(self.messages)
+        self.usage["llm_calls"] += 1
+        kwargs = dict(
+            model=self.model,
+            messages=list(self.messages),
+            tools=self._request_tools,
+            tool_choice="auto",
+            temperature=self.temperature
+        )
+        if self.stop_after_tool_call:
+            kwargs["stop"] = list(xml_utils.TOOL_CALL_STOP_SEQUENCES)
+        return kwargs
+
+    def _llm_slot(self, timeout: Optional[float] = None):
+        """
+        Context manager holding a slot in the shared concurrency limiter, if any;
+        waiting longer than `timeout` for it raises DeadlineExceeded.
+        """
+        return self.limiter.slot(timeout) if self.limiter is not None else contextlib.nullcontext()
+
+    def _report_tokens(self, sample, response):
+        """Tell the limiter how many tokens the call in its slot generated, so it can judge latency per token."""
+        if sample is not None:
+            tokens = self._usage_tokens(response)
+            sample.tokens = tokens[1] if tokens is not None else None
+
+    def _request_client(self, client):
+        """
+        The client to send completions with. When the agent has its own retry
+        policy the SDK's built-in retries are turned off so attempts don't multiply.
+        """
+        if self.retry is None:
+            return client
+        cached = self._request_client_cache.get(id(client))
+        if cached is None or cached[0] is not client:
+            cached = self._request_client_cache[id(client)] = (client, client.with_options(max_retries=0))
+        return cached[1]
+
+    @contextlib.contextmanager
+    def _routed_client(self):
+        """
+        Context manager yielding the client for one LLM call: the agent's own, or
+        that of the endpoint the pool picks (which is told how the call went).
+        """
+        if self.endpoints is None:
+            yield self.client
+            return
+        with self.endpoints.request(self.model, self._conversation_id) as endpoint:
+            yield self._endpoint_client(endpoint)
+
+    def _endpoint_client(self, endpoint):
+        return endpoint.manager.client()
+
+    def _timeout_kwargs(self, timeout) -> Dict[str, Any]:
+        return {"timeout": timeout} if timeout is not None else {}
+
+    def _create_completion(self):
+        """
+        Request one (non-streamed) completion for the current conversation,
+        applying the agent's timeouts, retry policy and hedging.
+        """
+        if self.cancel_token is not None and not self._coalesce():
+            kwargs = self._completion_kwargs()
+            request = lambda client, timeout: self._collect_stream(client, kwargs, timeout)
+        elif self.lean_http:
+            body = self._compiled_body()
+            request = lambda client, timeout: request_template.post_completion(client, body, timeout)
+        else:
+            kwargs = self._completion_kwargs()
+            request = lambda client, timeout: self._request_client(client).chat.completions.create(
+                **kwargs, **self._timeout_kwargs(timeout))
+
+        def attempt(timeout):
+            # Time spent waiting for a limiter slot counts against the call's timeout
+            call_deadline = resilience.Deadline(timeout, "Call")
+            with self._llm_slot(timeout) as sample, self._routed_client() as client:
+                with self._llm_span(self._run_span) as call_span:
+                    response = request(client, call_deadline.remaining())
+                    self._report_tokens(sample, response)
+                    self._finish_call_span(call_span, response)
+                    return response
+
+        call = lambda: resilience.call_with_resilience(attempt, self.call_timeout, self._deadline, self.retry)
+        key = self._request_key()
+        if self._coalesce():
+            send = call
+            call = lambda: self.single_flight.do(key, send, self._deadline.remaining())
+        if self.response_cache is None:
+            return call()
+        return self.response_cache.fetch(key, call)
+
+    def _collect_stream(self, client, kwargs, timeout):
+        """
+        Make a cancellable call: stream the completion and read it into the dict
+        a non-streamed request returns, checking the cancel token on every chunk.
+        A cancelled call closes its connection, so the server stops generating.
+        (A coalesced call is shared with other agents and is never streamed.)
+        """
+        call_deadline = resilience.Deadline(timeout, name="Call")
+
+        def check():
+            self.cancel_token.check()
+            call_deadline.check()
+
+        stream = self._request_client(client).chat.completions.create(
+            **kwargs, stream=True, stream_options=_STREAM_OPTIONS, **self._timeout_kwargs(timeout))
+        with stream:
+            return streaming.collect_completion(stream, check)
+
+    def _request_key(self) -> Optional[str]:
+        """Key of the request about to be sent, if the response cache or single-flight needs it."""
+        if self.response_cache is None and self.single_flight is None:
+            return None
+        return self._cache_key()
+
+    def _coalesce(self) -> bool:
+        """True if this call should go through single-flight (depends on its temperature)."""
+        return self.single_flight is not None and self.single_flight.applies(self.temperature)
+
+    def _cache_key(self) -> str:
+        """Response cache key for the request about to be sent (after history compaction)."""
+        stop = list(xml_utils.TOOL_CALL_STOP_SEQUENCES) if self.stop_after_tool_call else None
+        return request_key(self.model, self.messages, self._request_tools,
+                           tool_choice="auto", temperature=self.temperature, stop=stop)
+
+    def _compiled_body(self) -> bytes:
+        """Build the request body through the agent's compiled request template."""
+        kwargs = self._completion_kwargs()
+        # Every field but the messages is baked into the compiled prefix
+        key = {name: value for name, value in kwargs.items() if name != "messages"}
+        if self._compiled is None or self._compiled_key != key:
+            static_fields = {"stop": kwargs["stop"]} if "stop" in kwargs else {}
+            self._compiled = request_template.CompiledRequest(self.model, self._request_tools, self.temperature, **static_fields)
+            self._compiled_key = key
+        return self._compiled.body(self.messages)
+
+    @staticmethod
+    def _usage_tokens(response):
+        """(prompt_tokens, completion_tokens) a completion or stream chunk reports, or None."""
+        usage = response.get('usage') if isinstance(response, dict) else getattr(response, 'usage', None)
+        if not usage:
+            return None
+        if isinstance(usage, dict):
+            return usage.get('prompt_tokens') or 0, usage.get('completion_tokens') or 0
+        return usage.prompt_tokens or 0, usage.completion_tokens or 0
+
+    def _record_usage(self, response, span=None):
+        """
+        Add a completion's (or stream chunk's) reported token usage to self.usage,
+        and to the LLM call span if one is given.
+        """
+        tokens = self._usage_tokens(response)
+        if tokens is None:
+            return
+        prompt_tokens, completion_tokens = tokens
+        self.usage["prompt_tokens"] += prompt_tokens
+        self.usage["completion_tokens"] += completion_tokens
+        self.run_usage["tokens"] += prompt_tokens + completion_tokens
+        if span is not None:
+            span.add("prompt_tokens", prompt_tokens)
+            span.add("completion_tokens", completion_tokens)
+
+    def _llm_span(self, run_span, stream: bool = False):
+        """
+        Context manager timing one LLM call as a child span of the run. It is
+        opened once the limiter slot is held, so it covers only the request;
+        responses served by the response cache or single-flight get no span.
+        """
+        return telemetry.span("llm_call", run_span, agent_id=run_span.attributes["agent_id"],
+                              model=self.model, stream=stream)
+
+    def _run_span_for(self, agent_id, user_message: str, stream: bool = False):
+        """Context manager timing a whole run."""
+        return telemetry.span("agent_run", agent_id=str(agent_id), model=self.model, stream=stream,
+                              user_message_chars=len(user_message))
+
+    def _finish_call_span(self, call_span, response):
+        """Put a completion's reported token usage on its LLM call span."""
+        tokens = self._usage_tokens(response)
+        if tokens is not None:
+            call_span.set(prompt_tokens=tokens[0], completion_tokens=tokens[1])
+        telemetry.finish_llm_span(call_span)
+
+    @staticmethod
+    def _finish_stream_span(call_span, content_parts, first_token_time):
+        """Fill in TTFT and tokens/sec for a streamed call."""
+        if not call_span.attributes.get("completion_tokens") and content_parts:
+            # The server reported no usage; each content delta is about one token
+            call_span.set(completion_tokens=len(content_parts), completion_tokens_estimated=True)
+        telemetry.finish_llm_span(call_span, first_token_time)
+
+    def _parse_response(self, response):
+        """
+        Extract the assistant content and any tool calls from a completion.
+
+        Returns:
+            Tuple of (content, tool_calls) where tool_calls is a list of
+            dicts with 'id', 'name', 'arguments' and 'raw_args' keys
+        """
+        # Handle both dict (lean HTTP path) and object response formats
+        if isinstance(response, dict):
+            choice = response['choices'][0]
+            message = choice.get('message') or {}
+            finish_reason = choice.get('finish_reason')
+            ai_content = message.get('content') or ''
+            raw_tool_calls = [
+                (tool_call.get('id'), tool_call['function']['name'], tool_call['function'].get('arguments'))
+                for tool_call in message.get('tool_calls') or []
+            ]
+        else:
+            choice = response.choices[0]
+            message = choice.message
+            finish_reason = getattr(choice, 'finish_reason', None)
+            ai_content = message.content or ''
+            raw_tool_calls = [
+                (tool_call.id, tool_call.function.name, tool_call.function.arguments)
+                for tool_call in message.tool_calls or []
+            ]
+        
+        # Handle standard OpenAI tool calls (from message.tool_calls)
+        all_tool_calls = []
+        for call_id, name, raw_args in raw_tool_calls:
+            try:
+                # Parse JSON arguments if they exist
+                args = json.loads(raw_args) if raw_args else {}
+            except json.JSONDecodeError:
+                # Fallback to XML parsing if JSON fails
+                args = xml_utils.parse_xml_parameters(raw_args)
+            
+            all_tool_calls.append({
+                'id': call_id,
+                'name': name,
+                'arguments': args,
+                'raw_args': raw_args
+            })
+        
+        # Check for XML tool calls in the content (fallback)
+        if not all_tool_calls:
+            all_tool_calls = self._xml_tool_calls(ai_content, finish_reason)
+        
+        return ai_content, all_tool_calls
+
+    def _start_run(self, user_message: str):
+        """Add the user message, start the run deadline and pick the tools to send for this run."""
+        self._begin_run(user_message)
+        self.messages.append({"role": "user", "content": user_message})
+        self._checkpoint("run", user_message=user_message)
+
+    def _begin_run(self, user_message: str):
+        self.status = "running"
+        self.run_usage = {"turns": 0, "tool_calls": 0, "tokens": 0}
+        run_seconds = [limit for limit in (self.run_timeout, self.budget and self.budget.max_seconds) if limit is not None]
+        self._deadline = resilience.Deadline(min(run_seconds) if run_seconds else None)
+        if self.tool_selector is not None:
+            first = self.messages[0]
+            system_message = (first.get("content") or "") if first.get("role") == "system" else ""
+            self._request_tools = self.tool_selector(f"{system_message}\n{user_message}")
+
+    @contextlib.contextmanager
+    def _run_status(self):
+        """
+        Set `status` from how the run inside ends. Errors caused by the cancel
+        token become RunCancelled, and timeouts once the run deadline has passed
+        become DeadlineExceeded.
+        """
+        try:
+            yield
+        except RunStopped as e:
+            self.status = e.status
+            raise
+        except resilience.DeadlineExceeded:
+            self.status = "timeout"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            self.status = "cancelled"
+            raise
+        except BaseException as e:
+            if self.cancel_token is not None and self.cancel_token.cancelled:
+                self.status = "cancelled"
+                raise RunCancelled(self.cancel_token.reason) from e
+            if self._deadline.expired() and resilience.is_timeout_error(e):
+                # The call was cut short by the run's time limit, not by a slow server
+                self.status = "timeout"
+                raise resilience.DeadlineExceeded("Run deadline exceeded") from e
+            self.status = "error"
+            raise
+        self.status = "completed"
+
+    def _cancellable_call(self, call):
+        """
+        Return `call()`, or raise RunCancelled as soon as the cancel token is
+        cancelled. With a token the call runs on a worker thread, since a thread
+        blocked on an HTTP read can't be interrupted. The call is streamed
+        (see _collect_stream), so the worker closes the request at its next
+        chunk; a coalesced call is left to finish for the agents sharing it.
+        """
+        if self.cancel_token is None:
+            return call()
+        self.cancel_token.check()
+        finished = threading.Event()
+        future = _get_call_executor().submit(contextvars.copy_context().run, call)
+        future.add_done_callback(lambda _: finished.set())
+        remove = self.cancel_token.add_callback(finished.set)
+        try:
+            finished.wait()
+        finally:
+            remove()
+        if not future.done():
+            future.cancel()
+            raise RunCancelled(self.cancel_token.reason)
+        return future.result()
+
+    def _check_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+
+    def _start_turn(self, run_span):
+        """Check the cancel token and the run's budget, then count another LLM turn."""
+        self._check_cancelled()
+        if self.budget is not None:
+            self.budget.check_turn(self.run_usage["turns"], self.run_usage["tokens"])
+        self.run_usage["turns"] += 1
+        run_span.add("turns", 1)
+
+    def _start_tool_calls(self, count: int):
+        """Check the cancel token and the run's budget, then count `count` more tool calls."""
+        self._check_cancelled()
+        if self.budget is not None:
+            self.budget.check_tool_calls(self.run_usage["tool_calls"], count)
+        self.run_usage["tool_calls"] += count
+
+    def _checkpoint(self, record_type: str, sync: bool = False, **fields):
+        """Write a progress record to the journal, if any, after any new messages."""
+        if self.journal is None:
+            return
+        if record_type in ("run", "turn", "final"):
+            if self.messages is not self._journal_list or len(self.messages) < self._journal_len:
+                # First record, or the conversation was replaced (e.g. compacted)
+                self.journal.write("messages", messages=self.messages)
+            else:
+                for message in self.messages[self._journal_len:]:
+                    self.journal.write("message", message=message)
+            self._journal_list = self.messages
+            self._journal_len = len(self.messages)
+        self.journal.write(record_type, sync=sync, **fields)
+
+    def _load_journal(self, journal):
+        """Restore the conversation from a journal and keep journaling to it."""
+        if journal is not None:
+            self.journal = Journal(journal) if isinstance(journal, str) else journal
+        if self.journal is None:
+            raise ValueError("No journal to resume from")
+        state = replay(self.journal.records())
+        if state.messages:
+            self.messages = state.messages
+            self._journal_list = self.messages
+            self._journal_len = len(self.messages)
+        return state
+
+    @staticmethod
+    def _pending_turn(state):
+        """(content, tool_calls, results) of a turn the journal recorded a model reply for but didn't finish."""
+        if state.response is None:
+            return None
+        return state.response["content"], state.response["tool_calls"], state.tool_results
+
+    def _stopped_at_tool_call(self, finish_reason) -> bool:
+        """True if generation ended on one of our tool call stop sequences."""
+        return self.stop_after_tool_call and finish_reason == "stop"
+
+    def _xml_tool_calls(self, ai_content: str, finish_reason=None) -> List[Dict[str, Any]]:
+        """Parse XML-style tool calls embedded in the response content."""
+        if not ai_content or xml_utils.FUNCTION_OPEN not in ai_content:
+            return []
+        parser = xml_utils.XmlToolCallParser()
+        xml_tool_calls = parser.feed(ai_content)
+        if self._stopped_at_tool_call(finish_reason):
+            xml_tool_calls += parser.close()
+        return [self._from_xml_call(xml_call) for xml_call in xml_tool_calls]
+
+    @staticmethod
+    def _from_xml_call(xml_call) -> Dict[str, Any]:
+        return {
+            'name': xml_call['name'],
+            'arguments': xml_call['arguments'],
+            'raw_args': str(xml_call['arguments'])
+        }
+
+    def _finish(self, ai_content: str) -> str:
+        """Record the final assistant response and return it."""
+        final_response = ai_content or "I've completed the requested task."
+        self.messages.append({"role": "assistant", "content": final_response})
+        self._checkpoint("final", sync=True, content=final_response)
+        return final_response
+
+    def _log_tool_calls(self, all_tool_calls):
+        log.info("🔧 Tool calls detected: %d", len(all_tool_calls))
+        if self._run_span is not None:
+            self._run_span.add("tool_calls", len(all_tool_calls))
+        for tool_call in all_tool_calls:
+            func_name = tool_call['name']
+            args = tool_call['arguments']
+            raw_args = tool_call.get('raw_args', args)
+            
+            log.info("📞 Function: %s", func_name)
+            log.debug("   Raw arguments: %s", raw_args)
+            log.debug("   Parsed arguments: %s", args)
+
+    def _execute_tool_calls(self, all_tool_calls) -> List[Any]:
+        """Execute a turn's tool calls, returning results in call order."""
+        if not self.parallel_tools:
+            return [self.execute_function(call['name'], call['arguments']) for call in all_tool_calls]
+        return tool_runner.execute_tool_calls(all_tool_calls, self.execute_function, self.tool_funcs)
+
+    def _log_tool_results(self, all_tool_calls, tool_results):
+        for tool_call, result in zip(all_tool_calls, tool_results):
+            log.debug("   ✅ %s Result: %s", tool_call['name'], result)
+
+    def _tool_result_text(self, tool_call, result) -> str:
+        """A tool result as conversation text, truncated to the tool's (or agent's) size limit."""
+        text = str(result)
+        func = self.tool_funcs.get(tool_call['name'])
+        limit = getattr(func, 'max_result_chars', None) or self.max_tool_result_chars
+        if limit is not None and len(text) > limit:
+            text = text[:limit] + TRUNCATION_MARKER.format(count=len(text) - limit)
+        return text
+
+    @staticmethod
+    def _tool_call_message(tool_call, default_id: str) -> Dict[str, Any]:
+        """A parsed tool call in the `tool_calls` format of an assistant message."""
+        raw_args = tool_call.get('raw_args')
+        if tool_call.get('id') and isinstance(raw_args, str) and raw_args:
+            # Send back the arguments exactly as the model produced them
+            arguments = raw_args
+        else:
+            arguments = json.dumps(tool_call['arguments'], ensure_ascii=False)
+        return {
+            'id': tool_call.get('id') or default_id,
+            'type': 'function',
+            'function': {'name': tool_call['name'], 'arguments': arguments}
+        }
+
+    def _append_tool_results(self, ai_content: str, all_tool_calls, tool_results: List[Any]):
+        """Add the tool call turn and its results to the conversation."""
+        results = [self._tool_result_text(tool_call, result) for tool_call, result in zip(all_tool_calls, tool_results)]
+        if self.tool_messages:
+            self._append_tool_messages(ai_content, all_tool_calls, results)
+            return
+        
+        # Create tool results message
+        tool_results_content = ""
+        if results:
+            if len(results) == 1 and "Weather in" in results[0]:
+                tool_results_content = f"I called the weather function and got: {results[0]}"
+            elif len(results) == 1 and ("Contents of" in results[0] or "Error" in results[0]):
+                tool_results_content = f"I listed the files and found: {results[0]}"
+            elif len(results) == 1 and ("Successfully saved" in results[0] or "Error" in results[0]):
+                tool_results_content = f"I saved the file: {results[0]}"
+            elif len(results) == 1 and ("Successfully read" in results[0] or "Error" in results[0]):
+                tool_results_content = f"I read the file: {results[0]}"
+            else:
+                tool_results_content = f"I called the functions and got: {', '.join(results)}"
+        
+        # Add the assistant's tool call message to conversation
+        self.messages.append({"role": "assistant", "content": ai_content or "[Tool call made]"})
+        
+        # Add tool results as a user message to continue the conversation
+        self.messages.append({"role": "user", "content": tool_results_content})
+        self._checkpoint("turn")
+        
+        log.debug("🔄 Continuing conversation with tool results: %s", tool_results_content)
+
+    def _append_tool_messages(self, ai_content: str, all_tool_calls, results: List[str]):
+        """Add the tool call turn as an assistant `tool_calls` message and one `tool` message per result."""
+        # Calls without an id (XML calls) are numbered by position, so the same conversation
+        # always gets the same ids and replays from a response cache still match
+        position = len(self.messages)
+        tool_calls = [self._tool_call_message(tool_call, f"call_{position}_{index}")
+                      for index, tool_call in enumerate(all_tool_calls)]
+        if ai_content and xml_utils.FUNCTION_OPEN in ai_content:
+            # XML calls now travel as tool_calls; don't send them twice
+            ai_content = xml_utils.strip_xml_tool_calls(ai_content)
+        self.messages.append({"role": "assistant", "content": ai_content or None, "tool_calls": tool_calls})
+        for tool_call, result in zip(tool_calls, results):
+            self.messages.append({"role": "tool", "tool_call_id": tool_call['id'], "content": result})
+        self._checkpoint("turn")
+        
+        log.debug("🔄 Continuing conversation with %d tool results", len(results))
+
     def run(self, user_message: str) -> str:
         """
         Run the agent with a user message and return the response.
@@ -67,123 +743,592 @@ class Agent:
         Returns:
             The agent's final response after processing all tool calls
         """
-        import time
         agent_id = uuid.uuid4()  # Simple agent ID for logging
-        print(f"🤖 Agent {agent_id} started: {user_message}")
+        log.info("🤖 Agent %s started: %s", agent_id, user_message)
+        self._resolve_model()
         
-        # Add user message to conversation
-        self.messages.append({"role": "user", "content": user_message})
+        with self._run_status(), self._run_span_for(agent_id, user_message) as run_span:
+            self._run_span = run_span
+            # Add user message to conversation
+            self._start_run(user_message)
+            return self._run_turns(agent_id, run_span)
+
+    def resume(self, journal = None) -> Optional[str]:
+        """
+        Restore the conversation from a journal and finish the run it was in.
+        A turn whose model reply was journaled is completed from the journal
+        (re-running its tools only if their results weren't recorded), so no
+        finished turn is sent to the model again.
+        
+        Args:
+            journal: Journal or path to resume from (defaults to the agent's own);
+                the agent keeps journaling to it
+            
+        Returns:
+            The run's final response (None if the journal holds no run)
+        """
+        state = self._load_journal(journal)
+        if not state.in_run:
+            return state.final
+        agent_id = uuid.uuid4()
+        log.info("♻️ Agent %s resuming: %s", agent_id, state.user_message)
+        self._resolve_model()
         
+        with self._run_status(), self._run_span_for(agent_id, state.user_message) as run_span:
+            self._run_span = run_span
+            self._begin_run(state.user_message)
+            return self._run_turns(agent_id, run_span, self._pending_turn(state))
+
+    def _run_turns(self, agent_id, run_span, pending = None) -> str:
+        """
+        Call the model and its tools until it replies without tool calls.
+        `pending` is a partly finished turn from resume() to complete first.
+        """
         # Loop until we get a response without tool calls
         while True:
-            print(f"📡 Agent {agent_id} making LLM call")
-            llm_start = time.time()
-            
-            # Get response from model
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=self.messages,
-                tools=self.tools,
-                tool_choice="auto",
-                temperature=self.temperature
-            )
-            
-            llm_time = time.time() - llm_start
-            print(f"✅ Agent {agent_id} LLM response received in {llm_time:.2f}s")
-
-            # Handle both dict and object response formats
-            message = response.choices[0].message
-            if hasattr(message, 'content'):
-                ai_content = message.content or ''
+            if pending is not None:
+                (ai_content, all_tool_calls, tool_results), pending = pending, None
             else:
-                ai_content = message.get('content', '') if isinstance(message, dict) else ''
-            
-            # Check for both standard OpenAI tool calls and XML tool calls
-            all_tool_calls = []
-            
-            # Handle standard OpenAI tool calls (from message.tool_calls)
-            if hasattr(message, 'tool_calls') and message.tool_calls:
-                for tool_call in message.tool_calls:
-                    try:
-                        # Parse JSON arguments if they exist
-                        args = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
-                    except json.JSONDecodeError:
-                        # Fallback to XML parsing if JSON fails
-                        args = xml_utils.parse_xml_parameters(tool_call.function.arguments) if tool_call.function.arguments else {}
-                    
-                    all_tool_calls.append({
-                        'name': tool_call.function.name,
-                        'arguments': args,
-                        'raw_args': tool_call.function.arguments
-                    })
-            
-            # Check for XML tool calls in the content (fallback)
-            elif ai_content and xml_utils.contains_xml_tool_call(ai_content):
-                xml_tool_calls = xml_utils.parse_xml_tool_calls_from_content(ai_content)
-                for xml_call in xml_tool_calls:
-                    all_tool_calls.append({
-                        'name': xml_call['name'],
-                        'arguments': xml_call['arguments'],
-                        'raw_args': str(xml_call['arguments'])
-                    })
+                log.info("📡 Agent %s making LLM call", agent_id)
+                self._start_turn(run_span)
+                
+                # Get response from model
+                started = time.monotonic()
+                response = self._cancellable_call(self._create_completion)
+                self._record_usage(response)
+                
+                log.info("✅ Agent %s LLM response received in %.2fs", agent_id, time.monotonic() - started)
+                ai_content, all_tool_calls = self._parse_response(response)
+                self._checkpoint("response", content=ai_content, tool_calls=all_tool_calls)
+                tool_results = None
             
             # If no tool calls, we're done - return the final response
             if not all_tool_calls:
-                # Add the final assistant response to conversation
-                final_response = ai_content or "I've completed the requested task."
-                self.messages.append({"role": "assistant", "content": final_response})
-                return final_response
-            
-            # Process tool calls
-            print(f"🔧 Tool calls detected: {len(all_tool_calls)}")
-            
-            # Print tool call info first
-            for tool_call in all_tool_calls:
-                func_name = tool_call['name']
-                args = tool_call['arguments']
-                raw_args = tool_call.get('raw_args', args)
+                return self._finish(ai_content)
+            
+            if tool_results is None:
+                # Process tool calls
+                self._start_tool_calls(len(all_tool_calls))
+                self._log_tool_calls(all_tool_calls)
                 
-                print(f"📞 Function: {func_name}")
-                print(f"   Raw arguments: {raw_args}")
-                print(f"   Parsed arguments: {args}")
-            
-            # Execute all tool calls sequentially
-            print(f"⏱️ Executing {len(all_tool_calls)} tool calls...")
-            
-            tool_results = []
-            for tool_call in all_tool_calls:
-                func_name = tool_call['name']
-                args = tool_call['arguments']
-                result = self.execute_function(func_name, args)
-                tool_results.append(result)
-                print(f"   ✅ {func_name} Result: {result}")
-            
-            # Create tool results message
-            tool_results_content = ""
-            if tool_results:
-                if len(tool_results) == 1 and "Weather in" in tool_results[0]:
-                    tool_results_content = f"I called the weather function and got: {tool_results[0]}"
-                elif len(tool_results) == 1 and ("Contents of" in tool_results[0] or "Error" in tool_results[0]):
-                    tool_results_content = f"I listed the files and found: {tool_results[0]}"
-                elif len(tool_results) == 1 and ("Successfully saved" in tool_results[0] or "Error" in tool_results[0]):
-                    tool_results_content = f"I saved the file: {tool_results[0]}"
-                elif len(tool_results) == 1 and ("Successfully read" in tool_results[0] or "Error" in tool_results[0]):
-                    tool_results_content = f"I read the file: {tool_results[0]}"
-                else:
-                    tool_results_content = f"I called the functions and got: {', '.join(tool_results)}"
+                log.info("⏱️ Executing %d tool calls...", len(all_tool_calls))
+                tool_results = self._execute_tool_calls(all_tool_calls)
+                self._checkpoint("tool_results", results=tool_results)
+            self._log_tool_results(all_tool_calls, tool_results)
+            
+            self._append_tool_results(ai_content, all_tool_calls, tool_results)
+    
+    def run_stream(self, user_message: str) -> Iterator[str]:
+        """
+        Run the agent like run(), streaming content deltas as they arrive.
+        Each streamed tool call is dispatched as soon as its arguments are
+        complete, while the model is still generating the rest of the turn.
+        
+        Args:
+            user_message: The user's input message
             
-            # Add the assistant's tool call message to conversation
-            self.messages.append({"role": "assistant", "content": ai_content or "[Tool call made]"})
+        Yields:
+            Content deltas from every LLM turn, in order
             
-            # Add tool results as a user message to continue the conversation
-            self.messages.append({"role": "user", "content": tool_results_content})
+        Returns:
+            The agent's final response (as the generator's return value; it is
+            also the last message in the conversation)
+        """
+        agent_id = uuid.uuid4()  # Simple agent ID for logging
+        log.info("🤖 Agent %s started (streaming): %s", agent_id, user_message)
+        self._resolve_model()
+        
+        with self._run_status(), self._run_span_for(agent_id, user_message, stream=True) as run_span:
+            self._run_span = run_span
+            self._start_run(user_message)
             
-            print(f"🔄 Continuing conversation with tool results: {tool_results_content}")
+            while True:
+                log.info("📡 Agent %s making streaming LLM call", agent_id)
+                self._start_turn(run_span)
+                first_token_time = None
+                
+                # Streams are not retried or hedged: content may already have been yielded
+                self._deadline.check()
+                call_deadline = self._deadline.for_call(self.call_timeout)
+                timeout = call_deadline.remaining()
+                with resilience.call_timeout_errors(timeout), self._llm_slot(timeout) as sample, self._routed_client() as client:
+                    with self._llm_span(run_span, stream=True) as call_span:
+                        stream = client.chat.completions.create(**self._completion_kwargs(), stream=True,
+                                                                stream_options=_STREAM_OPTIONS,
+                                                                **self._timeout_kwargs(call_deadline.remaining()))
+                    
+                        content_parts = []
+                        finish_reason = None
+                        assembler = streaming.ToolCallAssembler()
+                        xml_parser = xml_utils.XmlToolCallParser()
+                        dispatcher = tool_runner.StreamingDispatcher(self.execute_function, self.tool_funcs, self.parallel_tools)
+                        all_tool_calls = []
+                    
+                        def dispatch(tool_call):
+                            self._start_tool_calls(1)
+                            all_tool_calls.append(tool_call)
+                            dispatcher.submit(tool_call)
+                    
+                        try:
+                            for chunk in stream:
+                                self._check_cancelled()
+                                call_deadline.check()
+                                self._record_usage(chunk, call_span)
+                                if not chunk.choices:
+                                    continue
+                                choice = chunk.choices[0]
+                                finish_reason = choice.finish_reason or finish_reason
+                                delta = choice.delta
+                                if delta.content:
+                                    if first_token_time is None:
+                                        first_token_time = call_span.duration
+                                    content_parts.append(delta.content)
+                                    yield delta.content
+                                    for xml_call in xml_parser.feed(delta.content):
+                                        dispatch(self._from_xml_call(xml_call))
+                                if delta.tool_calls:
+                                    for index in assembler.feed(delta.tool_calls):
+                                        dispatch(assembler.call(index))
+                        except BaseException:
+                            dispatcher.cancel()
+                            # Closing the connection lets the server stop generating
+                            stream.close()
+                            raise
+                        self._finish_stream_span(call_span, content_parts, first_token_time)
+                    if sample is not None:
+                        sample.tokens = call_span.attributes.get("completion_tokens") or len(content_parts)
+                    for index in assembler.finish():
+                        dispatch(assembler.call(index))
+                    if self._stopped_at_tool_call(finish_reason):
+                        for xml_call in xml_parser.close():
+                            dispatch(self._from_xml_call(xml_call))
+                
+                ttft = f", first token after {first_token_time:.2f}s" if first_token_time is not None else ""
+                log.info("✅ Agent %s LLM stream finished in %.2fs%s", agent_id, call_span.duration, ttft)
+                
+                ai_content = "".join(content_parts)
+                self._checkpoint("response", content=ai_content, tool_calls=all_tool_calls)
+                if not all_tool_calls:
+                    return self._finish(ai_content)
+                self._log_tool_calls(all_tool_calls)
+                tool_results = dispatcher.results()
+                self._checkpoint("tool_results", results=tool_results)
+                
+                self._log_tool_results(all_tool_calls, tool_results)
+                self._append_tool_results(ai_content, all_tool_calls, tool_results)
     
+    @property
+    def messages(self) -> Conversation:
+        """The conversation, as Message records (lists assigned to it are converted)."""
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages):
+        self._messages = messages if isinstance(messages, Conversation) else Conversation(messages)
+
+    def fork(self, **overrides) -> "Agent":
+        """
+        Branch the agent between runs. The fork has the same configuration, clients
+        and caches, and shares the conversation so far without copying it; each
+        branch only stores the messages it adds afterwards.
+        
+        Args:
+            **overrides: Attributes to change on the fork, e.g. temperature=0.9
+            
+        Returns:
+            A new agent of the same class
+        """
+        branch = copy.copy(self)
+        branch.messages = self.messages.fork()
+        branch.usage = {"prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0}
+        branch.run_usage = {"turns": 0, "tool_calls": 0, "tokens": 0}
+        branch.status = None
+        # Per-conversation state that must not be shared between branches
+        branch._compiled = None
+        branch._compiled_key = None
+        branch._request_client_cache = {}
+        branch._run_span = None
+        branch._deadline = resilience.Deadline(None)
+        # Two agents can't append to one journal; give the fork its own if it needs one
+        branch.journal = None
+        branch._journal_list = None
+        branch._journal_len = 0
+        for name, value in overrides.items():
+            if not hasattr(branch, name):
+                raise AttributeError(f"Agent has no attribute {name!r}")
+            setattr(branch, name, value)
+        return branch
+
     def get_conversation_history(self) -> List[Dict[str, str]]:
         """Get the current conversation history"""
-        return self.messages.copy()
+        return self.messages.to_dicts()
     
     def reset_conversation(self, system_message: str = "You are a helpful assistant. Use available tools when appropriate."):
         """Reset the conversation history"""
-        self.messages = [{"role": "system", "content": system_message}] 
\ No newline at end of file
+        self.messages = [{"role": "system", "content": system_message}] 
+
+class AsyncAgent(Agent):
+    """
+    An asyncio agent built on openai.AsyncOpenAI.
+    Many instances can share a single event loop, so thousands of conversations
+    can be in flight without holding a thread each while waiting on the server.
+    """
+
+    _hedges = True
+
+    def _default_client(self):
+        # The shared async client is bound to an event loop, so it is looked
+        # up when arun() starts rather than at construction time
+        return None
+
+    async def _aresolve_client_and_model(self):
+        manager = get_client_manager()
+        if self.client is None:
+            self.client = manager.async_client()
+        if self.model is None:
+            self.model = await (self.endpoints.aget_model() if self.endpoints is not None else manager.aget_model())
+
+    def _endpoint_client(self, endpoint):
+        return endpoint.manager.async_client()
+
+    @contextlib.asynccontextmanager
+    async def _arouted_client(self):
+        with self._routed_client() as client:
+            yield client
+
+    def _allm_slot(self, timeout: Optional[float] = None):
+        """Async context manager holding a slot in the shared concurrency limiter, if any."""
+        return self.limiter.aslot(timeout) if self.limiter is not None else contextlib.nullcontext()
+
+    async def _acreate_completion(self):
+        """
+        Request one (non-streamed) completion for the current conversation,
+        applying the agent's timeouts, retry policy and hedging.
+        """
+        if self.lean_http:
+            body = self._compiled_body()
+            request = lambda client, timeout: request_template.apost_completion(client, body, timeout)
+        else:
+            kwargs = self._completion_kwargs()
+            request = lambda client, timeout: self._request_client(client).chat.completions.create(
+                **kwargs, **self._timeout_kwargs(timeout))
+
+        async def attempt(timeout):
+            async with self._allm_slot() as sample, self._arouted_client() as client:
+                with self._llm_span(self._run_span) as call_span:
+                    response = await request(client, timeout)
+                    self._report_tokens(sample, response)
+                    self._finish_call_span(call_span, response)
+                    return response
+
+        call = lambda: resilience.acall_with_resilience(attempt, self.call_timeout, self._deadline, self.retry, self.hedge)
+        key = self._request_key()
+        if self._coalesce():
+            send = call
+            call = lambda: self.single_flight.ado(key, send, self._deadline.remaining())
+        if self.response_cache is None:
+            return await call()
+        return await self.response_cache.afetch(key, call)
+
+    async def execute_function_async(self, function_name, arguments):
+        """
+        Run a (synchronous) tool function without blocking the event loop.
+        Cancelling the awaiting task cancels the call in its tool backend.
+        """
+        cancel = threading.Event()
+        # execute_function has the cancel token set this event too
+        token = tool_backends.cancel_event.set(cancel)
+        try:
+            return await asyncio.to_thread(self.execute_function, function_name, arguments)
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+        finally:
+            tool_backends.cancel_event.reset(token)
+
+    async def _aexecute_tool_calls(self, all_tool_calls) -> List[Any]:
+        """Execute a turn's tool calls, returning results in call order."""
+        if not self.parallel_tools:
+            return [await self.execute_function_async(call['name'], call['arguments']) for call in all_tool_calls]
+        return await tool_runner.aexecute_tool_calls(all_tool_calls, self.execute_function_async, self.tool_funcs)
+
+    async def _acancellable(self, coro):
+        """Await `coro` as a task of its own that the cancel token cancels, even mid-call."""
+        if self.cancel_token is None:
+            return await coro
+        task = asyncio.ensure_future(coro)
+        loop = asyncio.get_running_loop()
+        remove = self.cancel_token.add_callback(lambda: loop.call_soon_threadsafe(task.cancel))
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Only the token cancelled the task if this task isn't being cancelled itself
+            if self.cancel_token.cancelled and not asyncio.current_task().cancelling():
+                raise RunCancelled(self.cancel_token.reason) from None
+            raise
+        finally:
+            remove()
+
+    async def arun(self, user_message: str) -> str:
+        """
+        Run the agent with a user message and return the response.
+        Same loop as Agent.run, but awaits the LLM and tool calls.
+        
+        Args:
+            user_message: The user's input message
+            
+        Returns:
+            The agent's final response after processing all tool calls
+        """
+        agent_id = uuid.uuid4()  # Simple agent ID for logging
+        log.info("🤖 Agent %s started: %s", agent_id, user_message)
+        await self._aresolve_client_and_model()
+        
+        with self._run_status(), self._run_span_for(agent_id, user_message) as run_span:
+            self._run_span = run_span
+            self._start_run(user_message)
+            return await self._acancellable(self._arun_turns(agent_id, run_span))
+
+    async def aresume(self, journal = None) -> Optional[str]:
+        """Async version of resume()."""
+        state = self._load_journal(journal)
+        if not state.in_run:
+            return state.final
+        agent_id = uuid.uuid4()
+        log.info("♻️ Agent %s resuming: %s", agent_id, state.user_message)
+        await self._aresolve_client_and_model()
+        
+        with self._run_status(), self._run_span_for(agent_id, state.user_message) as run_span:
+            self._run_span = run_span
+            self._begin_run(state.user_message)
+            return await self._acancellable(self._arun_turns(agent_id, run_span, self._pending_turn(state)))
+
+    async def _arun_turns(self, agent_id, run_span, pending = None) -> str:
+        """Async version of _run_turns()."""
+        while True:
+            if pending is not None:
+                (ai_content, all_tool_calls, tool_results), pending = pending, None
+            else:
+                log.info("📡 Agent %s making LLM call", agent_id)
+                self._start_turn(run_span)
+                
+                started = time.monotonic()
+                response = await self._acreate_completion()
+                self._record_usage(response)
+                
+                log.info("✅ Agent %s LLM response received in %.2fs", agent_id, time.monotonic() - started)
+                ai_content, all_tool_calls = self._parse_response(response)
+                self._checkpoint("response", content=ai_content, tool_calls=all_tool_calls)
+                tool_results = None
+            
+            if not all_tool_calls:
+                return self._finish(ai_content)
+            
+            if tool_results is None:
+                self._start_tool_calls(len(all_tool_calls))
+                self._log_tool_calls(all_tool_calls)
+                log.info("⏱️ Executing %d tool calls...", len(all_tool_calls))
+                tool_results = await self._aexecute_tool_calls(all_tool_calls)
+                self._checkpoint("tool_results", results=tool_results)
+            self._log_tool_results(all_tool_calls, tool_results)
+            
+            self._append_tool_results(ai_content, all_tool_calls, tool_results)
+
+    async def arun_stream(self, user_message: str) -> AsyncIterator[str]:
+        """
+        Async version of run_stream(). Yields content deltas as they arrive;
+        the final response is the last message in the conversation.
+        
+        Args:
+            user_message: The user's input message
+        """
+        agent_id = uuid.uuid4()  # Simple agent ID for logging
+        log.info("🤖 Agent %s started (streaming): %s", agent_id, user_message)
+        await self._aresolve_client_and_model()
+        
+        with self._run_status(), self._run_span_for(agent_id, user_message, stream=True) as run_span:
+            self._run_span = run_span
+            self._start_run(user_message)
+            
+            while True:
+                log.info("📡 Agent %s making streaming LLM call", agent_id)
+                self._start_turn(run_span)
+                first_token_time = None
+                
+                self._deadline.check()
+                call_deadline = self._deadline.for_call(self.call_timeout)
+                timeout = call_deadline.remaining()
+                with resilience.call_timeout_errors(timeout):
+                    async with self._allm_slot(timeout) as sample, self._arouted_client() as client:
+                        with self._llm_span(run_span, stream=True) as call_span:
+                            stream = await client.chat.completions.create(**self._completion_kwargs(), stream=True,
+                                                                          stream_options=_STREAM_OPTIONS,
+                                                                          **self._timeout_kwargs(call_deadline.remaining()))
+                        
+                            content_parts = []
+                            finish_reason = None
+                            assembler = streaming.ToolCallAssembler()
+                            xml_parser = xml_utils.XmlToolCallParser()
+                            dispatcher = tool_runner.AsyncStreamingDispatcher(self.execute_function_async, self.tool_funcs, self.parallel_tools)
+                            all_tool_calls = []
+                        
+                            def dispatch(tool_call):
+                                self._start_tool_calls(1)
+                                all_tool_calls.append(tool_call)
+                                dispatcher.submit(tool_call)
+                        
+                            try:
+                                async for chunk in stream:
+                                    self._check_cancelled()
+                                    call_deadline.check()
+                                    self._record_usage(chunk, call_span)
+                                    if not chunk.choices:
+                                        continue
+                                    choice = chunk.choices[0]
+                                    finish_reason = choice.finish_reason or finish_reason
+                                    delta = choice.delta
+                                    if delta.content:
+                                        if first_token_time is None:
+                                            first_token_time = call_span.duration
+                                        content_parts.append(delta.content)
+                                        yield delta.content
+                                        for xml_call in xml_parser.feed(delta.content):
+                                            dispatch(self._from_xml_call(xml_call))
+                                    if delta.tool_calls:
+                                        for index in assembler.feed(delta.tool_calls):
+                                            dispatch(assembler.call(index))
+                            except BaseException:
+                                dispatcher.cancel()
+                                await stream.close()
+                                raise
+                            self._finish_stream_span(call_span, content_parts, first_token_time)
+                        if sample is not None:
+                            sample.tokens = call_span.attributes.get("completion_tokens") or len(content_parts)
+                        for index in assembler.finish():
+                            dispatch(assembler.call(index))
+                        if self._stopped_at_tool_call(finish_reason):
+                            for xml_call in xml_parser.close():
+                                dispatch(self._from_xml_call(xml_call))
+                
+                ttft = f", first token after {first_token_time:.2f}s" if first_token_time is not None else ""
+                log.info("✅ Agent %s LLM stream finished in %.2fs%s", agent_id, call_span.duration, ttft)
+                
+                ai_content = "".join(content_parts)
+                self._checkpoint("response", content=ai_content, tool_calls=all_tool_calls)
+                if not all_tool_calls:
+                    self._finish(ai_content)
+                    return
+                self._log_tool_calls(all_tool_calls)
+                tool_results = await dispatcher.results()
+                self._checkpoint("tool_results", results=tool_results)
+                
+                self._log_tool_results(all_tool_calls, tool_results)
+                self._append_tool_results(ai_content, all_tool_calls, tool_results)
+
+
+def _pick_best(forks, responses, score):
+    """Index of the winning response: highest score, or the most common answer by default."""
+    if score is not None:
+        scores = [score(response, fork) for fork, response in zip(forks, responses)]
+        return max(range(len(responses)), key=lambda i: scores[i])
+    counts = {}
+    for response in responses:
+        key = " ".join(response.split()).lower()
+        counts[key] = counts.get(key, 0) + 1
+    return max(range(len(responses)), key=lambda i: counts[" ".join(responses[i].split()).lower()])
+
+
+def _best_of_n_forks(agent, n, overrides):
+    if n < 1:
+        raise ValueError("n must be at least 1")
+    # Identical forks would otherwise be answered with one shared or cached response
+    overrides = {"single_flight": None, "response_cache": None, **overrides}
+    return [agent.fork(**overrides) for _ in range(n)]
+
+
+def best_of_n(agent: Agent, user_message: str, n: int = 4, score=None, max_workers: Optional[int] = None, **overrides):
+    """
+    Run `user_message` on n forks of `agent` concurrently and pick a winner.
+    
+    Args:
+        agent: Agent to fork (left unchanged)
+        user_message: Message each fork runs
+        n: Number of forks
+        score: Function (response, fork) -> number; the highest wins. By default the
+            most common response wins (self-consistency vote)
+        max_workers: Threads to run the forks on (defaults to n)
+        **overrides: Attributes to set on every fork, e.g. temperature=0.8
+        
+    Returns:
+        Tuple of (winning fork, its response); continue the conversation on the fork
+    """
+    forks = _best_of_n_forks(agent, n, overrides)
+    with ThreadPoolExecutor(max_workers=max_workers or n) as executor:
+        responses = list(executor.map(lambda fork: fork.run(user_message), forks))
+    best = _pick_best(forks, responses, score)
+    return forks[best], responses[best]
+
+
+async def abest_of_n(agent: AsyncAgent, user_message: str, n: int = 4, score=None, **overrides):
+    """Async version of best_of_n(); the forks run concurrently on the event loop."""
+    forks = _best_of_n_forks(agent, n, overrides)
+    responses = await asyncio.gather(*(fork.arun(user_message) for fork in forks))
+    best = _pick_best(forks, responses, score)
+    return forks[best], responses[best]
+
+
+async def demo_parallel_agents(cities=None, client=None, model=None):
+    """
+    Run one weather agent per city, first concurrently on the event loop and
+    then one after another, and print the timing comparison.
+    
+    Args:
+        cities: Cities to ask about (defaults to a small fixed list)
+        client: AsyncOpenAI client to share between agents (optional, uses the shared pooled client)
+        model: Model name (optional, resolved from the cached model list if not given)
+        
+    Returns:
+        Tuple of (parallel_time, sequential_time) in seconds
+    """
+    from tools import get_tools, get_tool_funcs
+
+    cities = cities or ["Tokyo", "London", "New York", "Sydney"]
+    manager = get_client_manager()
+    client = client or manager.async_client()
+    if model is None:
+        model = await manager.aget_model()
+
+    tools = get_tools()
+    tool_funcs = get_tool_funcs()
+
+    def make_agent():
+        return AsyncAgent(
+            messages=[],
+            tools=tools,
+            tool_funcs=tool_funcs,
+            model=model,
+            temperature=0.3,
+            client=client,
+            system_message="You are a weather assistant. Get weather information quickly."
+        )
+
+    prompts = [f"What is the weather in {city}?" for city in cities]
+
+    start_time = time.time()
+    await asyncio.gather(*(make_agent().arun(prompt) for prompt in prompts))
+    parallel_time = time.time() - start_time
+    print(f"\n✅ {len(prompts)} parallel agents completed in {parallel_time:.2f} seconds")
+
+    start_time = time.time()
+    for prompt in prompts:
+        await make_agent().arun(prompt)
+    sequential_time = time.time() - start_time
+    print(f"✅ {len(prompts)} sequential agents completed in {sequential_time:.2f} seconds")
+
+    print(f"\n📊 Performance comparison:")
+    print(f"  Parallel:   {parallel_time:.2f} seconds")
+    print(f"  Sequential: {sequential_time:.2f} seconds")
+    if parallel_time > 0 and sequential_time > parallel_time:
+        print(f"  Speedup:    {sequential_time/parallel_time:.2f}x faster with parallel execution")
+
+    return parallel_time, sequential_time
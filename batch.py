@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Resumable batch runner for JSONL job files.
+
+Each input line is a job:
+
+    {"id": "job-1", "prompt": "...", "system_message": "...", "tools": ["get_weather"]}
+
+Only "prompt" is required. "tools" is a list of tool names, "all" (the
+default) or "auto" to pick tools per prompt with the registry's selector. Jobs are streamed from the file with bounded
+concurrency, and one result line is appended to the output file as each job
+finishes. The output file doubles as the checkpoint: on restart, jobs whose
+id already has a successful result are skipped.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from agent import AsyncAgent
+from clients import get_client_manager
+from tool_registry import default_registry
+
+DEFAULT_SYSTEM_MESSAGE = "You are a helpful assistant. Use available tools when appropriate."
+
+
+def iter_jobs(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield jobs from a JSONL file one line at a time."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": f"line-{line_number}", "invalid": f"Invalid JSON: {e}"}
+                continue
+            job.setdefault("id", f"line-{line_number}")
+            yield job
+
+
+def load_finished(output_path: str, include_failed: bool = False) -> Set[str]:
+    """
+    Read the ids of jobs already recorded in an output file.
+
+    Args:
+        output_path: Results JSONL written by a previous run
+        include_failed: Also treat jobs that ended with an error as finished
+    """
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; that job runs again
+                continue
+            if record.get("status") == "ok" or include_failed:
+                finished.add(str(record.get("id")))
+    return finished
+
+
+def _ends_mid_line(path: str) -> bool:
+    """True if the file exists and its last line has no newline."""
+    try:
+        with open(path, 'rb') as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+    except FileNotFoundError:
+        return False
+
+
+class ResultWriter:
+    """Appends result records to the output JSONL and syncs them periodically."""
+
+    def __init__(self, output_path: str, fsync_every: int = 50):
+        cut_short = _ends_mid_line(output_path)
+        self._file = open(output_path, 'a', encoding='utf-8')
+        if cut_short:
+            # End the line a crash cut short, so the next record starts on its own line
+            self._file.write("\n")
+        self._fsync_every = fsync_every
+        self._unsynced = 0
+
+    def write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self._fsync_every:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+
+def _job_tools(value: Any) -> Tuple[List[Dict[str, Any]], Optional[Callable[[str], List[Dict[str, Any]]]]]:
+    """
+    Resolve a job's "tools" field to (tool schemas, tool selector).
+
+    Raises:
+        ValueError: If the field is not a list of known tool names, "all" or "auto"
+    """
+    if value is None or value == "all":
+        return default_registry.schemas(), None
+    if value == "auto":
+        return default_registry.schemas(), default_registry.selector()
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise ValueError(f'"tools" must be a list of tool names, "all" or "auto", got {value!r}')
+    unknown = [name for name in value if default_registry.get(name) is None]
+    if unknown:
+        raise ValueError(f"Unknown tools: {', '.join(unknown)}")
+    return default_registry.schemas(value), None
+
+
+async def run_job(job: Dict[str, Any], client, model: str, temperature: float) -> Dict[str, Any]:
+    """Run one job and return its result record."""
+    record: Dict[str, Any] = {"id": job["id"]}
+    if "invalid" in job or not job.get("prompt"):
+        record.update(status="error", error=job.get("invalid", "Job has no prompt"))
+        return record
+
+    try:
+        tools, tool_selector = _job_tools(job.get("tools"))
+    except ValueError as e:
+        record.update(status="error", error=str(e))
+        return record
+
+    agent = AsyncAgent(
+        messages=[],
+        tools=tools,
+        tool_funcs=default_registry.funcs(),
+        tool_selector=tool_selector,
+        model=job.get("model", model),
+        temperature=job.get("temperature", temperature),
+        client=client,
+        system_message=job.get("system_message") or DEFAULT_SYSTEM_MESSAGE
+    )
+
+    start_time = time.time()
+    try:
+        response = await agent.arun(job["prompt"])
+        record.update(status="ok", response=response)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record.update(
+        started_at=start_time,
+        duration_s=round(time.time() - start_time, 3),
+        llm_calls=agent.usage["llm_calls"],
+        prompt_tokens=agent.usage["prompt_tokens"],
+        completion_tokens=agent.usage["completion_tokens"]
+    )
+    return record
+
+
+async def run_batch(
+    jobs_path: str,
+    output_path: str,
+    concurrency: int = 16,
+    model: Optional[str] = None,
+    temperature: float = 0.3,
+    retry_failed: bool = True,
+    client=None
+) -> Dict[str, int]:
+    """
+    Run every unfinished job in `jobs_path`, appending results to `output_path`.
+
+    Jobs are read lazily through a queue of 2 * concurrency entries, so
+    reading the file never runs far ahead of the workers.
+
+    Args:
+        jobs_path: Input JSONL of jobs
+        output_path: Output JSONL of results (also the resume checkpoint)
+        concurrency: Number of jobs in flight
+        model: Model name (optional, resolved from the cached model list if not given)
+        temperature: Default temperature for jobs that don't set one
+        retry_failed: Re-run jobs whose previous result was an error
+        client: AsyncOpenAI client (optional, uses the shared pooled client)
+
+    Returns:
+        Counts of jobs that succeeded, failed and were skipped
+    """
+    manager = get_client_manager()
+    client = client or manager.async_client()
+    if model is None:
+        model = await manager.aget_model()
+
+    finished = load_finished(output_path, include_failed=not retry_failed)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    writer = ResultWriter(output_path)
+
+    async def produce():
+        for job in iter_jobs(jobs_path):
+            if str(job["id"]) in finished:
+                counts["skipped"] += 1
+                continue
+            # Blocks while the queue is full (backpressure)
+            await queue.put(job)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work():
+        while True:
+            job = await queue.get()
+            if job is None:
+                return
+            record = await run_job(job, client, model, temperature)
+            writer.write(record)
+            counts[record["status"]] += 1
+            print(f"{'✅' if record['status'] == 'ok' else '❌'} Job {record['id']} {record['status']} "
+                  f"in {record.get('duration_s', 0):.2f}s")
+
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    finally:
+        writer.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run agent jobs from a JSONL file")
+    parser.add_argument("jobs", help="Input JSONL with one job per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="Output JSONL (also used to resume)")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="Jobs in flight")
+    parser.add_argument("--model", default=None, help="Model name (defaults to the server's first model)")
+    parser.add_argument("--temperature", type=float, default=0.3)
+    parser.add_argument("--no-retry-failed", action="store_true", help="Don't re-run jobs that failed before")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    counts = asyncio.run(run_batch(
+        args.jobs,
+        args.output,
+        concurrency=args.concurrency,
+        model=args.model,
+        temperature=args.temperature,
+        retry_failed=not args.no_retry_failed
+    ))
+    total_time = time.time() - start_time
+    print(f"\n📊 {counts['ok']} ok, {counts['error']} failed, {counts['skipped']} skipped in {total_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
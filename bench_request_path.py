@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of client-side cost per completion call.
+
+Compares the SDK path (chat.completions.create with the full tools list and
+messages) against the compiled request template plus lean HTTP path. The
+server is replaced by an in-process httpx transport returning a canned
+response, so only client-side CPU is measured.
+"""
+
+import argparse
+import json
+import time
+
+import httpx
+import openai
+
+import request_template
+from tools import get_tools
+
+RESPONSE = json.dumps({
+    "id": "bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "bench-model",
+    "choices": [{
+        "index": 0,
+        "message": {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": "call_0",
+                "type": "function",
+                "function": {"name": "get_weather", "arguments": "{\"location\": \"Paris, France\"}"}
+            }]
+        },
+        "finish_reason": "tool_calls"
+    }],
+    "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+}).encode()
+
+
+def make_client() -> openai.OpenAI:
+    transport = httpx.MockTransport(lambda request: httpx.Response(
+        200, content=RESPONSE, headers={"content-type": "application/json"}
+    ))
+    return openai.OpenAI(
+        base_url="http://bench.local/v1",
+        api_key="lm-studio",
+        http_client=httpx.Client(transport=transport)
+    )
+
+
+def conversation(turns: int):
+    """Yield a growing conversation, one tool round per turn."""
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant. Use available tools when appropriate."},
+        {"role": "user", "content": "What is the weather in Paris?"}
+    ]
+    for turn in range(turns):
+        yield messages
+        messages.append({"role": "assistant", "content": "[Tool call made]"})
+        messages.append({"role": "user", "content": f"I called the weather function and got: Weather in Paris: Clear skies, {turn}°C"})
+
+
+def bench_sdk(client, tools, turns: int) -> float:
+    start = time.perf_counter()
+    for messages in conversation(turns):
+        response = client.chat.completions.create(
+            model="bench-model",
+            messages=messages,
+            tools=tools,
+            tool_choice="auto",
+            temperature=0.3
+        )
+        response.choices[0].message.tool_calls
+    return time.perf_counter() - start
+
+
+def bench_compiled(client, tools, turns: int) -> float:
+    start = time.perf_counter()
+    compiled = request_template.CompiledRequest("bench-model", tools, 0.3)
+    for messages in conversation(turns):
+        response = request_template.post_completion(client, compiled.body(messages))
+        response["choices"][0]["message"].get("tool_calls")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50, help="Tool rounds per conversation")
+    parser.add_argument("--repeat", type=int, default=20, help="Conversations per path")
+    args = parser.parse_args()
+
+    client = make_client()
+    tools = get_tools()
+    calls = args.turns * args.repeat
+
+    # Warm up both paths (imports, connection setup, caches)
+    bench_sdk(client, tools, 2)
+    bench_compiled(client, tools, 2)
+
+    sdk_time = sum(bench_sdk(client, tools, args.turns) for _ in range(args.repeat))
+    compiled_time = sum(bench_compiled(client, tools, args.turns) for _ in range(args.repeat))
+
+    sdk_us = sdk_time / calls * 1e6
+    compiled_us = compiled_time / calls * 1e6
+    print(f"📊 Per-call client overhead over {calls} calls ({args.turns} turns per conversation)")
+    print(f"  SDK path:      {sdk_us:8.1f} µs/call")
+    print(f"  Compiled path: {compiled_us:8.1f} µs/call")
+    print(f"  Speedup:       {sdk_us / compiled_us:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Load benchmark of the agent runners against the bundled mock server.
+
+Runs batches of agents at increasing concurrency through the async runner
+(main.run_agents) and a thread-pool runner over the sync Agent, and reports
+throughput, run and LLM call latency percentiles, peak thread count and
+memory per in-flight agent. Results are compared with a stored baseline:
+
+    python benchmark.py                     # compare with benchmark_baseline.json
+    python benchmark.py --save-baseline     # record a new baseline
+    python benchmark.py --check             # exit 1 if a metric regressed
+
+The mock server runs in a subprocess so its threads and memory are not
+counted.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import openai
+
+import telemetry
+from agent import Agent
+from main import TOOLS, run_agents, tool_funcs
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+MODEL = "mock-model"
+SYSTEM_MESSAGE = "You are a helpful assistant. Use available tools when appropriate."
+
+# Metrics compared with the baseline, and whether higher is better
+COMPARED = {
+    "runs_per_s": True,
+    "run_p95_s": False,
+    "llm_p95_s": False,
+    "peak_threads": False,
+    "memory_per_agent_kb": False,
+}
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def mock_server(latency: str, tokens_per_s: float):
+    """Run mock_server.py in a subprocess and yield its base URL."""
+    port = _free_port()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py")
+    process = subprocess.Popen(
+        [sys.executable, script, "--port", str(port), "--latency", latency, "--tokens-per-s", str(tokens_per_s)],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError("Mock server did not start")
+                time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+class ThreadSampler:
+    """Samples the process's thread count in the background and keeps the peak."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Don't count the sampler itself
+            self.peak = max(self.peak, threading.active_count() - 1)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _configs(count: int):
+    cities = ["Tokyo", "London", "New York", "Sydney", "Paris", "Cairo", "Lima", "Oslo"]
+    return [(i, f"What is the weather in {cities[i % len(cities)]}?", SYSTEM_MESSAGE) for i in range(count)]
+
+
+def run_async(url: str, level: int, count: int):
+    async def go():
+        client = openai.AsyncOpenAI(base_url=url, api_key="mock")
+        try:
+            await run_agents(_configs(count), client=client, model=MODEL, max_concurrency=level)
+        finally:
+            await client.close()
+    asyncio.run(go())
+
+
+def run_threads(url: str, level: int, count: int):
+    client = openai.OpenAI(base_url=url, api_key="mock")
+
+    def run_one(config):
+        _, message, system_message = config
+        agent = Agent([], TOOLS, tool_funcs, MODEL, 0.3, client=client, system_message=system_message)
+        return agent.run(message)
+
+    with ThreadPoolExecutor(max_workers=level) as executor:
+        list(executor.map(run_one, _configs(count)))
+    client.close()
+
+
+RUNNERS = {"async": run_async, "thread": run_threads}
+
+
+def measure_level(runner: str, url: str, level: int, count: int) -> Dict[str, Any]:
+    """Run `count` agents with `level` in flight and return the measurements."""
+    run = RUNNERS[runner]
+    spans = telemetry.InMemoryExporter()
+    telemetry.tracer.add_exporter(spans)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), ThreadSampler() as sampler:
+            start = time.perf_counter()
+            run(url, level, count)
+            elapsed = time.perf_counter() - start
+    finally:
+        telemetry.tracer.remove_exporter(spans)
+
+    # Memory is measured in a second, shorter pass: tracing allocations slows the run
+    tracemalloc.start()
+    try:
+        baseline_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(url, level, level)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    run_latencies = [span.duration for span in spans.spans("agent_run")]
+    llm_latencies = [span.duration for span in spans.spans("llm_call")]
+    return {
+        "agents": count,
+        "elapsed_s": round(elapsed, 3),
+        "runs_per_s": round(count / elapsed, 2),
+        "llm_calls_per_s": round(len(llm_latencies) / elapsed, 2),
+        "run_p50_s": round(percentile(run_latencies, 0.50) or 0, 4),
+        "run_p95_s": round(percentile(run_latencies, 0.95) or 0, 4),
+        "run_p99_s": round(percentile(run_latencies, 0.99) or 0, 4),
+        "llm_p50_s": round(percentile(llm_latencies, 0.50) or 0, 4),
+        "llm_p95_s": round(percentile(llm_latencies, 0.95) or 0, 4),
+        "llm_p99_s": round(percentile(llm_latencies, 0.99) or 0, 4),
+        "peak_threads": sampler.peak,
+        "memory_per_agent_kb": round((peak_memory - baseline_memory) / level / 1024, 1),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print each compared metric next to its baseline and return the regressions."""
+    regressions = []
+    for runner, levels in results["results"].items():
+        for level, metrics in levels.items():
+            base = baseline.get("results", {}).get(runner, {}).get(level)
+            if base is None:
+                continue
+            for name, higher_is_better in COMPARED.items():
+                old, new = base.get(name), metrics.get(name)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                worse = change < -tolerance if higher_is_better else change > tolerance
+                marker = "❌" if worse else "  "
+                print(f"{marker} {runner:>6} c={level:<4} {name:<20} {old:>10} -> {new:<10} ({change:+.0%})")
+                if worse:
+                    regressions.append(f"{runner} c={level} {name}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent runners against the mock server")
+    parser.add_argument("--levels", default="1,8,32,128", help="Comma-separated concurrency levels")
+    parser.add_argument("--agents", type=int, default=None, help="Agents per level (default: max(16, 2 * level))")
+    parser.add_argument("--runner", choices=["async", "thread", "both"], default="both")
+    parser.add_argument("--latency", default="constant:0.05", help="Mock time to first token (see mock_server.py)")
+    parser.add_argument("--tokens-per-s", type=float, default=0, help="Mock decode speed (0 for instant)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare with or save")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if any metric regressed")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative change before flagging")
+    args = parser.parse_args()
+
+    telemetry.configure_logging("off")
+    levels = [int(level) for level in args.levels.split(",")]
+    runners = ["async", "thread"] if args.runner == "both" else [args.runner]
+    results: Dict[str, Any] = {
+        "config": {"latency": args.latency, "tokens_per_s": args.tokens_per_s, "levels": levels},
+        "results": {}
+    }
+
+    with mock_server(args.latency, args.tokens_per_s) as url:
+        for runner in runners:
+            results["results"][runner] = {}
+            for level in levels:
+                count = args.agents or max(16, 2 * level)
+                metrics = measure_level(runner, url, level, count)
+                results["results"][runner][str(level)] = metrics
+                print(f"📊 {runner:>6} c={level:<4} {metrics['runs_per_s']:>8.1f} runs/s  "
+                      f"run p50/p95/p99 {metrics['run_p50_s']:.3f}/{metrics['run_p95_s']:.3f}/{metrics['run_p99_s']:.3f}s  "
+                      f"llm p95 {metrics['llm_p95_s']:.3f}s  threads {metrics['peak_threads']}  "
+                      f"{metrics['memory_per_agent_kb']} KB/agent")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("config") != results["config"]:
+        print("\n⚠️ Baseline was recorded with different settings; comparing anyway")
+    print()
+    regressions = compare(results, baseline, args.tolerance)
+    print(f"\n{'❌ ' + str(len(regressions)) + ' regression(s)' if regressions else '✅ No regressions'} "
+          f"(tolerance {args.tolerance:.0%})")
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
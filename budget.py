@@ -0,0 +1,125 @@
+import itertools
+import threading
+from typing import Callable, Dict, Optional
+
+
+class RunStopped(Exception):
+    """A run was stopped before the model gave its final answer; `status` says why."""
+
+    def __init__(self, status: str, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class BudgetExceeded(RunStopped):
+    """A run used up one of its RunBudget limits (status "max_turns", "max_tokens" or "max_tool_calls")."""
+
+
+class RunCancelled(RunStopped):
+    """A run was stopped through its CancelToken (status "cancelled")."""
+
+    def __init__(self, message: str = "Run cancelled"):
+        super().__init__("cancelled", message)
+
+
+class RunBudget:
+    """
+    Resource limits for a single agent run.
+
+    Every limit is optional. Turns and tokens are checked before each LLM
+    call, and tool calls before a turn's calls run, so a run stops at the
+    first step that would go over. Time is enforced like `run_timeout`:
+    calls are cut short at the deadline and DeadlineExceeded is raised.
+    """
+
+    def __init__(
+        self,
+        max_turns: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        max_tool_calls: Optional[int] = None,
+        max_seconds: Optional[float] = None
+    ):
+        """
+        Args:
+            max_turns: LLM calls allowed per run
+            max_tokens: Prompt plus completion tokens (as reported by the server) per run
+            max_tool_calls: Tool calls allowed per run
+            max_seconds: Wall-clock seconds allowed per run
+        """
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.max_tool_calls = max_tool_calls
+        self.max_seconds = max_seconds
+
+    def check_turn(self, turns: int, tokens: int):
+        """Raise BudgetExceeded if another LLM call isn't allowed after `turns` calls using `tokens`."""
+        if self.max_turns is not None and turns >= self.max_turns:
+            raise BudgetExceeded("max_turns", f"Run used its {self.max_turns} LLM turns")
+        if self.max_tokens is not None and tokens >= self.max_tokens:
+            raise BudgetExceeded("max_tokens", f"Run used {tokens} of its {self.max_tokens} tokens")
+
+    def check_tool_calls(self, tool_calls: int, new_calls: int):
+        """Raise BudgetExceeded if `new_calls` more tool calls would go over the limit."""
+        if self.max_tool_calls is not None and tool_calls + new_calls > self.max_tool_calls:
+            raise BudgetExceeded("max_tool_calls", f"Run would exceed its {self.max_tool_calls} tool calls")
+
+
+class CancelToken:
+    """
+    Stops agent runs from outside, e.g. from a runner, scheduler or another thread.
+
+    Runs check the token between LLM and tool steps and on every streamed
+    chunk. An AsyncAgent cancels a non-streamed LLM call in flight (and its
+    tool calls); a sync Agent stops waiting for it at once, and the call,
+    made as a stream, closes its request at its next chunk. Tools on a
+    non-inline backend are cancelled through tool_backends.cancel_event.
+    One token can be shared by many agents to stop them all; once
+    cancelled it stays cancelled.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.reason: Optional[str] = None
+        self._callbacks: Dict[int, Callable[[], None]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def cancel(self, reason: str = "Run cancelled"):
+        """Cancel every run using this token (safe to call from any thread)."""
+        with self._lock:
+            if self.event.is_set():
+                return
+            self.reason = reason
+            self.event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            callback()
+
+    def check(self):
+        """Raise RunCancelled if the token was cancelled."""
+        if self.event.is_set():
+            raise RunCancelled(self.reason)
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Call `callback` when the token is cancelled (right away if it already is).
+
+        Returns:
+            Function that removes the callback again
+        """
+        with self._lock:
+            if not self.event.is_set():
+                callback_id = next(self._ids)
+                self._callbacks[callback_id] = callback
+                return lambda: self._remove_callback(callback_id)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback_id: int):
+        with self._lock:
+            self._callbacks.pop(callback_id, None)
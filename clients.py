@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+import weakref
+from typing import List, Optional, Tuple
+
+import httpx
+import openai
+
+DEFAULT_BASE_URL = "http://localhost:1234/v1"
+DEFAULT_API_KEY = "lm-studio"
+
+
+class ClientManager:
+    """
+    Process-wide owner of the OpenAI clients used by agents and runners.
+
+    Every agent that talks to the same server shares one keep-alive connection
+    pool instead of opening its own, and the model list is fetched once and
+    cached for `model_ttl` seconds instead of once per agent.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        api_key: str = DEFAULT_API_KEY,
+        pool_size: int = 100,
+        keepalive_expiry: float = 30.0,
+        model_ttl: float = 300.0
+    ):
+        """
+        Args:
+            base_url: OpenAI-compatible API base URL
+            api_key: API key sent with every request
+            pool_size: Maximum number of (keep-alive) connections per client
+            keepalive_expiry: Seconds an idle pooled connection is kept open
+            model_ttl: Seconds a fetched model list stays valid
+        """
+        self.base_url = base_url
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self.model_ttl = model_ttl
+
+        self._lock = threading.Lock()
+        self._client: Optional[openai.OpenAI] = None
+        # httpx.AsyncClient pools are bound to the loop they were first used on
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_locks = weakref.WeakKeyDictionary()
+        self._models: Optional[Tuple[List[str], float]] = None
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def client(self) -> openai.OpenAI:
+        """Return the shared synchronous client, creating it on first use."""
+        with self._lock:
+            return self._client_unlocked()
+
+    def _client_unlocked(self) -> openai.OpenAI:
+        if self._client is None:
+            self._client = openai.OpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                http_client=openai.DefaultHttpxClient(limits=self._limits())
+            )
+        return self._client
+
+    def async_client(self) -> openai.AsyncOpenAI:
+        """Return the shared async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = openai.AsyncOpenAI(
+                    base_url=self.base_url,
+                    api_key=self.api_key,
+                    http_client=openai.DefaultAsyncHttpxClient(limits=self._limits())
+                )
+                self._async_clients[loop] = client
+            return client
+
+    def _cached_models(self) -> Optional[List[str]]:
+        if self._models is None:
+            return None
+        models, expires_at = self._models
+        return models if time.monotonic() < expires_at else None
+
+    def _store_models(self, models: List[str]) -> List[str]:
+        self._models = (models, time.monotonic() + self.model_ttl)
+        return models
+
+    def get_models(self, refresh: bool = False) -> List[str]:
+        """Return the IDs of the models served, using the cache while fresh."""
+        models = None if refresh else self._cached_models()
+        if models is not None:
+            return models
+        # Held across the fetch so agents starting together make one request
+        with self._lock:
+            models = None if refresh else self._cached_models()
+            if models is None:
+                models = self._store_models([m.id for m in self._client_unlocked().models.list().data])
+            return models
+
+    async def aget_models(self, refresh: bool = False) -> List[str]:
+        """Async version of get_models()."""
+        models = None if refresh else self._cached_models()
+        if models is not None:
+            return models
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            lock = self._async_locks.setdefault(loop, asyncio.Lock())
+        async with lock:
+            models = None if refresh else self._cached_models()
+            if models is None:
+                response = await self.async_client().models.list()
+                models = self._store_models([m.id for m in response.data])
+            return models
+
+    def get_model(self) -> str:
+        """Return the default (first listed) model ID."""
+        return self.get_models()[0]
+
+    async def aget_model(self) -> str:
+        """Return the default (first listed) model ID."""
+        return (await self.aget_models())[0]
+
+    def invalidate_models(self):
+        """Forget the cached model list so the next lookup refetches it."""
+        self._models = None
+
+    def close(self):
+        """Close the synchronous client's connection pool."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+_default_manager: Optional[ClientManager] = None
+_default_lock = threading.Lock()
+
+
+def get_client_manager() -> ClientManager:
+    """Return the process-wide ClientManager, creating it on first use."""
+    global _default_manager
+    with _default_lock:
+        if _default_manager is None:
+            _default_manager = ClientManager()
+        return _default_manager
+
+
+def configure(**kwargs) -> ClientManager:
+    """
+    Replace the process-wide ClientManager.
+
+    Args:
+        **kwargs: Any ClientManager argument (base_url, api_key, pool_size, ...)
+
+    Returns:
+        The new default manager
+    """
+    global _default_manager
+    with _default_lock:
+        if _default_manager is not None:
+            _default_manager.close()
+        _default_manager = ClientManager(**kwargs)
+        return _default_manager
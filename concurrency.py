@@ -0,0 +1,320 @@
+import asyncio
+import collections
+import contextlib
+import statistics
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import openai
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """True for errors that suggest the server is overloaded or unreachable."""
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError, httpx.TransportError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None and isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    return status is not None and (status == 429 or status >= 500)
+
+
+class _Waiter:
+    __slots__ = ("event", "future", "loop")
+
+    def __init__(self, event=None, future=None, loop=None):
+        self.event = event
+        self.future = future
+        self.loop = loop
+
+
+class _Sample:
+    """Outcome of one call made in a limiter slot; the caller fills in `tokens` if known."""
+
+    __slots__ = ("tokens",)
+
+    def __init__(self):
+        self.tokens: Optional[int] = None
+
+
+def _deadline_exceeded(timeout: float) -> Exception:
+    # Imported here: resilience imports this module
+    from resilience import DeadlineExceeded
+    return DeadlineExceeded(f"No concurrency slot came free within {timeout:.1f}s")
+
+
+class AdaptiveLimiter:
+    """
+    Limits the number of in-flight LLM completions and adapts the limit.
+
+    Each completion's latency is compared with the mean latency of recent
+    completions of a similar size (by completion tokens, in powers of two,
+    when the caller reports them), so short tool-call turns and long answers
+    are each judged against their own kind. Every `sample_size` completions
+    the trimmed mean of those ratios decides the limit: it grows by one while
+    the batch stays within `latency_tolerance` and the limit was in use, and
+    shrinks multiplicatively when latency climbs past it (requests are
+    queueing server-side) or the server returns overload errors. Judging
+    batches against recent history, rather than single calls against the
+    fastest call ever seen, keeps ordinary variation from shrinking the limit;
+    congested batches are left out of that history so it doesn't absorb the
+    queueing it should detect.
+
+    One limiter can be shared by threads and by coroutines on any number of
+    event loops; waiters are served first come, first served.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.9,
+        error_backoff: float = 0.5,
+        baseline_window: int = 200,
+        sample_size: int = 20
+    ):
+        """
+        Args:
+            initial_limit: Completions allowed in flight at start
+            min_limit: Lowest the limit can shrink to
+            max_limit: Highest the limit can grow to
+            latency_tolerance: Latency/baseline ratio of a batch above which the limit shrinks
+            backoff: Factor applied to the limit when latency is too high
+            error_backoff: Factor applied to the limit on overload errors
+            baseline_window: Recent completions per size class whose mean is the baseline
+            sample_size: Completions per batch the limit is adjusted after
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.error_backoff = error_backoff
+        self.baseline_window = baseline_window
+        self.sample_size = sample_size
+
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+        # Recent latencies per size class (bit length of the completion tokens)
+        self._history: Dict[int, collections.deque] = {}
+        self._batch = []
+        # Whether the limit was fully used at some point during the batch
+        self._batch_saturated = False
+        self._last_latency: Optional[float] = None
+        self._last_ratio: Optional[float] = None
+        self._completed = 0
+        self._errors = 0
+
+    @property
+    def limit(self) -> int:
+        """Current number of completions allowed in flight."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of callers waiting for a slot."""
+        return len(self._waiters)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the limiter's state."""
+        with self._lock:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "last_latency": self._last_latency,
+                "latency_ratio": self._last_ratio,
+                "completed": self._completed,
+                "errors": self._errors
+            }
+
+    def _grant_locked(self):
+        """Hand free slots to waiters, oldest first. Caller holds the lock."""
+        while self._waiters and self._in_flight < int(self._limit):
+            waiter = self._waiters.popleft()
+            self._in_flight += 1
+            if waiter.event is not None:
+                waiter.event.set()
+            else:
+                waiter.loop.call_soon_threadsafe(self._deliver, waiter.future)
+
+    def _deliver(self, future):
+        if future.cancelled():
+            # The waiter gave up after its slot was granted; pass it on
+            self._release_slot()
+        else:
+            future.set_result(None)
+
+    def _release_slot(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._grant_locked()
+
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        Block the calling thread until a slot is free.
+
+        Args:
+            timeout: Seconds to wait at most (None to wait for as long as it takes)
+
+        Raises:
+            DeadlineExceeded: If no slot came free in time
+        """
+        with self._lock:
+            if not self._waiters and self._in_flight < int(self._limit):
+                self._in_flight += 1
+                return
+            waiter = _Waiter(event=threading.Event())
+            self._waiters.append(waiter)
+        if waiter.event.wait(timeout):
+            return
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                # Granted just as the wait ran out; keep the slot
+                return
+        raise _deadline_exceeded(timeout)
+
+    async def aacquire(self, timeout: Optional[float] = None):
+        """Wait on the running event loop until a slot is free; async version of acquire()."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._in_flight < int(self._limit):
+                self._in_flight += 1
+                return
+            waiter = _Waiter(future=loop.create_future(), loop=loop)
+            self._waiters.append(waiter)
+        try:
+            # On timeout wait_for cancels the future, so a slot granted meanwhile is passed on
+            await asyncio.wait_for(waiter.future, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    granted = False
+                except ValueError:
+                    granted = True
+            if granted and waiter.future.done() and not waiter.future.cancelled():
+                self._release_slot()
+            if isinstance(e, asyncio.TimeoutError):
+                raise _deadline_exceeded(timeout) from None
+            raise
+
+    def release(self, latency: Optional[float] = None, error: Optional[BaseException] = None,
+                tokens: Optional[int] = None):
+        """
+        Return a slot and feed the outcome of the completion into the limit.
+
+        Args:
+            latency: Seconds the completion took (None to not adjust the limit)
+            error: Exception the completion raised, if any
+            tokens: Completion tokens generated, to compare latency with completions of
+                a similar size (optional)
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if error is not None:
+                if is_overload_error(error):
+                    self._errors += 1
+                    self._limit = max(self.min_limit, self._limit * self.error_backoff)
+            elif latency is not None:
+                self._completed += 1
+                self._observe_locked(latency, tokens)
+            self._grant_locked()
+
+    def _observe_locked(self, latency: float, tokens: Optional[int]):
+        self._last_latency = latency
+        if self._in_flight + 1 >= int(self._limit):
+            self._batch_saturated = True
+        size_class = tokens.bit_length() if tokens else 0
+        history = self._history.get(size_class)
+        if history is None:
+            history = self._history[size_class] = collections.deque(maxlen=self.baseline_window)
+        if len(history) < self.sample_size:
+            # Not enough history for this size of completion yet
+            history.append(latency)
+            return
+        self._batch.append((history, latency, latency / max(statistics.fmean(history), 1e-9)))
+        if len(self._batch) < self.sample_size:
+            return
+        # Trimmed mean: not thrown by one stray slow call
+        ratios = sorted(ratio for _, _, ratio in self._batch)
+        trim = len(ratios) // 10
+        ratio = statistics.fmean(ratios[trim:len(ratios) - trim])
+        batch, saturated = self._batch, self._batch_saturated
+        self._batch = []
+        self._batch_saturated = False
+        self._last_ratio = ratio
+        congested = ratio > self.latency_tolerance
+        if congested:
+            self._limit = max(self.min_limit, self._limit * self.backoff)
+        elif saturated:
+            # Only grow while the current limit is actually being used
+            self._limit = min(self.max_limit, self._limit + 1.0)
+        if not congested or self._limit <= self.min_limit:
+            # Congested batches don't raise the baseline, unless latency stays high even
+            # at the lowest limit (the server itself got slower)
+            for history, latency, _ in batch:
+                history.append(latency)
+
+    @contextlib.contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        """
+        Hold a slot for the duration of the block, recording its latency.
+        Yields a sample whose `tokens` the block can set to the completion tokens generated.
+
+        Args:
+            timeout: Seconds to wait for the slot at most (see acquire())
+        """
+        self.acquire(timeout)
+        sample = _Sample()
+        start = time.monotonic()
+        try:
+            yield sample
+        except BaseException as e:
+            self.release(error=e)
+            raise
+        self.release(latency=time.monotonic() - start, tokens=sample.tokens)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, timeout: Optional[float] = None):
+        """Async version of slot()."""
+        await self.aacquire(timeout)
+        sample = _Sample()
+        start = time.monotonic()
+        try:
+            yield sample
+        except BaseException as e:
+            self.release(error=e)
+            raise
+        self.release(latency=time.monotonic() - start, tokens=sample.tokens)
+
+
+_default_limiter: Optional[AdaptiveLimiter] = None
+_default_lock = threading.Lock()
+
+
+def get_limiter() -> AdaptiveLimiter:
+    """Return the process-wide AdaptiveLimiter, creating it on first use."""
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            _default_limiter = AdaptiveLimiter()
+        return _default_limiter
+
+
+def configure(**kwargs) -> AdaptiveLimiter:
+    """Replace the process-wide limiter (takes AdaptiveLimiter arguments)."""
+    global _default_limiter
+    with _default_lock:
+        _default_limiter = AdaptiveLimiter(**kwargs)
+        return _default_limiter
@@ -0,0 +1,171 @@
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+_MISSING = object()
+
+
+class Message(Mapping):
+    """
+    Compact chat message record (not modified once it is in a conversation).
+
+    Stores the standard fields in slots instead of a per-message dict, and
+    behaves as a Mapping, so code reading messages with `message["role"]`,
+    `message.get("content")` or `dict(message, ...)` works unchanged.
+    Fields that were never set are absent, as in the original dict.
+    """
+
+    __slots__ = ("role", "content", "tool_calls", "tool_call_id", "name", "extra")
+
+    _FIELDS = ("role", "content", "tool_calls", "tool_call_id", "name")
+
+    def __init__(self, role=_MISSING, content=_MISSING, tool_calls=_MISSING, tool_call_id=_MISSING,
+                 name=_MISSING, extra: Optional[Dict[str, Any]] = None):
+        self.role = role
+        self.content = content
+        self.tool_calls = tool_calls
+        self.tool_call_id = tool_call_id
+        self.name = name
+        # Any non-standard fields (rare)
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, message: Mapping) -> "Message":
+        if isinstance(message, Message):
+            return message
+        known = {key: value for key, value in message.items() if key in cls._FIELDS}
+        extra = {key: value for key, value in message.items() if key not in cls._FIELDS}
+        return cls(**known, extra=extra or None)
+
+    def __getitem__(self, key):
+        if key in self._FIELDS:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for field in self._FIELDS:
+            if getattr(self, field) is not _MISSING:
+                yield field
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def __repr__(self):
+        return f"Message({self.to_dict()!r})"
+
+
+def json_default(value):
+    """`default` hook for json.dumps: Messages as objects, Conversations as arrays, anything else as str."""
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return list(value)
+    return str(value)
+
+
+class _Segment:
+    """Immutable run of messages shared by every conversation forked after it."""
+
+    __slots__ = ("parent", "messages", "length")
+
+    def __init__(self, parent: Optional["_Segment"], messages: tuple):
+        self.parent = parent
+        self.messages = messages
+        self.length = (parent.length if parent is not None else 0) + len(messages)
+
+
+class Conversation(Sequence):
+    """
+    Message list that can be forked in O(1) memory.
+
+    Messages live in a chain of immutable segments plus a private tail that
+    appends go to. fork() freezes the tail into a new segment shared by both
+    conversations, so each branch only holds the messages appended since it
+    was forked. Indexing, slicing and iteration behave like a list (slices
+    return lists); messages are stored as Message records.
+    """
+
+    __slots__ = ("_head", "_tail")
+
+    def __init__(self, messages: Iterable[Mapping] = ()):
+        self._head: Optional[_Segment] = None
+        self._tail: List[Message] = [Message.from_dict(message) for message in messages]
+
+    def __len__(self):
+        return (self._head.length if self._head is not None else 0) + len(self._tail)
+
+    def _segments(self) -> List[_Segment]:
+        segments = []
+        segment = self._head
+        while segment is not None:
+            segments.append(segment)
+            segment = segment.parent
+        segments.reverse()
+        return segments
+
+    def __iter__(self) -> Iterator[Message]:
+        for segment in self._segments():
+            yield from segment.messages
+        yield from self._tail
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("conversation index out of range")
+        shared = self._head.length if self._head is not None else 0
+        if index >= shared:
+            return self._tail[index - shared]
+        segment = self._head
+        while index < segment.length - len(segment.messages):
+            segment = segment.parent
+        return segment.messages[index - (segment.length - len(segment.messages))]
+
+    def append(self, message: Mapping):
+        self._tail.append(Message.from_dict(message))
+
+    def extend(self, messages: Iterable[Mapping]):
+        for message in messages:
+            self.append(message)
+
+    def insert(self, index: int, message: Mapping):
+        """Insert a message; inserting into the shared part unshares this conversation."""
+        if index < 0:
+            index = max(0, index + len(self))
+        shared = self._head.length if self._head is not None else 0
+        if index >= shared:
+            self._tail.insert(index - shared, Message.from_dict(message))
+            return
+        messages = list(self)
+        messages.insert(index, Message.from_dict(message))
+        self._head, self._tail = None, messages
+
+    def fork(self) -> "Conversation":
+        """Return a conversation with the same messages that shares them with this one."""
+        if self._tail:
+            self._head = _Segment(self._head, tuple(self._tail))
+            self._tail = []
+        branch = Conversation()
+        branch._head = self._head
+        return branch
+
+    def copy(self) -> List[Message]:
+        return list(self)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Plain dict messages, for APIs that need them."""
+        return [message.to_dict() for message in self]
+
+    def __repr__(self):
+        return f"Conversation({self.to_dicts()!r})"
@@ -0,0 +1,269 @@
+import asyncio
+import contextlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence
+
+import openai
+
+from clients import DEFAULT_API_KEY, ClientManager
+from concurrency import is_overload_error
+
+STRATEGIES = ("least_outstanding", "ewma")
+
+
+def is_endpoint_failure(exc: BaseException) -> bool:
+    """True for errors that suggest the endpoint is down (not merely busy: 429 doesn't count)."""
+    return is_overload_error(exc) and getattr(exc, "status_code", None) != 429
+
+
+class Endpoint:
+    """One OpenAI-compatible server in an EndpointPool, with its own pooled clients."""
+
+    def __init__(self, base_url: str, api_key: str = DEFAULT_API_KEY, models: Optional[Sequence[str]] = None,
+                 name: Optional[str] = None, **client_options):
+        """
+        Args:
+            base_url: OpenAI-compatible API base URL
+            api_key: API key sent with every request
+            models: Models this endpoint serves (optional, learned from /models by
+                health checks if not given; until then it is assumed to serve any)
+            name: Label for stats and logs (defaults to base_url)
+            **client_options: Other ClientManager arguments (pool_size, ...)
+        """
+        self.base_url = base_url
+        self.name = name or base_url
+        self.declared_models = list(models) if models else None
+        self.learned_models: Optional[List[str]] = None
+        self.manager = ClientManager(base_url=base_url, api_key=api_key, **client_options)
+        self.outstanding = 0
+        # Smoothed call latency in seconds (None until the first call finishes)
+        self.ewma: Optional[float] = None
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def models(self) -> Optional[List[str]]:
+        return self.declared_models or self.learned_models
+
+    def serves(self, model: Optional[str]) -> bool:
+        models = self.models
+        return model is None or models is None or model in models
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "outstanding": self.outstanding,
+            "ewma_s": round(self.ewma, 4) if self.ewma is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejected": not self.available(time.monotonic()),
+            "models": self.models,
+        }
+
+
+class EndpointPool:
+    """
+    Routes LLM calls across several OpenAI-compatible endpoints.
+
+    Each call goes to an endpoint serving the requested model, chosen by
+    fewest outstanding requests ("least_outstanding") or by smoothed latency
+    weighted by outstanding requests ("ewma"). A conversation stays on the
+    endpoint it started on, so the server's prompt (KV) cache is reused,
+    unless that endpoint is ejected.
+
+    An endpoint is ejected for `eject_seconds` after `max_failures`
+    consecutive connection errors or 5xx responses (passive health), and is
+    also checked through /models by health_check() (active health). If every
+    endpoint serving a model is ejected, calls are routed to them anyway
+    rather than failing outright.
+    """
+
+    def __init__(
+        self,
+        endpoints: Iterable[Endpoint],
+        strategy: str = "least_outstanding",
+        ewma_weight: float = 0.3,
+        max_failures: int = 3,
+        eject_seconds: float = 30.0,
+        max_conversations: int = 10000
+    ):
+        """
+        Args:
+            endpoints: Endpoints (or base URLs) to route across
+            strategy: "least_outstanding" or "ewma"
+            ewma_weight: Weight of the newest latency sample in the moving average
+            max_failures: Consecutive failures before an endpoint is ejected
+            eject_seconds: How long an ejected endpoint is skipped
+            max_conversations: Conversation-to-endpoint assignments kept (LRU)
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown routing strategy: {strategy!r}")
+        self.endpoints = [Endpoint(e) if isinstance(e, str) else e for e in endpoints]
+        if not self.endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.strategy = strategy
+        self.ewma_weight = ewma_weight
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.max_conversations = max_conversations
+        self._sticky: "OrderedDict[Hashable, Endpoint]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+        self._health_stop = threading.Event()
+
+    def _score(self, endpoint: Endpoint):
+        if self.strategy == "ewma":
+            # Unmeasured endpoints score 0 so they get probed first
+            return ((endpoint.ewma or 0.0) * (endpoint.outstanding + 1), endpoint.outstanding)
+        return (endpoint.outstanding, endpoint.ewma or 0.0)
+
+    def acquire(self, model: Optional[str] = None, conversation: Optional[Hashable] = None) -> Endpoint:
+        """
+        Pick an endpoint for one call and count it as outstanding; pair with release().
+
+        Raises:
+            LookupError: If no endpoint serves `model`
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints if endpoint.serves(model)]
+            if not candidates:
+                raise LookupError(f"No endpoint serves model {model!r}")
+            available = [endpoint for endpoint in candidates if endpoint.available(now)] or candidates
+            endpoint = self._sticky.get(conversation) if conversation is not None else None
+            if endpoint is not None and endpoint in available:
+                self._sticky.move_to_end(conversation)
+            else:
+                endpoint = min(available, key=self._score)
+                if conversation is not None:
+                    self._sticky[conversation] = endpoint
+                    self._sticky.move_to_end(conversation)
+                    while len(self._sticky) > self.max_conversations:
+                        self._sticky.popitem(last=False)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, latency: Optional[float] = None, error: Optional[BaseException] = None):
+        """Record the outcome of a call made through acquire()."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is not None and is_endpoint_failure(error):
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.failures >= self.max_failures:
+                    endpoint.ejected_until = time.monotonic() + self.eject_seconds
+                return
+            if error is None:
+                endpoint.failures = 0
+            if latency is not None and error is None:
+                endpoint.ewma = latency if endpoint.ewma is None else (
+                    self.ewma_weight * latency + (1 - self.ewma_weight) * endpoint.ewma)
+
+    @contextlib.contextmanager
+    def request(self, model: Optional[str] = None, conversation: Optional[Hashable] = None):
+        """Context manager around one call: yields the chosen Endpoint and records the outcome."""
+        endpoint = self.acquire(model, conversation)
+        start = time.perf_counter()
+        try:
+            yield endpoint
+        except BaseException as e:
+            self.release(endpoint, error=e)
+            raise
+        self.release(endpoint, time.perf_counter() - start)
+
+    def _mark_health(self, endpoint: Endpoint, models: Optional[List[str]]):
+        with self._lock:
+            if models is None:
+                endpoint.failures = max(endpoint.failures, self.max_failures)
+                endpoint.ejected_until = time.monotonic() + self.eject_seconds
+            else:
+                endpoint.learned_models = models
+                endpoint.failures = 0
+                endpoint.ejected_until = 0.0
+
+    def health_check(self, timeout: float = 5.0) -> Dict[str, bool]:
+        """Query /models on every endpoint, ejecting the ones that don't answer and restoring the ones that do."""
+        results = {}
+        for endpoint in self.endpoints:
+            try:
+                response = endpoint.manager.client().with_options(timeout=timeout, max_retries=0).models.list()
+                models = [m.id for m in response.data]
+            except (openai.OpenAIError, OSError):
+                models = None
+            self._mark_health(endpoint, models)
+            results[endpoint.name] = models is not None
+        return results
+
+    async def ahealth_check(self, timeout: float = 5.0) -> Dict[str, bool]:
+        """Async version of health_check(); checks every endpoint concurrently."""
+        async def check(endpoint):
+            try:
+                client = endpoint.manager.async_client().with_options(timeout=timeout, max_retries=0)
+                models = [m.id for m in (await client.models.list()).data]
+            except (openai.OpenAIError, OSError):
+                models = None
+            self._mark_health(endpoint, models)
+            return endpoint.name, models is not None
+        return dict(await asyncio.gather(*(check(endpoint) for endpoint in self.endpoints)))
+
+    def start_health_checks(self, interval: float = 10.0, timeout: float = 5.0):
+        """Run health_check() every `interval` seconds on a background thread."""
+        if self._health_thread is not None:
+            return
+        self._health_stop.clear()
+
+        def loop():
+            while not self._health_stop.wait(interval):
+                self.health_check(timeout)
+
+        self._health_thread = threading.Thread(target=loop, name="endpoint-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self):
+        if self._health_thread is not None:
+            self._health_stop.set()
+            self._health_thread.join()
+            self._health_thread = None
+
+    def _first_model(self) -> Optional[str]:
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            if endpoint.available(now) and endpoint.models:
+                return endpoint.models[0]
+        return None
+
+    def get_model(self) -> str:
+        """Default model: the first one served by an available endpoint (health-checks if none is known)."""
+        model = self._first_model()
+        if model is None:
+            self.health_check()
+            model = self._first_model()
+        if model is None:
+            raise LookupError("No available endpoint reported a model")
+        return model
+
+    async def aget_model(self) -> str:
+        """Async version of get_model()."""
+        model = self._first_model()
+        if model is None:
+            await self.ahealth_check()
+            model = self._first_model()
+        if model is None:
+            raise LookupError("No available endpoint reported a model")
+        return model
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {endpoint.name: endpoint.stats() for endpoint in self.endpoints}
+
+    def close(self):
+        self.stop_health_checks()
+        for endpoint in self.endpoints:
+            endpoint.manager.close()
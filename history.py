@@ -0,0 +1,216 @@
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Wrappers Agent._append_tool_results puts around tool output
+TOOL_RESULT_PREFIXES = (
+    "I called the weather function and got: ",
+    "I listed the files and found: ",
+    "I saved the file: ",
+    "I read the file: ",
+    "I called the functions and got: ",
+)
+
+# Rough per-message cost of role markers and separators in chat templates
+MESSAGE_OVERHEAD_TOKENS = 4
+
+TRUNCATION_MARKER = "... [truncated {count} chars]"
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap local token estimate (about four characters per token)."""
+    if not text:
+        return 0
+    return (len(text) + 3) // 4
+
+
+def estimate_message_tokens(message: Dict) -> int:
+    """Estimate the prompt tokens one message costs."""
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get("content"))
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += estimate_tokens(function.get("name")) + estimate_tokens(function.get("arguments"))
+    return tokens
+
+
+def estimate_messages_tokens(messages: Sequence[Dict]) -> int:
+    """Estimate the prompt tokens a whole conversation costs."""
+    return sum(estimate_message_tokens(message) for message in messages)
+
+
+def is_tool_output(message: Dict) -> bool:
+    """True for messages carrying tool results."""
+    if message.get("role") == "tool":
+        return True
+    content = message.get("content")
+    return (message.get("role") == "user" and isinstance(content, str)
+            and content.startswith(TOOL_RESULT_PREFIXES))
+
+
+def _split_system(messages: List[Dict]):
+    if messages and messages[0].get("role") == "system":
+        return messages[:1], messages[1:]
+    return [], messages
+
+
+class TruncateToolOutputs:
+    """Cut long tool outputs in older messages down to `max_chars`."""
+
+    def __init__(self, max_chars: int = 500, keep_recent: int = 2):
+        """
+        Args:
+            max_chars: Characters of each old tool output to keep
+            keep_recent: Number of most recent messages left untouched
+        """
+        self.max_chars = max_chars
+        self.keep_recent = keep_recent
+
+    def apply(self, messages: List[Dict], budget: int) -> List[Dict]:
+        cutoff = max(0, len(messages) - self.keep_recent)
+        compacted = []
+        for index, message in enumerate(messages):
+            content = message.get("content")
+            if (index < cutoff and is_tool_output(message) and isinstance(content, str)
+                    and len(content) > self.max_chars):
+                dropped = len(content) - self.max_chars
+                message = dict(message, content=content[:self.max_chars] + TRUNCATION_MARKER.format(count=dropped))
+            compacted.append(message)
+        return compacted
+
+
+class SlidingWindow:
+    """
+    Keep the system message, the latest user message and as many of the
+    latest messages as fit.
+
+    The window never opens on tool results without the assistant message
+    whose calls they answer. If the messages it has to keep still don't fit,
+    their tool outputs are shortened, oldest first.
+    """
+
+    def __init__(self, min_recent: int = 1):
+        """
+        Args:
+            min_recent: Latest messages kept even if they exceed the budget
+        """
+        self.min_recent = min_recent
+
+    def apply(self, messages: List[Dict], budget: int) -> List[Dict]:
+        head, rest = _split_system(messages)
+        user = _latest_user_message(rest)
+        floor = user + 1 if user is not None else 0
+        remaining = budget - estimate_messages_tokens(head)
+        if user is not None:
+            remaining -= estimate_message_tokens(rest[user])
+        start = len(rest)
+        while start > floor:
+            cost = estimate_message_tokens(rest[start - 1])
+            if len(rest) - start >= self.min_recent and cost > remaining:
+                break
+            remaining -= cost
+            start -= 1
+        # Tool results can't lead the window without the call they answer
+        while floor < start < len(rest) and rest[start].get("role") == "tool":
+            start -= 1
+        while start < len(rest) and rest[start].get("role") == "tool":
+            start += 1
+        window = rest[start:]
+        if user is not None:
+            # Keep the request the rest of the window is working on
+            window = [rest[user]] + window
+        excess = estimate_messages_tokens(head + window) - budget
+        if excess > 0:
+            window = _shrink_tool_outputs(window, excess)
+        return head + window
+
+
+def _latest_user_message(messages: List[Dict]) -> Optional[int]:
+    """Index of the last message the user wrote (not a tool result), or None."""
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index].get("role") == "user" and not is_tool_output(messages[index]):
+            return index
+    return None
+
+
+def _shrink_tool_outputs(messages: List[Dict], excess: int) -> List[Dict]:
+    """Cut tool outputs, oldest first, until about `excess` tokens are saved."""
+    shrunk = []
+    for message in messages:
+        content = message.get("content")
+        if excess > 0 and is_tool_output(message) and isinstance(content, str):
+            keep = max(0, len(content) - 4 * excess - len(TRUNCATION_MARKER))
+            if keep < len(content):
+                cut = content[:keep] + TRUNCATION_MARKER.format(count=len(content) - keep)
+                excess -= estimate_tokens(content) - estimate_tokens(cut)
+                message = dict(message, content=cut)
+        shrunk.append(message)
+    return shrunk
+
+
+def _extractive_summary(messages: List[Dict], max_chars_per_message: int = 200) -> str:
+    lines = []
+    for message in messages:
+        content = (message.get("content") or "").strip().replace("\n", " ")
+        if content:
+            lines.append(f"{message.get('role')}: {content[:max_chars_per_message]}")
+    return "\n".join(lines)
+
+
+class SummarizeOlderTurns:
+    """Replace everything but the latest messages with a single summary message."""
+
+    def __init__(self, summarizer: Optional[Callable[[List[Dict]], str]] = None, keep_recent: int = 4):
+        """
+        Args:
+            summarizer: Function turning a list of messages into summary text
+                (e.g. an LLM call); defaults to a cheap extractive summary
+            keep_recent: Number of most recent messages kept verbatim
+        """
+        self.summarizer = summarizer or _extractive_summary
+        self.keep_recent = keep_recent
+
+    def apply(self, messages: List[Dict], budget: int) -> List[Dict]:
+        head, rest = _split_system(messages)
+        cutoff = len(rest) - self.keep_recent
+        # Don't separate tool results from the call they answer
+        while cutoff > 0 and rest[cutoff].get("role") == "tool":
+            cutoff -= 1
+        if cutoff <= 0:
+            return messages
+        summary = self.summarizer(rest[:cutoff])
+        summary_message = {"role": "user", "content": f"Summary of the earlier conversation:\n{summary}"}
+        return head + [summary_message] + rest[cutoff:]
+
+
+class HistoryManager:
+    """
+    Keeps a conversation within a prompt token budget.
+
+    When the estimated size exceeds the budget, each strategy is applied in
+    turn until the conversation fits again.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 8000,
+        strategies: Optional[Sequence] = None,
+        estimator: Callable[[Sequence[Dict]], int] = estimate_messages_tokens
+    ):
+        """
+        Args:
+            token_budget: Maximum estimated prompt tokens for the history
+            strategies: Objects with an apply(messages, budget) method, tried in
+                order (defaults to truncating tool outputs, then a sliding window)
+            estimator: Function estimating the token size of a message list
+        """
+        self.token_budget = token_budget
+        self.strategies = list(strategies) if strategies is not None else [TruncateToolOutputs(), SlidingWindow()]
+        self.estimator = estimator
+
+    def compact(self, messages: List[Dict]) -> List[Dict]:
+        """Return `messages` unchanged if within budget, else a compacted copy."""
+        if self.estimator(messages) <= self.token_budget:
+            return messages
+        for strategy in self.strategies:
+            messages = strategy.apply(messages, self.token_budget)
+            if self.estimator(messages) <= self.token_budget:
+                break
+        return messages
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from conversation import json_default
+
+# Record types, in the order a run writes them:
+#   messages      snapshot of the whole conversation (first write, and after
+#                 the conversation was replaced, e.g. by history compaction)
+#   message       one message appended to the conversation
+#   run           a run started with `user_message`
+#   response      the model's reply for a turn: content and parsed tool calls
+#   tool_results  results of the turn's tool calls, in call order
+#   turn          the turn's messages are in the conversation; nothing pending
+#   final         the run finished with `content`
+
+
+class Journal:
+    """
+    Append-only JSONL log of an agent's conversation and progress.
+
+    Every record is flushed to the OS as it is written, so a crashed process
+    loses nothing; records are fsynced at most every `fsync_interval`
+    seconds (and always at the end of a run), which bounds what a power
+    loss can take. A torn last line from a crash mid-write is ignored on
+    read.
+    """
+
+    def __init__(self, path: str, fsync_interval: float = 1.0):
+        """
+        Args:
+            path: JSONL file to append to (created if missing)
+            fsync_interval: Most seconds between fsyncs; 0 fsyncs every record
+        """
+        self.path = path
+        self.fsync_interval = fsync_interval
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def write(self, record_type: str, sync: bool = False, **fields):
+        """Append one record; `sync` forces an fsync."""
+        line = json.dumps({"type": record_type, "time": time.time(), **fields},
+                          separators=(',', ':'), ensure_ascii=False, default=json_default)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            now = time.monotonic()
+            if sync or now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Read back every complete record."""
+        with self._lock:
+            self._file.flush()
+        return read_records(self.path)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_records(path: str) -> List[Dict[str, Any]]:
+    """Records of a journal file, skipping a torn trailing line."""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Only the last line can be torn; anything after it was never written
+                break
+    return records
+
+
+class JournalState:
+    """Conversation and in-progress turn rebuilt from a journal."""
+
+    def __init__(self):
+        self.messages: List[Dict[str, Any]] = []
+        # User message of the run in progress (None if the last run finished)
+        self.user_message: Optional[str] = None
+        # Recorded model reply whose turn wasn't completed: {"content", "tool_calls"}
+        self.response: Optional[Dict[str, Any]] = None
+        # Recorded results for that reply's tool calls, if they all finished
+        self.tool_results: Optional[List[Any]] = None
+        self.final: Optional[str] = None
+
+    @property
+    def in_run(self) -> bool:
+        return self.user_message is not None
+
+
+def replay(records: List[Dict[str, Any]]) -> JournalState:
+    """Fold journal records into the state the agent had after the last one."""
+    state = JournalState()
+    for record in records:
+        record_type = record.get("type")
+        if record_type == "messages":
+            state.messages = list(record["messages"])
+        elif record_type == "message":
+            state.messages.append(record["message"])
+        elif record_type == "run":
+            state.user_message = record["user_message"]
+            state.final = None
+        elif record_type == "response":
+            state.response = {"content": record.get("content", ""), "tool_calls": record.get("tool_calls", [])}
+            state.tool_results = None
+        elif record_type == "tool_results":
+            state.tool_results = record["results"]
+        elif record_type == "turn":
+            state.response = state.tool_results = None
+        elif record_type == "final":
+            state.user_message = state.response = state.tool_results = None
+            state.final = record.get("content")
+    return state
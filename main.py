@@ -1,54 +1,113 @@
 import json
+import os
 import time
-import concurrent.futures
+import asyncio
 from pathlib import Path
 from tools import get_tools, get_tool_funcs
+from tool_registry import default_registry
 import xml_utils
-from agent import Agent
-import openai
+from agent import AsyncAgent
+from budget import RunBudget
+from clients import get_client_manager
+from endpoints import EndpointPool
+from workflow import TaskSkipped, Workflow
 
 tool_funcs = get_tool_funcs()
 TOOLS = get_tools()
+# Send each agent only the tools that plausibly apply to its role and prompt
+tool_selector = default_registry.selector()
 
-def run_agent_task(agent_config):
+async def run_agent_task(agent_config, client, model, semaphore=None, endpoints=None, budget=None, cancel_token=None):
     """
-    Task function to run a single agent.
-    This will be executed in a separate thread.
+    Task coroutine to run a single agent.
+    All agents share one event loop and one async client (or endpoint pool).
     """
     agent_id, message, system_message = agent_config
-    
-    # Create client for this thread
-    client = openai.OpenAI(
-        base_url="http://localhost:1234/v1",
-        api_key="lm-studio"
-    )
-    
-    # Get model
-    model = client.models.list().data[0].id
-    
+
     # Create agent
-    agent = Agent(
+    agent = AsyncAgent(
         messages=[],
         tools=TOOLS,
         tool_funcs=tool_funcs,
         model=model,
         temperature=0.3,
         client=client,
-        system_message=system_message
+        system_message=system_message,
+        tool_cache=True,
+        tool_selector=tool_selector,
+        endpoints=endpoints,
+        budget=budget,
+        cancel_token=cancel_token
     )
-    
-    print(f"🚀 Starting Agent {agent_id} with message: {message}")
-    
-    # Run the agent
-    result = agent.run(message)
-    
+
+    if semaphore is None:
+        print(f"🚀 Starting Agent {agent_id} with message: {message}")
+        result = await agent.arun(message)
+    else:
+        async with semaphore:
+            print(f"🚀 Starting Agent {agent_id} with message: {message}")
+            result = await agent.arun(message)
+
     print(f"✅ Agent {agent_id} completed")
     return agent_id, result
 
+async def run_agents(agent_configs, client=None, model=None, max_concurrency=None, endpoints=None,
+                     budget=None, cancel_token=None):
+    """
+    Run agent configurations on the current event loop, each as soon as the
+    agents it depends on have finished (all at once if there are no dependencies).
+
+    Args:
+        agent_configs: List of (agent_id, message, system_message) tuples, optionally with
+            a fourth element listing the agent_ids it depends on. The message may be a
+            function taking {dependency_id: response} and returning the message.
+        client: AsyncOpenAI client shared by every agent (optional, uses the shared pooled client)
+        model: Model name (optional, resolved from the cached model list if not given)
+        max_concurrency: Maximum number of agents in flight (None for no limit)
+        endpoints: EndpointPool to spread the agents' LLM calls over (optional, every
+            call goes through `client` if not given)
+        budget: RunBudget applied to each agent's run (optional)
+        cancel_token: CancelToken that stops every agent still running when cancelled (optional)
+
+    Returns:
+        Dictionary mapping agent_id to the agent's final response (agents that failed,
+        or depend on one that did, are left out)
+    """
+    manager = get_client_manager()
+    client = client or manager.async_client()
+    if model is None:
+        model = await (endpoints.aget_model() if endpoints is not None else manager.aget_model())
+
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    configs = {config[0]: config for config in agent_configs}
+    workflow = Workflow({agent_id: config[3] if len(config) > 3 else () for agent_id, config in configs.items()})
+
+    async def run_task(agent_id, upstream):
+        _, message, system_message = configs[agent_id][:3]
+        if callable(message):
+            message = message(upstream)
+        try:
+            _, result = await run_agent_task((agent_id, message, system_message), client, model, semaphore, endpoints,
+                                             budget, cancel_token)
+        except Exception as exc:
+            print(f"❌ Agent {agent_id} generated an exception: {exc}")
+            raise
+        print(f"📊 Agent {agent_id} result: {result}")
+        return result
+
+    outcomes = await workflow.run(run_task)
+    results = {}
+    for agent_id, outcome in outcomes.items():
+        if isinstance(outcome, TaskSkipped):
+            print(f"⏭️ Agent {agent_id} skipped: {outcome}")
+        elif not isinstance(outcome, Exception):
+            results[agent_id] = outcome
+    return results
+
 def main():
     print("🤖 Multi-Agent Parallel Execution Demo")
     print("=" * 50)
-    
+
     # Define agent configurations
     agent_configs = [
         (1, "What is the weather in Tokyo?", "You are a weather assistant. Get weather information quickly."),
@@ -57,41 +116,33 @@ def main():
         (4, "What is the weather in Sydney?", "You are a weather assistant. Get weather information quickly."),
         (5, "List the files in the current directory.", "You are a file assistant. Help with file operations."),
         (6, "Save a file named 'test' with content 'Hello World2'.", "You are a file assistant. Help with file operations."),
-        (7, "Read the file named 'test.txt'.", "You are a file assistant. Help with file operations."),
+        # Reads the file agent 6 writes, so it starts once agent 6 has finished
+        (7, "Read the file named 'test.txt'.", "You are a file assistant. Help with file operations.", [6]),
         (8, "List the directory contents, pick a .txt file, and then read it. Don't ask for anything else.","You are a file assistant. Help with file operations.")
     ]
-    
-    print(f"📋 Running {len(agent_configs)} agents in parallel")
+
+    print(f"📋 Running {len(agent_configs)} agents in parallel (respecting dependencies)")
     start_time = time.time()
-    
-    # Use ThreadPoolExecutor to run agents in parallel
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        # Submit all tasks
-        future_to_agent = {
-            executor.submit(run_agent_task, config): config[0] 
-            for config in agent_configs
-        }
-        
-        # Collect results as they complete
-        results = {}
-        for future in concurrent.futures.as_completed(future_to_agent):
-            agent_id = future_to_agent[future]
-            try:
-                agent_id, result = future.result()
-                results[agent_id] = result
-                print(f"📊 Agent {agent_id} result: {result}")
-            except Exception as exc:
-                print(f"❌ Agent {agent_id} generated an exception: {exc}")
-    
+
+    # AGENT_ENDPOINTS=http://localhost:1234/v1,http://localhost:1235/v1 spreads the agents over several servers
+    endpoint_urls = [url for url in os.environ.get("AGENT_ENDPOINTS", "").split(",") if url.strip()]
+    endpoints = EndpointPool(url.strip() for url in endpoint_urls) if endpoint_urls else None
+
+    # A model that keeps calling tools would otherwise hold its agent forever
+    budget = RunBudget(max_turns=10, max_seconds=300)
+
+    # Run every agent on a single event loop
+    results = asyncio.run(run_agents(agent_configs, endpoints=endpoints, budget=budget))
+
     total_time = time.time() - start_time
-    
+
     print("\n" + "=" * 50)
     print(f"✅ All agents completed in {total_time:.2f} seconds")
     print("\n📋 Final Results:")
     for agent_id in sorted(results.keys()):
         result = results[agent_id]
         print(f"  Agent {agent_id}: {result}")
-    
+
     print(f"\n🚀 Performance: {len(agent_configs)} agents completed in {total_time:.2f}s")
 
 if __name__ == "__main__":
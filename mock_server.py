@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Local mock of the OpenAI-compatible endpoints LM Studio serves.
+
+Serves GET /v1/models and POST /v1/chat/completions (plain and streamed),
+with configurable latency, decode speed, error rate and scripted tool calls,
+so agents and runners can be exercised and benchmarked without a model.
+
+    python mock_server.py --port 1234 --latency lognormal:0.3,0.5 --tokens-per-s 80
+
+The server runs on one asyncio event loop and keeps connections alive, so it
+can hold thousands of concurrent requests from a single thread.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_MODEL = "mock-model"
+
+
+class LatencyModel:
+    """
+    A distribution of delays in seconds.
+
+    Specs are "kind:params": "constant:0.2", "uniform:0.1,0.5",
+    "normal:0.3,0.05", "lognormal:<median>,<sigma>" or "exponential:<mean>".
+    """
+
+    def __init__(self, spec: str = "constant:0"):
+        kind, _, params = spec.partition(":")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        samplers = {
+            "constant": lambda a: a[0],
+            "uniform": lambda a: random.uniform(a[0], a[1]),
+            "normal": lambda a: random.gauss(a[0], a[1]),
+            "lognormal": lambda a: random.lognormvariate(math.log(a[0]), a[1]),
+            "exponential": lambda a: random.expovariate(1.0 / a[0]),
+        }
+        if kind not in samplers:
+            raise ValueError(f"Unknown latency distribution: {spec!r}")
+        self._sample = samplers[kind]
+
+    def sample(self) -> float:
+        return max(0.0, self._sample(self.params)) if self.params else 0.0
+
+
+class MockConfig:
+    """What the mock server replies and how fast."""
+
+    def __init__(
+        self,
+        models: Sequence[str] = (DEFAULT_MODEL,),
+        latency: str = "constant:0.05",
+        tokens_per_s: float = 0,
+        completion_tokens: int = 24,
+        error_rate: float = 0.0,
+        script: Optional[List[Dict[str, Any]]] = None,
+        xml_tool_calls: bool = False
+    ):
+        """
+        Args:
+            models: Model ids listed by /v1/models
+            latency: Delay before the first token (see LatencyModel)
+            tokens_per_s: Decode speed for content (0 to send it all at once)
+            completion_tokens: Length of generated content replies in tokens
+            error_rate: Fraction of completions answered with a 503
+            script: Replies per turn, indexed by the number of assistant messages
+                already in the conversation; each step is {"content": "..."} or
+                {"tool_calls": [{"name": ..., "arguments": {...}}]}. The last step
+                repeats. Defaults to one call of the first offered tool, then an answer.
+            xml_tool_calls: Emit tool calls as XML in the content instead of tool_calls
+        """
+        self.models = list(models)
+        self.latency = LatencyModel(latency) if isinstance(latency, str) else latency
+        self.tokens_per_s = tokens_per_s
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.script = script
+        self.xml_tool_calls = xml_tool_calls
+
+
+def _placeholder_arguments(tool: Dict[str, Any]) -> Dict[str, Any]:
+    """Arguments for a tool call, filling required parameters with sample values."""
+    parameters = tool.get("function", {}).get("parameters", {})
+    arguments = {}
+    for name in parameters.get("required", []):
+        schema = parameters.get("properties", {}).get(name, {})
+        if "enum" in schema:
+            arguments[name] = schema["enum"][0]
+        elif schema.get("type") in ("integer", "number"):
+            arguments[name] = 1
+        elif schema.get("type") == "boolean":
+            arguments[name] = True
+        else:
+            arguments[name] = f"mock-{name}"
+    return arguments
+
+
+def _content(tokens: int) -> List[str]:
+    """`tokens` word-sized pieces of filler text."""
+    words = ("The", " mock", " server", " says", " hello", " and", " reports", " clear", " skies", ".")
+    return [words[i % len(words)] for i in range(tokens)]
+
+
+class MockLLM:
+    """Decides the reply for a chat completion request."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+
+    def step(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        messages = request.get("messages", [])
+        turn = sum(1 for message in messages if message.get("role") == "assistant")
+        if self.config.script is not None:
+            return self.config.script[min(turn, len(self.config.script) - 1)]
+        tools = request.get("tools") or []
+        if turn == 0 and tools:
+            tool = tools[0]
+            return {"tool_calls": [{"name": tool["function"]["name"], "arguments": _placeholder_arguments(tool)}]}
+        return {"content": "".join(_content(self.config.completion_tokens))}
+
+    @staticmethod
+    def prompt_tokens(request: Dict[str, Any]) -> int:
+        chars = sum(len(str(message.get("content") or "")) for message in request.get("messages", []))
+        chars += len(json.dumps(request.get("tools") or []))
+        return max(1, chars // 4)
+
+
+def _xml_call(call: Dict[str, Any]) -> str:
+    parameters = "".join(f"<parameter={key}>{value}</parameter>" for key, value in call["arguments"].items())
+    return f"<function={call['name']}>{parameters}</function>"
+
+
+class MockServer:
+    """
+    The mock server, run on a background thread with its own event loop.
+
+    Use as a context manager, or call start() and stop():
+
+        with MockServer(MockConfig(latency="uniform:0.1,0.3")) as server:
+            client = openai.OpenAI(base_url=server.url, api_key="mock")
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self.llm = MockLLM(self.config)
+        self.host = host
+        self.port = port
+        self.requests = 0
+        # Completions whose client went away before the whole reply was sent
+        self.aborted = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._connections: set = set()
+
+    @property
+    def url(self) -> str:
+        """Base URL to give an OpenAI client."""
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self._run, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    async def _shutdown(self):
+        self._server.close()
+        # Closing idle keep-alive connections ends their handlers' reads
+        for writer in list(self._connections):
+            writer.close()
+        while self._connections:
+            await asyncio.sleep(0.01)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(self.serve())
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def serve(self) -> asyncio.AbstractServer:
+        """Start listening on the current event loop (for running the server in-loop)."""
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port, backlog=4096)
+        self.port = server.sockets[0].getsockname()[1]
+        return server
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                await self._dispatch(method, path.split("?")[0], body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        if method == "GET" and path.rstrip("/").endswith("/models"):
+            data = [{"id": model, "object": "model", "owned_by": "mock"} for model in self.config.models]
+            await self._send_json(writer, 200, {"object": "list", "data": data})
+        elif method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+            self.requests += 1
+            try:
+                await self._completion(json.loads(body or b"{}"), writer)
+            except ConnectionError:
+                self.aborted += 1
+                raise
+        else:
+            await self._send_json(writer, 404, {"error": {"message": f"No route for {method} {path}"}})
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode()
+        reason = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}.get(status, "Error")
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _completion(self, request: Dict[str, Any], writer: asyncio.StreamWriter):
+        config = self.config
+        await asyncio.sleep(config.latency.sample())
+        if config.error_rate and random.random() < config.error_rate:
+            await self._send_json(writer, 503, {"error": {"message": "Mock overload"}})
+            return
+
+        step = self.llm.step(request)
+        if step.get("tool_calls") and config.xml_tool_calls:
+            step = {"content": "".join(_xml_call(call) for call in step["tool_calls"])}
+        tool_calls = [
+            {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+             "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])}}
+            for call in step.get("tool_calls", [])
+        ]
+        content = step.get("content")
+        pieces = [content] if content else []
+        if content and config.tokens_per_s:
+            # Split into roughly token-sized pieces so decode time scales with length
+            pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        completion_tokens = max(1, len(pieces) + sum(len(call["function"]["arguments"]) // 4 for call in tool_calls))
+        usage = {
+            "prompt_tokens": self.llm.prompt_tokens(request),
+            "completion_tokens": completion_tokens,
+            "total_tokens": self.llm.prompt_tokens(request) + completion_tokens
+        }
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        model = request.get("model") or config.models[0]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        delay = 1.0 / config.tokens_per_s if config.tokens_per_s else 0.0
+
+        if not request.get("stream"):
+            await asyncio.sleep(delay * completion_tokens)
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            await self._send_json(writer, 200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage
+            })
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+
+        async def send_chunk(chunk: Dict[str, Any]):
+            data = f"data: {json.dumps(chunk)}\n\n".encode()
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+
+        async def send(delta: Dict[str, Any], finish: Optional[str] = None):
+            await send_chunk({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+            })
+
+        await send({"role": "assistant", "content": ""})
+        for piece in pieces:
+            if delay:
+                await asyncio.sleep(delay)
+            await send({"content": piece})
+        for index, call in enumerate(tool_calls):
+            await send({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                        "function": {"name": call["function"]["name"], "arguments": ""}}]})
+            arguments = call["function"]["arguments"]
+            for start in range(0, len(arguments), 16):
+                if delay:
+                    await asyncio.sleep(delay)
+                await send({"tool_calls": [{"index": index, "function": {"arguments": arguments[start:start + 16]}}]})
+        await send({}, finish_reason)
+        if (request.get("stream_options") or {}).get("include_usage"):
+            # Like the OpenAI API, usage comes in a last chunk without choices, and only when asked for
+            await send_chunk({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                              "model": model, "choices": [], "usage": usage})
+        done = b"data: [DONE]\n\n"
+        writer.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--model", action="append", help="Model id to list (repeatable)")
+    parser.add_argument("--latency", default="constant:0.05", help="Time to first token, e.g. lognormal:0.3,0.5")
+    parser.add_argument("--tokens-per-s", type=float, default=0, help="Decode speed (0 for instant)")
+    parser.add_argument("--completion-tokens", type=int, default=24, help="Length of content replies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 503 replies")
+    parser.add_argument("--script", help="JSON file with a list of reply steps")
+    parser.add_argument("--xml", action="store_true", help="Emit tool calls as XML content")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            script = json.load(f)
+    config = MockConfig(
+        models=args.model or [DEFAULT_MODEL],
+        latency=args.latency,
+        tokens_per_s=args.tokens_per_s,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        script=script,
+        xml_tool_calls=args.xml
+    )
+    server = MockServer(config, args.host, args.port)
+
+    async def serve_forever():
+        async with await server.serve():
+            print(f"🧪 Mock server listening on {server.url}")
+            await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
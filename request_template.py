@@ -0,0 +1,103 @@
+import json
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from conversation import json_default
+
+# Messages may be conversation.Message records; plain dicts never reach the default hook
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+_prefix_cache: Dict[tuple, tuple] = {}
+_prefix_lock = threading.Lock()
+
+
+def compile_prefix(model: str, tools: Optional[List[Dict]], temperature: float, **static_fields) -> bytes:
+    """
+    Serialize the static part of a chat completion body once.
+
+    Agents configured the same way (same model, temperature, extra fields and
+    the same tools list object) share one cached prefix.
+
+    Returns:
+        The body up to and including the opening bracket of "messages"
+    """
+    key = (model, temperature, id(tools), _encoder.encode(static_fields))
+    with _prefix_lock:
+        cached = _prefix_cache.get(key)
+        # The tools list is kept in the entry so its id can't be reused
+        if cached is not None and cached[0] is tools:
+            return cached[1]
+
+    body = dict(model=model, temperature=temperature, **static_fields)
+    if tools:
+        body["tools"] = tools
+        body["tool_choice"] = "auto"
+    prefix = _encoder.encode(body)[:-1].encode('utf-8') + b',"messages":['
+
+    with _prefix_lock:
+        _prefix_cache[key] = (tools, prefix)
+    return prefix
+
+
+class CompiledRequest:
+    """
+    Builds chat completion request bodies as bytes for one agent configuration.
+
+    The static fields and the tools array are serialized once. Messages are
+    encoded once each and reused on later turns for as long as the message
+    objects stay in the conversation, so each turn only encodes what was
+    appended since the last one. Messages must not be mutated in place after
+    they have been sent.
+    """
+
+    def __init__(self, model: str, tools: Optional[List[Dict]], temperature: float, **static_fields):
+        self.prefix = compile_prefix(model, tools, temperature, **static_fields)
+        self._sources: List[Dict] = []
+        self._encoded: List[bytes] = []
+
+    def body(self, messages: Sequence[Dict]) -> bytes:
+        """Return the full request body for `messages`."""
+        reused = 0
+        limit = min(len(messages), len(self._sources))
+        while reused < limit and messages[reused] is self._sources[reused]:
+            reused += 1
+        del self._sources[reused:]
+        del self._encoded[reused:]
+        for message in messages[reused:]:
+            self._sources.append(message)
+            self._encoded.append(_encoder.encode(message).encode('utf-8'))
+        return self.prefix + b','.join(self._encoded) + b']}'
+
+
+def _request_args(client, body: bytes):
+    # Posts on the SDK client's own pooled httpx client and reuses its auth
+    url = str(client.base_url).rstrip('/') + '/chat/completions'
+    headers = dict(client.auth_headers)
+    headers["Content-Type"] = "application/json"
+    return url, headers
+
+
+def post_completion(client, body: bytes, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Send a pre-serialized body and return the raw JSON response as a dict,
+    skipping the SDK's request validation and pydantic response models.
+
+    Args:
+        client: OpenAI client whose connection pool and credentials are used
+        body: Request body from CompiledRequest.body()
+        timeout: Seconds to allow for the request (defaults to the client's timeout)
+    """
+    url, headers = _request_args(client, body)
+    timeout = client.timeout if timeout is None else timeout
+    response = client._client.post(url, content=body, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    return json.loads(response.content)
+
+
+async def apost_completion(client, body: bytes, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Async version of post_completion() for an AsyncOpenAI client."""
+    url, headers = _request_args(client, body)
+    timeout = client.timeout if timeout is None else timeout
+    response = await client._client.post(url, content=body, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    return json.loads(response.content)
@@ -0,0 +1,280 @@
+import asyncio
+import collections
+import contextlib
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+import openai
+
+from concurrency import is_overload_error
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call or run runs out of time."""
+
+
+class Deadline:
+    """A point in time by which a run (or a single call) has to finish."""
+
+    def __init__(self, seconds: Optional[float], name: str = "Run"):
+        """
+        Args:
+            seconds: Time allowed from now (None for no deadline)
+            name: What the deadline is for, used in the DeadlineExceeded message
+        """
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        self.name = name
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None if there is no deadline."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self):
+        """Raise DeadlineExceeded if the deadline has passed."""
+        if self.expired():
+            raise DeadlineExceeded(f"{self.name} deadline exceeded")
+
+    def timeout(self, call_timeout: Optional[float]) -> Optional[float]:
+        """The timeout for a single call: the smaller of `call_timeout` and the time left."""
+        remaining = self.remaining()
+        if remaining is None:
+            return call_timeout
+        if call_timeout is None:
+            return remaining
+        return min(call_timeout, remaining)
+
+    def for_call(self, call_timeout: Optional[float]) -> "Deadline":
+        """
+        Deadline for one call started now: `call_timeout` away, or this deadline
+        if that is sooner. Streams check it on every chunk, since their HTTP
+        timeout only limits the gap between chunks.
+        """
+        remaining = self.remaining()
+        if call_timeout is None or (remaining is not None and remaining <= call_timeout):
+            return Deadline(remaining, name=self.name)
+        return Deadline(call_timeout, name="Call")
+
+
+def is_timeout_error(exc: BaseException) -> bool:
+    """True for a call that timed out, whether in the OpenAI SDK, httpx (lean HTTP) or asyncio."""
+    return isinstance(exc, (openai.APITimeoutError, httpx.TimeoutException, TimeoutError))
+
+
+@contextlib.contextmanager
+def call_timeout_errors(timeout: Optional[float]):
+    """
+    Raise DeadlineExceeded for a call that ran out of its `timeout`, whether
+    the SDK, httpx or asyncio.wait_for noticed first, so sync and async calls
+    (streamed or not) time out the same way.
+    """
+    try:
+        yield
+    except Exception as e:
+        if timeout is None or isinstance(e, DeadlineExceeded) or not is_timeout_error(e):
+            raise
+        raise DeadlineExceeded(f"Call timed out after {timeout:.1f}s") from e
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for transient errors worth retrying (connection resets, timeouts, 429, 5xx)."""
+    return is_overload_error(exc)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for retryable errors."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        """
+        Args:
+            max_attempts: Total attempts including the first one
+            base_delay: Backoff cap before the first retry, doubled on each retry
+            max_delay: Upper bound on any single backoff
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Backoff before retry number `attempt` (1 for the first retry)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class LatencyTracker:
+    """Sliding window of recent completion latencies."""
+
+    def __init__(self, window: int = 500):
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Latency at `fraction` (e.g. 0.95), or None without samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(fraction * len(samples)))
+        return samples[index]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class HedgePolicy:
+    """
+    Sends a duplicate request when the first one is slower than usual.
+
+    The duplicate goes out once the first request has taken longer than the
+    given percentile of recent latencies; whichever finishes first wins and
+    the other is cancelled, which closes its connection. Hedged calls still
+    add load: up to 1 - percentile of calls are sent twice, and the server
+    has done the loser's work up to the point it was cancelled. Hedging is
+    only done on the async path (acall_with_resilience), where the loser can
+    be cancelled; a thread blocked in a sync request can't be interrupted.
+    """
+
+    def __init__(self, percentile: float = 0.95, min_samples: int = 20, tracker: Optional[LatencyTracker] = None):
+        """
+        Args:
+            percentile: Latency percentile after which the hedge is sent
+            min_samples: Latencies needed before hedging starts
+            tracker: Latency history to use (defaults to the process-wide one)
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.tracker = tracker if tracker is not None else get_latency_tracker()
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None if there isn't enough history."""
+        if len(self.tracker) < self.min_samples:
+            return None
+        return self.tracker.percentile(self.percentile)
+
+
+_latency_tracker = LatencyTracker()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Return the process-wide latency history used for hedging."""
+    return _latency_tracker
+
+
+def call_with_resilience(
+    fn: Callable[[Optional[float]], Any],
+    call_timeout: Optional[float] = None,
+    deadline: Optional[Deadline] = None,
+    retry: Optional[RetryPolicy] = None
+):
+    """
+    Run `fn(timeout)` with deadlines and retries.
+
+    Args:
+        fn: The call to make; receives the timeout (seconds or None) to apply
+        call_timeout: Timeout for each attempt
+        deadline: Overall deadline the attempts must fit in
+        retry: Retry policy for retryable errors (None for a single attempt)
+    """
+    deadline = deadline or Deadline(None)
+    attempts = retry.max_attempts if retry is not None else 1
+    attempt = 0
+    while True:
+        deadline.check()
+        timeout = deadline.timeout(call_timeout)
+        start = time.monotonic()
+        try:
+            with call_timeout_errors(timeout):
+                result = fn(timeout)
+            _latency_tracker.record(time.monotonic() - start)
+            return result
+        except Exception as e:
+            if deadline.expired() and is_timeout_error(e):
+                # The attempt's timeout was cut to the time left
+                raise DeadlineExceeded("Run deadline exceeded") from e
+            attempt += 1
+            if attempt >= attempts or not (is_retryable(e) or _is_call_timeout(e, deadline)):
+                raise
+            backoff = retry.delay(attempt)
+            remaining = deadline.remaining()
+            if remaining is not None and backoff >= remaining:
+                raise
+            time.sleep(backoff)
+
+
+async def _ahedged_call(fn: Callable[[Optional[float]], Awaitable[Any]], timeout: Optional[float], hedge_delay: float):
+    primary = asyncio.ensure_future(fn(timeout))
+    done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+    if done:
+        return primary.result()
+
+    hedge = asyncio.ensure_future(fn(timeout))
+    pending = {primary, hedge}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # Cancelling the loser closes its connection so the server can stop generating
+        for task in pending:
+            task.cancel()
+
+
+async def acall_with_resilience(
+    fn: Callable[[Optional[float]], Awaitable[Any]],
+    call_timeout: Optional[float] = None,
+    deadline: Optional[Deadline] = None,
+    retry: Optional[RetryPolicy] = None,
+    hedge: Optional[HedgePolicy] = None
+):
+    """
+    Async version of call_with_resilience(); each attempt is also bounded with
+    asyncio.wait_for, and slow attempts are hedged if a HedgePolicy is given.
+    """
+    deadline = deadline or Deadline(None)
+    attempts = retry.max_attempts if retry is not None else 1
+    attempt = 0
+    while True:
+        deadline.check()
+        timeout = deadline.timeout(call_timeout)
+        start = time.monotonic()
+        try:
+            hedge_delay = hedge.delay() if hedge is not None else None
+            if hedge_delay is not None:
+                call = _ahedged_call(fn, timeout, hedge_delay)
+            else:
+                call = fn(timeout)
+            with call_timeout_errors(timeout):
+                result = await asyncio.wait_for(call, timeout)
+            _latency_tracker.record(time.monotonic() - start)
+            return result
+        except Exception as e:
+            if deadline.expired() and is_timeout_error(e):
+                raise DeadlineExceeded("Run deadline exceeded") from e
+            attempt += 1
+            if attempt >= attempts or not (is_retryable(e) or _is_call_timeout(e, deadline)):
+                raise
+            backoff = retry.delay(attempt)
+            remaining = deadline.remaining()
+            if remaining is not None and backoff >= remaining:
+                raise
+            await asyncio.sleep(backoff)
+
+
+def _is_call_timeout(exc: BaseException, deadline: Deadline) -> bool:
+    """A per-call timeout is worth retrying as long as the run deadline hasn't passed."""
+    return isinstance(exc, DeadlineExceeded) and not deadline.expired()
@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from conversation import json_default
+
+MODES = ("cache", "record", "replay")
+
+DEFAULT_PATH = os.environ.get("AGENT_RESPONSE_CACHE", os.path.join(".cache", "llm_responses.sqlite"))
+
+# A hit only refreshes an entry's LRU position if it is older than this, so
+# frequent hits don't each take the database write lock
+_TOUCH_INTERVAL = 60.0
+
+
+class ResponseCacheMiss(KeyError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def request_key(model: str, messages: Sequence[Dict[str, Any]], tools=None, **params) -> str:
+    """
+    Content hash identifying a completion request.
+
+    Args:
+        model: Model name
+        messages: Conversation sent to the model
+        tools: Tool schemas sent with the request
+        **params: Sampling parameters (temperature, stop, tool_choice, ...); None
+            values are ignored so unset and omitted parameters hash the same
+    """
+    request = {
+        "model": model,
+        "messages": messages,
+        "tools": tools or [],
+        "params": {name: value for name, value in params.items() if value is not None}
+    }
+    canonical = json.dumps(request, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=json_default)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _to_dict(response) -> Dict[str, Any]:
+    """Plain JSON form of an SDK response object (or the dict from the lean path)."""
+    if isinstance(response, dict):
+        return response
+    return response.model_dump(mode="json", exclude_unset=True)
+
+
+class ResponseCache:
+    """
+    On-disk store of completion responses keyed by request_key().
+
+    Responses are stored zlib-compressed in a SQLite database in WAL mode,
+    so several processes can share one cache file. The total stored size is
+    bounded; the least recently used entries are evicted past `max_bytes`.
+
+    Modes:
+        cache: return a stored response if there is one, otherwise call the
+            model and store the result
+        record: always call the model and store (overwrite) the result
+        replay: only return stored responses; a miss raises ResponseCacheMiss,
+            so a replayed run never reaches the model
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, max_bytes: int = 512 * 1024 * 1024, mode: str = "cache"):
+        """
+        Args:
+            path: SQLite file to store responses in (created if missing)
+            max_bytes: Bound on the compressed size of stored responses
+            mode: "cache", "record" or "replay"
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown response cache mode: {mode!r}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            db.execute("INSERT OR IGNORE INTO meta VALUES ('total_bytes', 0)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection (SQLite connections can't be shared between threads)."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return _Transaction(db)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the stored response for `key`, or None."""
+        db = self._connection().db
+        row = db.execute("SELECT value, last_used FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > _TOUCH_INTERVAL:
+            db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, response) -> Dict[str, Any]:
+        """Store a response (SDK object or dict) and return it as a dict."""
+        data = _to_dict(response)
+        value = zlib.compress(json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+        now = time.time()
+        with self._connection() as db:
+            old = db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, value, len(value), now, now))
+            db.execute("UPDATE meta SET value = value + ? WHERE name = 'total_bytes'",
+                       (len(value) - (old[0] if old else 0),))
+            self._evict(db)
+        return data
+
+    def _evict(self, db: sqlite3.Connection):
+        """Drop least recently used entries until the store is back under 90% of max_bytes."""
+        total = db.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= target:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+        db.execute("UPDATE meta SET value = ? WHERE name = 'total_bytes'", (total,))
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Check the store according to the mode, counting hits and misses."""
+        cached = self.get(key) if self.mode != "record" else None
+        with self._stats_lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is None and self.mode == "replay":
+            raise ResponseCacheMiss(f"No recorded response for request {key[:16]}… (replay mode)")
+        return cached
+
+    def fetch(self, key: str, compute: Callable[[], Any]):
+        """Return the response for `key`, calling `compute()` (the model) if the mode allows."""
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        return self.put(key, compute())
+
+    async def afetch(self, key: str, compute: Callable[[], Awaitable[Any]]):
+        """
+        Async version of fetch(); `compute` returns an awaitable. SQLite work
+        runs on a worker thread, since a write can wait up to 30s for the lock.
+        """
+        cached = await asyncio.to_thread(self._lookup, key)
+        if cached is not None:
+            return cached
+        return await asyncio.to_thread(self.put, key, await compute())
+
+    def clear(self):
+        with self._connection() as db:
+            db.execute("DELETE FROM responses")
+            db.execute("UPDATE meta SET value = 0 WHERE name = 'total_bytes'")
+
+    def stats(self) -> Dict[str, Any]:
+        """Entries and bytes on disk, plus this process's hits and misses."""
+        db = self._connection().db
+        entries = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = db.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+        return {"mode": self.mode, "entries": entries, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+
+class _Transaction:
+    """Runs a block in an IMMEDIATE transaction so read-modify-write is atomic across processes."""
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide ResponseCache, creating it on first use."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
+
+
+def configure(**kwargs) -> ResponseCache:
+    """Replace the process-wide response cache (takes ResponseCache arguments)."""
+    global _default_cache
+    with _default_lock:
+        _default_cache = ResponseCache(**kwargs)
+        return _default_cache
@@ -0,0 +1,167 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from resilience import DeadlineExceeded
+
+
+class _Call:
+    """One in-flight request shared by its leader and any followers (threads)."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class _AsyncCall:
+    """One in-flight request shared by every awaiting coroutine on a loop."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical completion requests while one is in flight.
+
+    The first caller for a key (response_cache.request_key of the request)
+    sends it; callers arriving with the same key before it finishes wait for
+    that result instead of sending their own. Nothing is kept once the call
+    completes, so this only collapses concurrent duplicates (use a
+    ResponseCache to reuse finished ones).
+
+    Every waiter gets the same response, so coalescing sampled requests
+    removes their diversity; `max_temperature` limits it to near-greedy
+    requests and `enabled` switches it off entirely.
+    """
+
+    def __init__(self, enabled: bool = True, max_temperature: Optional[float] = None):
+        """
+        Args:
+            enabled: Whether requests are coalesced at all
+            max_temperature: Only coalesce requests at or below this temperature
+                (None for any temperature)
+        """
+        self.enabled = enabled
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Any, _AsyncCall] = {}
+        self._lock = threading.Lock()
+
+    def applies(self, temperature: Optional[float]) -> bool:
+        """True if a request at `temperature` should be coalesced (counts it as bypassed if not)."""
+        if self.enabled and (self.max_temperature is None or (temperature or 0) <= self.max_temperature):
+            return True
+        with self._lock:
+            self.bypassed += 1
+        return False
+
+    def do(self, key: str, compute: Callable[[], Any], timeout: Optional[float] = None):
+        """
+        Return compute()'s result, or the result of the identical call already in flight.
+
+        Args:
+            key: Request key
+            compute: Sends the request; only called if no identical call is in flight
+            timeout: Seconds a follower waits for the shared result before raising
+                DeadlineExceeded (the leader's own call is unaffected)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not leader:
+            if not call.done.wait(timeout):
+                raise DeadlineExceeded("Timed out waiting for a coalesced LLM call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = compute()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: str, compute: Callable[[], Awaitable[Any]], timeout: Optional[float] = None):
+        """
+        Async version of do(). The request runs as its own task, so it survives
+        a waiter being cancelled; it is cancelled once no one is waiting for it.
+        """
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            call = self._async_calls.get(loop_key)
+            if call is None:
+                call = self._async_calls[loop_key] = _AsyncCall(asyncio.ensure_future(compute()))
+                call.task.add_done_callback(lambda _: self._forget(loop_key, call))
+                self.misses += 1
+                leader = True
+            else:
+                self.hits += 1
+                leader = False
+            call.waiters += 1
+        try:
+            if leader or timeout is None:
+                return await asyncio.shield(call.task)
+            try:
+                return await asyncio.wait_for(asyncio.shield(call.task), timeout)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Timed out waiting for a coalesced LLM call") from None
+        finally:
+            with self._lock:
+                call.waiters -= 1
+                abandoned = call.waiters == 0 and not call.task.done()
+                if abandoned and self._async_calls.get(loop_key) is call:
+                    # Unregister now so a new caller doesn't join the cancelled task
+                    del self._async_calls[loop_key]
+            if abandoned:
+                call.task.cancel()
+
+    def _forget(self, loop_key, call: _AsyncCall):
+        with self._lock:
+            if self._async_calls.get(loop_key) is call:
+                del self._async_calls[loop_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Coalesced (hits), sent (misses) and bypassed requests, and calls in flight."""
+        with self._lock:
+            in_flight = len(self._calls) + len(self._async_calls)
+        return {"hits": self.hits, "misses": self.misses, "bypassed": self.bypassed, "in_flight": in_flight}
+
+
+_default_single_flight: Optional[SingleFlight] = None
+_default_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide SingleFlight, creating it on first use."""
+    global _default_single_flight
+    with _default_lock:
+        if _default_single_flight is None:
+            _default_single_flight = SingleFlight()
+        return _default_single_flight
+
+
+def configure(**kwargs) -> SingleFlight:
+    """Replace the process-wide SingleFlight (takes SingleFlight arguments)."""
+    global _default_single_flight
+    with _default_lock:
+        _default_single_flight = SingleFlight(**kwargs)
+        return _default_single_flight
@@ -0,0 +1,139 @@
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+import xml_utils
+
+
+def _parse_arguments(raw_args: str) -> Dict[str, Any]:
+    """Parse tool call arguments, falling back to XML parameters like Agent does."""
+    if not raw_args:
+        return {}
+    try:
+        return json.loads(raw_args)
+    except json.JSONDecodeError:
+        return xml_utils.parse_xml_parameters(raw_args)
+
+
+def _is_complete_json(raw_args: str) -> bool:
+    stripped = raw_args.rstrip()
+    if not stripped.endswith('}'):
+        return False
+    try:
+        json.loads(stripped)
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+class ToolCallAssembler:
+    """
+    Reassembles streamed `tool_calls` deltas into complete tool calls.
+
+    A call is reported complete as soon as its arguments form a full JSON
+    object, or when the stream moves on to a later call index, so it can be
+    dispatched while the model is still generating the rest of the response.
+    """
+
+    def __init__(self):
+        self._calls: Dict[int, Dict[str, str]] = {}
+        self._completed = set()
+
+    def feed(self, tool_call_deltas) -> List[int]:
+        """
+        Add the tool call deltas from one stream chunk.
+
+        Returns:
+            Indices of calls that became complete with this chunk
+        """
+        newly_completed = []
+        for delta in tool_call_deltas:
+            index = delta.index
+            entry = self._calls.get(index)
+            if entry is None:
+                # A new call starts, so every earlier one has all its arguments
+                for earlier in sorted(self._calls):
+                    if earlier < index and earlier not in self._completed:
+                        self._completed.add(earlier)
+                        newly_completed.append(earlier)
+                entry = self._calls[index] = {'id': '', 'name': '', 'arguments': ''}
+            if delta.id:
+                entry['id'] = delta.id
+            function = delta.function
+            if function is not None:
+                if function.name:
+                    entry['name'] += function.name
+                if function.arguments:
+                    entry['arguments'] += function.arguments
+            if (index not in self._completed and entry['name']
+                    and _is_complete_json(entry['arguments'])):
+                self._completed.add(index)
+                newly_completed.append(index)
+        return newly_completed
+
+    def finish(self) -> List[int]:
+        """Mark every remaining call complete at the end of the stream."""
+        remaining = [index for index in sorted(self._calls) if index not in self._completed]
+        self._completed.update(remaining)
+        return remaining
+
+    def call(self, index: int) -> Dict[str, Any]:
+        """Return the call at `index` in the agent's tool call format."""
+        entry = self._calls[index]
+        return {
+            'id': entry['id'],
+            'name': entry['name'],
+            'arguments': _parse_arguments(entry['arguments']),
+            'raw_args': entry['arguments']
+        }
+
+    def tool_calls(self) -> List[Dict[str, Any]]:
+        """Return all assembled calls in index order."""
+        return [self.call(index) for index in sorted(self._calls)]
+
+    def __len__(self):
+        return len(self._calls)
+
+
+def collect_completion(stream, check: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """
+    Read a chat completion stream into the dict a non-streamed request returns.
+
+    Args:
+        stream: The stream's chunks
+        check: Called before each chunk; it raises to stop reading (the caller
+            then closes the stream, which lets the server stop generating)
+
+    Returns:
+        The completion in the JSON shape of a non-streamed response
+    """
+    completion: Dict[str, Any] = {"object": "chat.completion", "usage": None}
+    content_parts = []
+    assembler = ToolCallAssembler()
+    finish_reason = None
+    for chunk in stream:
+        if check is not None:
+            check()
+        completion.setdefault("id", chunk.id)
+        completion.setdefault("created", chunk.created)
+        completion.setdefault("model", chunk.model)
+        if chunk.usage is not None:
+            completion["usage"] = {"prompt_tokens": chunk.usage.prompt_tokens,
+                                   "completion_tokens": chunk.usage.completion_tokens,
+                                   "total_tokens": chunk.usage.total_tokens}
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        finish_reason = choice.finish_reason or finish_reason
+        if choice.delta.content:
+            content_parts.append(choice.delta.content)
+        if choice.delta.tool_calls:
+            assembler.feed(choice.delta.tool_calls)
+    message: Dict[str, Any] = {"role": "assistant", "content": "".join(content_parts) or None}
+    if len(assembler):
+        message["tool_calls"] = [
+            {"id": call["id"], "type": "function",
+             "function": {"name": call["name"], "arguments": call["raw_args"]}}
+            for call in assembler.tool_calls()
+        ]
+    completion["choices"] = [{"index": 0, "message": message, "finish_reason": finish_reason}]
+    return completion
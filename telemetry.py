@@ -0,0 +1,411 @@
+import atexit
+import bisect
+import collections
+import contextlib
+import http.server
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160, 320, 640)
+
+logger = logging.getLogger("agents")
+
+
+class _LoggingState:
+    handler: Optional[logging.Handler] = None
+    listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(mode: str = "sync", level: int = logging.INFO, stream=None) -> logging.Logger:
+    """
+    Set how agent log lines are written.
+
+    Args:
+        mode: "sync" writes from the calling thread, "async" hands records to a
+            background thread through a queue, "off" drops them
+        level: Lowest level written (tool arguments and results are DEBUG)
+        stream: Stream to write to (defaults to stdout)
+
+    Returns:
+        The "agents" logger
+    """
+    if mode not in ("sync", "async", "off"):
+        raise ValueError(f"Unknown logging mode: {mode!r}")
+    if _LoggingState.listener is not None:
+        _LoggingState.listener.stop()
+        _LoggingState.listener = None
+    if _LoggingState.handler is not None:
+        logger.removeHandler(_LoggingState.handler)
+        _LoggingState.handler = None
+
+    logger.propagate = False
+    if mode == "off":
+        logger.setLevel(logging.CRITICAL + 1)
+        return logger
+
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    if mode == "async":
+        records = queue.SimpleQueue()
+        _LoggingState.listener = logging.handlers.QueueListener(records, stream_handler)
+        _LoggingState.listener.start()
+        _LoggingState.handler = logging.handlers.QueueHandler(records)
+    else:
+        _LoggingState.handler = stream_handler
+    logger.addHandler(_LoggingState.handler)
+    logger.setLevel(level)
+    return logger
+
+
+def _stop_logging():
+    if _LoggingState.listener is not None:
+        # Flush queued records before the interpreter exits
+        _LoggingState.listener.stop()
+        _LoggingState.listener = None
+
+
+atexit.register(_stop_logging)
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        running = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            running += count
+            result.append(("+Inf" if bound == float("inf") else repr(float(bound)), running))
+        return result
+
+
+class Metrics:
+    """
+    In-process counters and histograms with labels.
+
+    Read them with snapshot() or render them in the Prometheus text
+    exposition format with prometheus_text().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, _Histogram]] = {}
+        self._buckets: Dict[str, Sequence[float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str, buckets: Optional[Sequence[float]] = None):
+        """Set the help text (and histogram buckets) for a metric."""
+        with self._lock:
+            self._help[name] = help_text
+            if buckets is not None:
+                self._buckets[name] = tuple(buckets)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add `value` to a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record one observation in a histogram."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self._buckets.get(name, LATENCY_BUCKETS))
+            histogram.observe(value)
+
+    def reset(self):
+        """Drop every recorded value (help texts and buckets are kept)."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return every metric as plain data: {name: [{"labels": ..., ...}, ...]}."""
+        with self._lock:
+            result: Dict[str, Any] = {}
+            for name, series in self._counters.items():
+                result[name] = [{"labels": dict(key), "value": value} for key, value in series.items()]
+            for name, series in self._histograms.items():
+                result[name] = [
+                    {
+                        "labels": dict(key),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "buckets": dict(histogram.cumulative())
+                    }
+                    for key, histogram in series.items()
+                ]
+            return result
+
+    def prometheus_text(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class Span:
+    """One timed operation: a run, an LLM call or a tool call."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start", "end", "status", "error")
+
+    def __init__(self, name: str, trace_id: int, span_id: int, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.monotonic()
+        self.end: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        """Seconds from start to end (or to now while the span is open)."""
+        return (self.end if self.end is not None else time.monotonic()) - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, name: str, value: float):
+        """Add `value` to a numeric attribute."""
+        self.attributes[name] = self.attributes.get(name, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "duration_s": round(self.duration, 6),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class InMemoryExporter:
+    """Keeps the most recent finished spans in memory."""
+
+    def __init__(self, max_spans: int = 10000):
+        self._spans = collections.deque(maxlen=max_spans)
+
+    def __call__(self, span: Span):
+        self._spans.append(span)
+
+    def spans(self, name: Optional[str] = None) -> List[Span]:
+        return [span for span in list(self._spans) if name is None or span.name == name]
+
+    def clear(self):
+        self._spans.clear()
+
+
+class JsonlExporter:
+    """Appends finished spans to a JSONL file."""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to exporters.
+
+    Finished "agent_run", "llm_call" and "tool_call" spans are also folded into
+    the metrics registry, so counters and latency histograms need no extra
+    calls at the instrumentation sites.
+    """
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+        self._exporters: List[Callable[[Span], None]] = []
+        self._ids = itertools.count(1)
+
+    def add_exporter(self, exporter: Callable[[Span], None]):
+        self._exporters.append(exporter)
+
+    def remove_exporter(self, exporter: Callable[[Span], None]):
+        self._exporters.remove(exporter)
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        span_id = next(self._ids)
+        trace_id = parent.trace_id if parent is not None else span_id
+        return Span(name, trace_id, span_id, parent.span_id if parent is not None else None, attributes)
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        span.end = time.monotonic()
+        if error is not None:
+            span.status = "error"
+            span.error = f"{type(error).__name__}: {error}"
+        _record_span_metrics(self.metrics, span)
+        for exporter in self._exporters:
+            try:
+                exporter(span)
+            except Exception:
+                logger.exception("Span exporter failed")
+
+    @contextlib.contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attributes):
+        """Context manager opening a span and ending it (with the error, if any) on exit."""
+        span = self.start_span(name, parent, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        self.end_span(span)
+
+
+def _record_span_metrics(metrics: Metrics, span: Span):
+    attributes = span.attributes
+    if span.name == "agent_run":
+        metrics.inc("agent_runs_total", status=span.status)
+        metrics.observe("agent_run_duration_seconds", span.duration)
+    elif span.name == "llm_call":
+        model = attributes.get("model") or ""
+        metrics.inc("llm_calls_total", model=model, status=span.status)
+        metrics.observe("llm_call_duration_seconds", span.duration, model=model)
+        if attributes.get("ttft_s") is not None:
+            metrics.observe("llm_time_to_first_token_seconds", attributes["ttft_s"], model=model)
+        if attributes.get("prompt_tokens"):
+            metrics.inc("llm_prompt_tokens_total", attributes["prompt_tokens"], model=model)
+        if attributes.get("completion_tokens"):
+            metrics.inc("llm_completion_tokens_total", attributes["completion_tokens"], model=model)
+        if attributes.get("tokens_per_s"):
+            metrics.observe("llm_tokens_per_second", attributes["tokens_per_s"], model=model)
+    elif span.name == "tool_call":
+        tool = attributes.get("tool") or ""
+        metrics.inc("tool_calls_total", tool=tool, status=span.status)
+        metrics.observe("tool_call_duration_seconds", span.duration, tool=tool)
+
+
+def finish_llm_span(span: Span, ttft: Optional[float] = None):
+    """
+    Fill in the derived LLM call attributes: time to first token and
+    completion tokens per second (measured after the first token when known).
+    """
+    if ttft is not None:
+        span.set(ttft_s=round(ttft, 6))
+    completion_tokens = span.attributes.get("completion_tokens") or 0
+    generation_time = span.duration - (ttft or 0)
+    if completion_tokens and generation_time > 0:
+        span.set(tokens_per_s=round(completion_tokens / generation_time, 2))
+
+
+metrics = Metrics()
+metrics.describe("agent_runs_total", "Agent runs finished, by status")
+metrics.describe("agent_run_duration_seconds", "Wall time of agent runs")
+metrics.describe("llm_calls_total", "LLM completion calls, by model and status")
+metrics.describe("llm_call_duration_seconds", "Latency of LLM completion calls")
+metrics.describe("llm_time_to_first_token_seconds", "Time to the first streamed content token")
+metrics.describe("llm_prompt_tokens_total", "Prompt tokens reported by the server")
+metrics.describe("llm_completion_tokens_total", "Completion tokens reported by the server")
+metrics.describe("llm_tokens_per_second", "Completion tokens per second of generation", buckets=RATE_BUCKETS)
+metrics.describe("tool_calls_total", "Tool calls, by tool and status")
+metrics.describe("tool_call_duration_seconds", "Latency of tool calls")
+
+tracer = Tracer(metrics)
+span = tracer.span
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return the process-wide metrics as plain data."""
+    return metrics.snapshot()
+
+
+def prometheus_text() -> str:
+    """Return the process-wide metrics in the Prometheus text format."""
+    return metrics.prometheus_text()
+
+
+def start_metrics_server(port: int = 9464, host: str = "127.0.0.1") -> http.server.ThreadingHTTPServer:
+    """Serve prometheus_text() at /metrics from a background thread."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+# AGENT_LOG=off|async|sync picks the logging mode without code changes
+configure_logging(os.environ.get("AGENT_LOG", "sync"))
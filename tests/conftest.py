@@ -0,0 +1,43 @@
+import openai
+import pytest
+
+import telemetry
+from mock_server import MockConfig, MockServer
+from tools import get_tool_funcs, get_tools
+
+
+@pytest.fixture(autouse=True, scope="session")
+def quiet_logs():
+    telemetry.configure_logging("off")
+
+
+@pytest.fixture
+def mock_server():
+    """Start a mock LLM server: mock_server(**MockConfig arguments). Stopped after the test."""
+    servers = []
+
+    def start(**config):
+        server = MockServer(MockConfig(**config)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def client():
+    """Sync OpenAI client for a mock server, without SDK retries."""
+    return lambda server: openai.OpenAI(base_url=server.url, api_key="mock", max_retries=0)
+
+
+@pytest.fixture
+def async_client():
+    """Async OpenAI client for a mock server, without SDK retries (create it inside the event loop)."""
+    return lambda server: openai.AsyncOpenAI(base_url=server.url, api_key="mock", max_retries=0)
+
+
+@pytest.fixture(scope="session")
+def tools():
+    return get_tools(), get_tool_funcs()
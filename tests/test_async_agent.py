@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import main
+from agent import AsyncAgent
+
+WEATHER = [
+    {"tool_calls": [{"name": "get_weather", "arguments": {"location": "Paris"}}]},
+    {"content": "Sunny in Paris."},
+]
+
+
+def test_arun_calls_tools_and_answers(mock_server, async_client, tools):
+    server = mock_server(script=WEATHER)
+
+    async def run():
+        agent = AsyncAgent([], *tools, "mock-model", 0.0, client=async_client(server))
+        return agent, await agent.arun("Weather in Paris?")
+
+    agent, result = asyncio.run(run())
+    assert result == "Sunny in Paris."
+    assert agent.status == "completed"
+    assert agent.run_usage["turns"] == 2 and agent.run_usage["tool_calls"] == 1
+    assert "Paris" in str(agent.messages[-2]["content"])
+
+
+def test_arun_stream_yields_the_final_answer(mock_server, async_client, tools):
+    server = mock_server(script=WEATHER)
+
+    async def run():
+        agent = AsyncAgent([], *tools, "mock-model", 0.0, client=async_client(server))
+        return [delta async for delta in agent.arun_stream("Weather in Paris?")]
+
+    assert "".join(asyncio.run(run())) == "Sunny in Paris."
+
+
+def test_agents_share_one_event_loop(mock_server, async_client, tools):
+    server = mock_server(script=WEATHER, latency="constant:0.2")
+
+    async def run():
+        client = async_client(server)
+        agents = [AsyncAgent([], *tools, "mock-model", 0.0, client=client) for _ in range(50)]
+        return await asyncio.gather(*(agent.arun("Weather in Paris?") for agent in agents))
+
+    started = time.monotonic()
+    results = asyncio.run(run())
+    # 50 agents of two 0.2s calls each; run one after another they would take 20s
+    assert time.monotonic() - started < 3
+    assert results == ["Sunny in Paris."] * 50
+    assert server.requests == 100
+
+
+def test_run_agents_passes_upstream_results_to_dependents(mock_server, async_client):
+    server = mock_server(script=[{"content": "done"}])
+    seen = {}
+
+    def message(upstream):
+        seen.update(upstream)
+        return "Summarize"
+
+    configs = [
+        ("a", "First", "You are helpful."),
+        ("b", message, "You are helpful.", ["a"]),
+    ]
+
+    async def run():
+        return await main.run_agents(configs, client=async_client(server), model="mock-model")
+
+    assert asyncio.run(run()) == {"a": "done", "b": "done"}
+    assert seen == {"a": "done"}
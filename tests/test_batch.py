@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+import batch
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    """Write a jobs file: jobs(*lines) -> (jobs path, output path)."""
+    def write(*lines):
+        path = tmp_path / "jobs.jsonl"
+        path.write_text("".join((line if isinstance(line, str) else json.dumps(line)) + "\n" for line in lines))
+        return str(path), str(tmp_path / "results.jsonl")
+    return write
+
+
+def run(server, jobs_path, output_path, async_client, **kwargs):
+    async def main():
+        async with async_client(server) as client:
+            return await batch.run_batch(jobs_path, output_path, client=client, model="mock-model", **kwargs)
+    return asyncio.run(main())
+
+
+def records(output_path):
+    with open(output_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_batch_writes_one_result_per_job(mock_server, async_client, jobs):
+    server = mock_server(script=[{"content": "answer"}])
+    jobs_path, output_path = jobs(*({"id": f"job-{i}", "prompt": "Hi"} for i in range(20)))
+    counts = run(server, jobs_path, output_path, async_client, concurrency=4)
+    assert counts == {"ok": 20, "error": 0, "skipped": 0}
+    results = records(output_path)
+    assert sorted(record["id"] for record in results) == sorted(f"job-{i}" for i in range(20))
+    assert all(record["response"] == "answer" and record["llm_calls"] == 1 for record in results)
+
+
+def test_bad_lines_are_recorded_as_errors(mock_server, async_client, jobs):
+    server = mock_server(script=[{"content": "answer"}])
+    jobs_path, output_path = jobs({"prompt": "Hi"}, "{not json", {"id": "empty"})
+    counts = run(server, jobs_path, output_path, async_client)
+    assert counts == {"ok": 1, "error": 2, "skipped": 0}
+    by_id = {record["id"]: record for record in records(output_path)}
+    assert by_id["line-1"]["status"] == "ok"
+    assert by_id["line-2"]["error"].startswith("Invalid JSON")
+    assert by_id["empty"]["error"] == "Job has no prompt"
+
+
+def test_rerun_skips_finished_jobs_and_retries_failed_ones(mock_server, async_client, jobs):
+    server = mock_server(script=[{"content": "answer"}])
+    jobs_path, output_path = jobs({"id": "a", "prompt": "Hi"}, {"id": "b", "prompt": "Hi"})
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "a", "status": "ok"}) + "\n")
+        f.write(json.dumps({"id": "b", "status": "error"}) + "\n")
+        f.write('{"id": "c", "sta')  # cut short by a crash
+    assert run(server, jobs_path, output_path, async_client) == {"ok": 1, "error": 0, "skipped": 1}
+    assert server.requests == 1
+    assert run(server, jobs_path, output_path, async_client) == {"ok": 0, "error": 0, "skipped": 2}
+    assert batch.load_finished(output_path) == {"a", "b"}
+
+
+def test_failed_jobs_can_be_left_alone(mock_server, async_client, jobs):
+    server = mock_server(script=[{"content": "answer"}])
+    jobs_path, output_path = jobs({"id": "b", "prompt": "Hi"})
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "b", "status": "error"}) + "\n")
+    assert run(server, jobs_path, output_path, async_client, retry_failed=False)["skipped"] == 1
+    assert server.requests == 0
+
+
+def test_jobs_with_bad_tools_are_recorded_as_errors(mock_server, async_client, jobs):
+    server = mock_server(script=[{"content": "answer"}])
+    jobs_path, output_path = jobs(
+        {"id": "list", "prompt": "Hi", "tools": ["get_weather"]},
+        {"id": "auto", "prompt": "Hi", "tools": "auto"},
+        {"id": "string", "prompt": "Hi", "tools": "get_weather"},
+        {"id": "unknown", "prompt": "Hi", "tools": ["get_weather", "teleport"]},
+    )
+    counts = run(server, jobs_path, output_path, async_client)
+    assert counts == {"ok": 2, "error": 2, "skipped": 0}
+    assert server.requests == 2
+    by_id = {record["id"]: record for record in records(output_path)}
+    assert by_id["string"]["error"].startswith('"tools" must be a list of tool names')
+    assert by_id["unknown"]["error"] == "Unknown tools: teleport"
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from agent import Agent
+from budget import BudgetExceeded, CancelToken, RunBudget, RunCancelled
+from resilience import DeadlineExceeded
+
+TOOL_LOOP = [{"tool_calls": [{"name": "get_weather", "arguments": {"location": "Paris"}}]}]
+
+
+@pytest.fixture
+def looping_agent(mock_server, client, tools):
+    """Agents talking to a model that calls a tool every turn, forever."""
+    schemas, funcs = tools
+
+    def make(latency="constant:0.01", **kwargs):
+        server = mock_server(script=TOOL_LOOP, latency=latency)
+        return Agent([], schemas, funcs, "mock-model", 0.0, client=client(server), **kwargs), server
+
+    return make
+
+
+@pytest.mark.parametrize("limits, status", [
+    ({"max_turns": 3}, "max_turns"),
+    ({"max_tool_calls": 2}, "max_tool_calls"),
+    ({"max_tokens": 500}, "max_tokens"),
+])
+def test_budget_limits_stop_a_looping_run(looping_agent, limits, status):
+    agent, server = looping_agent(budget=RunBudget(**limits))
+    with pytest.raises(BudgetExceeded) as error:
+        agent.run("Weather?")
+    assert error.value.status == agent.status == status
+    if status == "max_turns":
+        assert agent.run_usage["turns"] == server.requests == 3
+    if status == "max_tool_calls":
+        assert agent.run_usage["tool_calls"] == 2
+
+
+def test_max_tokens_stops_a_streamed_run(looping_agent):
+    # max_turns only keeps the test finite if streamed usage is never reported
+    agent, _ = looping_agent(budget=RunBudget(max_tokens=500, max_turns=50))
+    with pytest.raises(BudgetExceeded):
+        list(agent.run_stream("Weather?"))
+    assert agent.status == "max_tokens"
+    assert agent.run_usage["tokens"] >= 500
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_max_seconds_ends_run_as_timeout(looping_agent, stream):
+    agent, _ = looping_agent(latency="constant:0.5", budget=RunBudget(max_seconds=0.3))
+    with pytest.raises(DeadlineExceeded):
+        list(agent.run_stream("Weather?")) if stream else agent.run("Weather?")
+    assert agent.status == "timeout"
+
+
+def test_cancel_token_stops_a_call_in_flight(looping_agent):
+    token = CancelToken()
+    agent, _ = looping_agent(latency="constant:1.5", cancel_token=token)
+    threading.Timer(0.1, token.cancel, args=("stop",)).start()
+    with pytest.raises(RunCancelled, match="stop"):
+        agent.run("Weather?")
+    assert agent.status == "cancelled"
+
+
+def test_budget_is_per_run(looping_agent):
+    agent, _ = looping_agent(budget=RunBudget(max_turns=2))
+    for _ in range(2):
+        with pytest.raises(BudgetExceeded):
+            agent.run("Weather?")
+        assert agent.run_usage["turns"] == 2
+
+
+def test_cancel_closes_the_request_in_flight(mock_server, client, tools):
+    server = mock_server(tokens_per_s=20, completion_tokens=200)
+    token = CancelToken()
+    agent = Agent([], *tools, "mock-model", 0.0, client=client(server), cancel_token=token)
+    threading.Timer(0.3, token.cancel).start()
+    with pytest.raises(RunCancelled):
+        agent.run("Tell me a long story")
+    deadline = time.monotonic() + 2
+    while not server.aborted and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert server.aborted == 1
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from agent import Agent
+from response_cache import ResponseCache, ResponseCacheMiss
+from tool_cache import CachePolicy, ToolResultCache
+from tool_runner import tool_traits
+
+
+@pytest.fixture
+def files(tmp_path):
+    calls = []
+
+    @tool_traits(read_only=True, resource=lambda arguments: os.path.join(str(tmp_path), arguments["name"]))
+    def read(arguments):
+        calls.append(("read", arguments["name"]))
+        return f"read {arguments['name']} #{len(calls)}"
+
+    @tool_traits(read_only=True, resource=lambda arguments: str(tmp_path))
+    def listing(arguments):
+        calls.append(("list",))
+        return f"listing #{len(calls)}"
+
+    @tool_traits(resource=lambda arguments: os.path.join(str(tmp_path), arguments["name"]))
+    def write(arguments):
+        calls.append(("write", arguments["name"]))
+        return "saved"
+
+    def untyped(arguments):
+        return "done"
+
+    return calls, read, listing, write, untyped
+
+
+def test_tool_cache_serves_repeated_reads(files):
+    calls, read, *_ = files
+    cache = ToolResultCache()
+    assert cache.call("read", read, {"name": "a"}) == cache.call("read", read, {"name": "a"})
+    assert calls == [("read", "a")] and cache.stats()["hits"] == 1
+
+
+def test_write_invalidates_file_and_its_directory_listing_only(files):
+    calls, read, listing, write, _ = files
+    cache = ToolResultCache()
+    for name in ("a", "b"):
+        cache.call("read", read, {"name": name})
+    cache.call("listing", listing, {})
+    cache.call("write", write, {"name": "a"})
+    calls.clear()
+    cache.call("read", read, {"name": "a"})
+    cache.call("read", read, {"name": "b"})
+    cache.call("listing", listing, {})
+    assert calls == [("read", "a"), ("list",)]
+
+
+def test_tool_without_resource_clears_everything_and_ttl_expires(files):
+    calls, read, _, _, untyped = files
+    cache = ToolResultCache()
+    cache.call("read", read, {"name": "a"})
+    cache.call("untyped", untyped, {})
+    assert cache.stats()["entries"] == 0
+
+    expiring = ToolResultCache(default_policy=CachePolicy(ttl=0))
+    expiring.call("read", read, {"name": "a"})
+    assert expiring.stats()["entries"] == 0
+
+
+def test_response_cache_modes(mock_server, client, tools, tmp_path):
+    schemas, funcs = tools
+    server = mock_server()
+    path = str(tmp_path / "responses.sqlite")
+
+    def run(mode):
+        agent = Agent([], schemas, funcs, "mock-model", 0.0, client=client(server),
+                      response_cache=ResponseCache(path, mode=mode))
+        return agent.run("Weather in Paris?")
+
+    first = run("cache")
+    assert server.requests == 2
+    assert run("cache") == first and server.requests == 2
+    assert run("replay") == first and server.requests == 2
+    run("record")
+    assert server.requests == 4
+
+    empty = ResponseCache(str(tmp_path / "empty.sqlite"), mode="replay")
+    agent = Agent([], schemas, funcs, "mock-model", 0.0, client=client(server), response_cache=empty)
+    with pytest.raises(ResponseCacheMiss):
+        agent.run("Weather in Paris?")
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=2000)
+    for index in range(40):
+        cache.put(f"key{index}", {"choices": [{"message": {"content": os.urandom(40).hex()}}]})
+    stats = cache.stats()
+    assert stats["bytes"] <= 2000 and 0 < stats["entries"] < 40
+    assert cache.get("key39") is not None and cache.get("key0") is None
+    cache.clear()
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import pytest
+
+import clients
+from agent import Agent
+
+
+@pytest.fixture
+def manager(mock_server, monkeypatch):
+    """A process-wide ClientManager pointed at a mock server (restored afterwards)."""
+    server = mock_server(models=["first-model", "second-model"])
+    monkeypatch.setattr(clients, "_default_manager", None)
+    manager = clients.configure(base_url=server.url, api_key="mock", model_ttl=0.2)
+    yield manager, server
+    manager.close()
+
+
+def test_sync_client_is_shared(manager):
+    manager, _ = manager
+    assert manager.client() is manager.client()
+    assert clients.get_client_manager() is manager
+
+
+def test_async_clients_are_per_event_loop(manager):
+    manager, _ = manager
+
+    async def both():
+        return manager.async_client(), manager.async_client()
+
+    first, again = asyncio.run(both())
+    second, _ = asyncio.run(both())
+    assert first is again
+    assert first is not second
+
+
+def test_model_list_is_cached_until_its_ttl(manager):
+    manager, server = manager
+    assert manager.get_model() == "first-model"
+    server.config.models = ["new-model"]
+    assert manager.get_model() == "first-model"
+    assert asyncio.run(manager.aget_model()) == "first-model"
+    time.sleep(0.25)
+    assert manager.get_model() == "new-model"
+
+
+def test_refresh_and_invalidate_refetch_models(manager):
+    manager, server = manager
+    manager.get_models()
+    server.config.models = ["new-model"]
+    assert manager.get_models(refresh=True) == ["new-model"]
+    server.config.models = ["newer-model"]
+    manager.invalidate_models()
+    assert manager.get_models() == ["newer-model"]
+
+
+def test_agents_use_the_shared_client_and_model(manager, tools):
+    manager, server = manager
+    agents = [Agent([], *tools, None, 0.0) for _ in range(3)]
+    for agent in agents:
+        agent.run("Hello")
+    assert all(agent.client is manager.client() for agent in agents)
+    assert {agent.model for agent in agents} == {"first-model"}
+    assert server.requests == 6
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from agent import Agent
+from concurrency import AdaptiveLimiter
+from resilience import DeadlineExceeded
+
+
+def complete(limiter, count, latency, tokens=None, saturate=True):
+    """Simulate `count` completions of `latency` seconds, in rounds that fill the limit (or one at a time)."""
+    done = 0
+    while done < count:
+        n = min(limiter.limit if saturate else 1, count - done)
+        for _ in range(n):
+            limiter.acquire()
+        for _ in range(n):
+            limiter.release(latency=latency, tokens=tokens)
+        done += n
+
+
+def test_limit_grows_while_latency_holds_and_the_limit_is_used():
+    limiter = AdaptiveLimiter(initial_limit=4, max_limit=6)
+    complete(limiter, 20, 1.0)  # baseline
+    complete(limiter, 40, 1.0)
+    assert limiter.limit == 6
+    complete(limiter, 100, 1.0)
+    assert limiter.limit == 6
+
+
+def test_limit_does_not_grow_when_unused():
+    limiter = AdaptiveLimiter(initial_limit=4)
+    complete(limiter, 200, 1.0, saturate=False)
+    assert limiter.limit == 4
+
+
+def test_limit_shrinks_while_latency_stays_high():
+    limiter = AdaptiveLimiter(initial_limit=20, max_limit=20)
+    complete(limiter, 40, 1.0)
+    limits = []
+    for _ in range(5):
+        complete(limiter, 20, 3.0)
+        limits.append(limiter.limit)
+    # Congested batches don't become the new baseline, so every batch shrinks the limit
+    assert limits == sorted(limits, reverse=True) and limits[-1] < limits[0] < 20
+    assert limiter.stats()["latency_ratio"] == pytest.approx(3.0)
+
+
+def test_one_slow_call_does_not_shrink_the_limit():
+    limiter = AdaptiveLimiter(initial_limit=20, max_limit=20)
+    complete(limiter, 39, 1.0)
+    complete(limiter, 1, 30.0)
+    assert limiter.limit == 20
+
+
+def test_completions_are_judged_against_their_own_size():
+    limiter = AdaptiveLimiter(initial_limit=8, max_limit=8)
+    complete(limiter, 20, 0.2, tokens=10)
+    complete(limiter, 20, 5.0, tokens=1000)
+    for _ in range(3):
+        complete(limiter, 20, 0.2, tokens=10)
+        complete(limiter, 20, 5.0, tokens=1000)
+    assert limiter.limit == 8
+
+
+def test_overload_errors_cut_the_limit():
+    limiter = AdaptiveLimiter(initial_limit=8)
+    limiter.acquire()
+    limiter.release(error=httpx.ConnectError("refused"))
+    assert limiter.limit == 4
+    limiter.acquire()
+    limiter.release(error=ValueError("not an overload"))
+    assert limiter.limit == 4 and limiter.stats()["errors"] == 1
+
+
+def test_threads_never_exceed_the_limit():
+    limiter = AdaptiveLimiter(initial_limit=3, max_limit=3)
+    active, peak = 0, 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal active, peak
+        with limiter.slot():
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.01)
+            with lock:
+                active -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak == 3
+    assert limiter.in_flight == 0 and limiter.queue_depth == 0
+
+
+def test_cancelled_async_waiter_gives_up_its_place():
+    limiter = AdaptiveLimiter(initial_limit=1)
+
+    async def run():
+        await limiter.aacquire()
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0.01)
+        assert limiter.queue_depth == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+
+    asyncio.run(run())
+    assert limiter.in_flight == 0 and limiter.queue_depth == 0
+
+
+def test_waiting_for_a_slot_times_out_on_both_paths():
+    limiter = AdaptiveLimiter(initial_limit=1)
+    limiter.acquire()
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(timeout=0.05)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(limiter.aacquire(timeout=0.05))
+    assert limiter.queue_depth == 0
+    limiter.release()
+    limiter.acquire(timeout=0.05)
+    assert limiter.in_flight == 1
+
+
+def test_agent_gives_up_waiting_for_a_slot_at_its_deadline(mock_server, client, tools):
+    server = mock_server()
+    limiter = AdaptiveLimiter(initial_limit=1)
+    limiter.acquire()
+    agent = Agent([], *tools, "mock-model", 0.0, client=client(server), limiter=limiter, run_timeout=0.2)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        agent.run("Weather?")
+    assert time.monotonic() - start < 2
+    assert server.requests == 0 and limiter.queue_depth == 0
+
+
+def test_agent_calls_go_through_the_limiter(mock_server, client, tools):
+    server = mock_server()
+    limiter = AdaptiveLimiter()
+    agent = Agent([], *tools, "mock-model", 0.0, client=client(server), limiter=limiter)
+    agent.run("Weather?")
+    assert limiter.stats()["completed"] == 2 and limiter.in_flight == 0
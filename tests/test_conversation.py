@@ -0,0 +1,39 @@
+from conversation import Conversation
+
+from agent import Agent
+
+
+def texts(conversation):
+    return [message["content"] for message in conversation]
+
+
+def test_fork_shares_history_and_keeps_appends_private():
+    trunk = Conversation([{"role": "user", "content": str(i)} for i in range(3)])
+    branch = trunk.fork()
+    assert branch._head is trunk._head and trunk._tail == [] and branch._tail == []
+
+    trunk.append({"role": "assistant", "content": "trunk"})
+    branch.append({"role": "assistant", "content": "branch"})
+    assert texts(trunk) == ["0", "1", "2", "trunk"]
+    assert texts(branch) == ["0", "1", "2", "branch"]
+    # Only the appended message is stored per branch
+    assert len(branch._tail) == 1 and branch[1] is trunk[1]
+
+
+def test_insert_into_shared_part_unshares_only_that_conversation():
+    trunk = Conversation([{"role": "user", "content": "a"}, {"role": "user", "content": "b"}])
+    branch = trunk.fork()
+    branch.insert(0, {"role": "system", "content": "s"})
+    assert texts(branch) == ["s", "a", "b"]
+    assert texts(trunk) == ["a", "b"]
+    assert branch[-1:] == trunk[-1:]
+
+
+def test_agent_fork_does_not_share_usage_or_new_messages():
+    agent = Agent([], [], {}, "mock-model", 0.0, client=object())
+    agent.messages.append({"role": "user", "content": "q"})
+    fork = agent.fork(temperature=0.9)
+    fork.messages.append({"role": "assistant", "content": "a"})
+    fork.usage["llm_calls"] += 1
+    assert len(agent.messages) == 2 and len(fork.messages) == 3
+    assert agent.usage["llm_calls"] == 0 and fork.temperature == 0.9 and agent.temperature == 0.0
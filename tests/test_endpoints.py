@@ -0,0 +1,126 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import openai
+import pytest
+
+from agent import Agent
+from endpoints import Endpoint, EndpointPool
+from resilience import RetryPolicy
+
+DEAD_URL = "http://127.0.0.1:9/v1"
+
+
+def refused():
+    return httpx.ConnectError("refused")
+
+
+def rate_limited():
+    response = httpx.Response(429, request=httpx.Request("POST", "http://test"))
+    return openai.RateLimitError("busy", response=response, body=None)
+
+
+@pytest.fixture
+def pool():
+    pools = []
+
+    def make(*endpoints, **kwargs):
+        endpoints = endpoints or (Endpoint("http://a/v1", name="a"), Endpoint("http://b/v1", name="b"))
+        pools.append(EndpointPool(endpoints, **kwargs))
+        return pools[-1]
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_least_outstanding_spreads_calls(pool):
+    pool = pool()
+    first, second = pool.acquire(), pool.acquire()
+    assert {first.name, second.name} == {"a", "b"}
+    pool.release(first, 0.1)
+    assert pool.acquire() is first
+
+
+def test_ewma_prefers_the_faster_endpoint(pool):
+    pool = pool(strategy="ewma")
+    a, b = pool.endpoints
+    for endpoint, latency in ((a, 1.0), (b, 0.1)):
+        pool.acquire()
+        pool.release(endpoint, latency)
+    assert pool.acquire() is b
+
+
+def test_calls_go_to_endpoints_serving_the_model(pool):
+    pool = pool(Endpoint("http://a/v1", models=["small"], name="a"), Endpoint("http://b/v1", models=["large"], name="b"))
+    assert all(pool.acquire("large").name == "b" for _ in range(3))
+    with pytest.raises(LookupError):
+        pool.acquire("missing")
+
+
+def test_conversations_stick_to_their_endpoint(pool):
+    pool = pool()
+    endpoint = pool.acquire(conversation="c1")
+    pool.acquire()  # make the sticky endpoint the busier one
+    assert all(pool.acquire(conversation="c1") is endpoint for _ in range(3))
+
+
+def test_failing_endpoint_is_ejected_and_comes_back(pool):
+    pool = pool(max_failures=2, eject_seconds=0.2)
+    a, b = pool.endpoints
+    for _ in range(2):
+        pool.acquire()
+        pool.release(a, error=refused())
+    assert pool.stats()["a"]["ejected"]
+    assert all(pool.acquire(conversation="c").name == "b" for _ in range(3))
+    time.sleep(0.25)
+    assert not pool.stats()["a"]["ejected"]
+
+
+def test_rate_limits_do_not_eject(pool):
+    pool = pool(max_failures=1)
+    a, _ = pool.endpoints
+    pool.acquire()
+    pool.release(a, error=rate_limited())
+    assert not pool.stats()["a"]["ejected"]
+
+
+def test_all_ejected_still_routes(pool):
+    pool = pool(max_failures=1)
+    for endpoint in pool.endpoints:
+        pool.acquire()
+        pool.release(endpoint, error=refused())
+    assert pool.acquire() in pool.endpoints
+
+
+def test_health_check_ejects_dead_endpoints_and_learns_models(mock_server, pool):
+    server = mock_server(models=["m1", "m2"])
+    pool = pool(Endpoint(server.url, name="live"), Endpoint(DEAD_URL, name="dead"))
+    assert pool.health_check(timeout=1) == {"live": True, "dead": False}
+    assert pool.stats()["dead"]["ejected"]
+    assert pool.stats()["live"]["models"] == ["m1", "m2"]
+    assert pool.get_model() == "m1"
+
+
+def test_agents_spread_over_endpoints(mock_server, pool, tools):
+    servers = [mock_server(latency="constant:0.1") for _ in range(2)]
+    pool = pool(*(Endpoint(server.url, name=str(i)) for i, server in enumerate(servers)))
+    agents = [Agent([], *tools, "mock-model", 0.0, endpoints=pool) for _ in range(8)]
+    with ThreadPoolExecutor(8) as pool_threads:
+        list(pool_threads.map(lambda agent: agent.run("Weather?"), agents))
+    requests = [server.requests for server in servers]
+    assert sum(requests) == 16 and min(requests) >= 4
+    # Each conversation stayed on one server, so every server saw whole runs
+    assert all(count % 2 == 0 for count in requests)
+
+
+def test_agent_fails_over_to_a_live_endpoint(mock_server, pool, tools):
+    server = mock_server()
+    pool = pool(Endpoint(DEAD_URL, name="dead"), Endpoint(server.url, name="live"), max_failures=1)
+    agent = Agent([], *tools, "mock-model", 0.0, endpoints=pool, retry=RetryPolicy(base_delay=0))
+    agent.run("Weather?")
+    assert agent.status == "completed"
+    stats = pool.stats()
+    assert stats["dead"]["errors"] == 1 and stats["dead"]["ejected"]
+    assert server.requests == 2
@@ -0,0 +1,44 @@
+from history import HistoryManager, SlidingWindow, TRUNCATION_MARKER, estimate_messages_tokens
+
+SYSTEM = {"role": "system", "content": "You are helpful."}
+USER = {"role": "user", "content": "What is in notes.txt?"}
+
+
+def tool_turn(call_id, size):
+    call = {"id": call_id, "type": "function", "function": {"name": "read_file", "arguments": "{}"}}
+    return [{"role": "assistant", "content": "", "tool_calls": [call]},
+            {"role": "tool", "tool_call_id": call_id, "content": "x" * size}]
+
+
+def assert_tool_messages_paired(messages):
+    issued = set()
+    for message in messages:
+        issued.update(call["id"] for call in message.get("tool_calls") or [])
+        if message["role"] == "tool":
+            assert message["tool_call_id"] in issued, [m["role"] for m in messages]
+
+
+def test_large_tool_result_keeps_its_call_and_the_user_turn():
+    messages = [SYSTEM, USER] + tool_turn("c1", 4000)
+    compacted = HistoryManager(token_budget=300).compact(messages)
+    assert [message["role"] for message in compacted] == ["system", "user", "assistant", "tool"]
+    assert_tool_messages_paired(compacted)
+    assert estimate_messages_tokens(compacted) <= 300
+    kept = compacted[-1]["content"].split("...")[0]
+    assert compacted[-1]["content"] == kept + TRUNCATION_MARKER.format(count=4000 - len(kept))
+
+
+def test_window_never_starts_on_a_tool_result():
+    messages = [SYSTEM, {"role": "user", "content": "old"}, {"role": "assistant", "content": "ok"}, USER]
+    for index in range(10):
+        messages += tool_turn(f"c{index}", 400)
+    compacted = SlidingWindow().apply(messages, 500)
+    assert compacted[:2] == [SYSTEM, USER]
+    assert compacted[2]["role"] == "assistant"
+    assert_tool_messages_paired(compacted)
+    assert compacted[-1] == messages[-1]
+
+
+def test_small_history_is_untouched():
+    messages = [SYSTEM, USER] + tool_turn("c1", 40)
+    assert HistoryManager(token_budget=1000).compact(messages) is messages
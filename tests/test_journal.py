@@ -0,0 +1,63 @@
+import pytest
+
+from agent import Agent
+from journal import Journal, read_records, replay
+
+TOOL_TURN = {"tool_calls": [{"name": "get_weather", "arguments": {"location": "Paris"}}]}
+ANSWER = {"content": "It is sunny."}
+
+
+class Crash(BaseException):
+    """Stands in for the process dying mid-run."""
+
+
+def crashing_tool(arguments):
+    raise Crash()
+
+
+def test_replay_folds_records_into_state():
+    records = [
+        {"type": "messages", "messages": [{"role": "system", "content": "s"}]},
+        {"type": "run", "user_message": "hi"},
+        {"type": "message", "message": {"role": "user", "content": "hi"}},
+        {"type": "response", "content": "", "tool_calls": [{"id": "c1", "name": "t", "arguments": {}}]},
+        {"type": "tool_results", "results": ["ok"]},
+    ]
+    state = replay(records)
+    assert state.in_run and state.user_message == "hi"
+    assert [message["role"] for message in state.messages] == ["system", "user"]
+    assert state.response["tool_calls"][0]["id"] == "c1" and state.tool_results == ["ok"]
+
+    state = replay(records + [{"type": "turn"}, {"type": "final", "content": "bye"}])
+    assert not state.in_run and state.response is None and state.final == "bye"
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / "run.jsonl"
+    with Journal(str(path)) as journal:
+        journal.write("run", user_message="hi")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "fin')
+    assert [record["type"] for record in read_records(str(path))] == ["run"]
+
+
+def test_resume_finishes_run_without_resending_finished_turns(mock_server, client, tools, tmp_path):
+    schemas, funcs = tools
+    server = mock_server(script=[TOOL_TURN, ANSWER])
+    path = str(tmp_path / "run.jsonl")
+
+    agent = Agent([], schemas, dict(funcs, get_weather=crashing_tool), "mock-model", 0.0,
+                  client=client(server), journal=path, parallel_tools=False)
+    with pytest.raises(Crash):
+        agent.run("Weather in Paris?")
+    agent.journal.close()
+    assert server.requests == 1
+
+    resumed = Agent([], schemas, funcs, "mock-model", 0.0, client=client(server))
+    assert resumed.resume(path) == "It is sunny."
+    # The tool turn came from the journal; only the answer was requested
+    assert server.requests == 2
+    assert [message["role"] for message in resumed.messages] == ["system", "user", "assistant", "user", "assistant"]
+    assert replay(read_records(path)).final == "It is sunny."
+    assert resumed.resume() == "It is sunny."
+    assert server.requests == 2
@@ -0,0 +1,27 @@
+import json
+
+from agent import Agent
+from request_template import CompiledRequest
+
+
+def test_body_matches_plain_json_and_reuses_encoded_messages():
+    messages = [{"role": "system", "content": "s"}, {"role": "user", "content": "é"}]
+    compiled = CompiledRequest("m", [], 0.3, stop=["</function>"])
+    body = json.loads(compiled.body(messages))
+    assert body == {"model": "m", "temperature": 0.3, "stop": ["</function>"], "messages": messages}
+    encoded = list(compiled._encoded)
+    compiled.body(messages + [{"role": "assistant", "content": "a"}])
+    assert compiled._encoded[:2] == encoded and len(compiled._encoded) == 3
+
+
+def test_agent_recompiles_when_any_request_field_changes():
+    agent = Agent([], [], {}, "m", 0.0, client=object(), lean_http=True)
+    assert json.loads(agent._compiled_body())["temperature"] == 0.0
+    agent.temperature = 0.7
+    assert json.loads(agent._compiled_body())["temperature"] == 0.7
+    agent.stop_after_tool_call = True
+    assert "stop" in json.loads(agent._compiled_body())
+    agent.stop_after_tool_call = False
+    assert "stop" not in json.loads(agent._compiled_body())
+    agent.model = "other"
+    assert json.loads(agent._compiled_body())["model"] == "other"
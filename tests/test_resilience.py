@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from agent import Agent, AsyncAgent
+from resilience import (Deadline, DeadlineExceeded, HedgePolicy, LatencyTracker, RetryPolicy,
+                        acall_with_resilience, call_with_resilience)
+
+NO_BACKOFF = RetryPolicy(max_attempts=3, base_delay=0)
+
+
+def flaky(failures, error=httpx.ConnectError("refused")):
+    """A call that fails `failures` times, then returns the attempt number."""
+    attempts = []
+
+    def call(timeout):
+        attempts.append(timeout)
+        if len(attempts) <= failures:
+            raise error
+        return len(attempts)
+
+    return call, attempts
+
+
+def test_retryable_errors_are_retried():
+    call, attempts = flaky(2)
+    assert call_with_resilience(call, retry=NO_BACKOFF) == 3
+
+
+def test_retries_stop_after_max_attempts():
+    call, attempts = flaky(5)
+    with pytest.raises(httpx.ConnectError):
+        call_with_resilience(call, retry=NO_BACKOFF)
+    assert len(attempts) == 3
+
+
+def test_other_errors_are_not_retried():
+    call, attempts = flaky(1, ValueError("bad request"))
+    with pytest.raises(ValueError):
+        call_with_resilience(call, retry=NO_BACKOFF)
+    assert len(attempts) == 1
+
+
+def test_attempt_timeout_is_cut_to_the_time_left():
+    call, attempts = flaky(0)
+    call_with_resilience(call, call_timeout=10, deadline=Deadline(1))
+    assert 0.9 < attempts[0] <= 1
+
+
+def test_backoff_longer_than_the_time_left_gives_up():
+    call, attempts = flaky(5)
+    with pytest.raises(httpx.ConnectError):
+        call_with_resilience(call, deadline=Deadline(0.5), retry=RetryPolicy(base_delay=10, max_delay=10))
+    assert len(attempts) <= 2
+
+
+def test_async_retries():
+    call, attempts = flaky(2)
+
+    async def acall(timeout):
+        return call(timeout)
+
+    assert asyncio.run(acall_with_resilience(acall, retry=NO_BACKOFF)) == 3
+
+
+def test_slow_call_is_hedged_and_the_loser_cancelled():
+    tracker = LatencyTracker()
+    for _ in range(20):
+        tracker.record(0.05)
+    cancelled = []
+    calls = 0
+
+    async def call(timeout):
+        nonlocal calls
+        calls += 1
+        try:
+            await asyncio.sleep(2 if calls == 1 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(calls)
+            raise
+        return calls
+
+    started = time.monotonic()
+    result = asyncio.run(acall_with_resilience(call, hedge=HedgePolicy(min_samples=20, tracker=tracker)))
+    assert result == 2
+    assert time.monotonic() - started < 1
+    assert cancelled == [2]
+
+
+def test_no_hedge_without_latency_history():
+    assert HedgePolicy(tracker=LatencyTracker()).delay() is None
+
+
+def test_agent_retries_server_errors(mock_server, client, tools):
+    server = mock_server(error_rate=1.0)
+    agent = Agent([], *tools, "mock-model", 0.0, client=client(server), retry=NO_BACKOFF)
+    with pytest.raises(openai.InternalServerError):
+        agent.run("Weather?")
+    assert server.requests == 3
+    assert agent.status == "error"
+
+
+def test_sync_agent_cannot_hedge(tools):
+    with pytest.raises(ValueError):
+        Agent([], *tools, "mock-model", 0.0, client=object(), hedge=True)
+
+
+@pytest.mark.parametrize("agent_class", [Agent, AsyncAgent])
+def test_run_timeout_ends_the_run(mock_server, client, async_client, tools, agent_class):
+    server = mock_server(latency="constant:0.5")
+
+    async def arun():
+        agent = AsyncAgent([], *tools, "mock-model", 0.0, client=async_client(server), run_timeout=0.3)
+        with pytest.raises(DeadlineExceeded):
+            await agent.arun("Weather?")
+        return agent
+
+    if agent_class is AsyncAgent:
+        agent = asyncio.run(arun())
+    else:
+        agent = Agent([], *tools, "mock-model", 0.0, client=client(server), run_timeout=0.3)
+        with pytest.raises(DeadlineExceeded):
+            agent.run("Weather?")
+    assert agent.status == "timeout"
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("agent_class", [Agent, AsyncAgent])
+def test_call_timeout_is_the_same_on_both_paths(mock_server, client, async_client, tools, agent_class, stream):
+    server = mock_server(latency="constant:0.5")
+
+    async def arun():
+        agent = AsyncAgent([], *tools, "mock-model", 0.0, client=async_client(server), call_timeout=0.2)
+        with pytest.raises(DeadlineExceeded, match="Call"):
+            if stream:
+                async for _ in agent.arun_stream("Weather?"):
+                    pass
+            else:
+                await agent.arun("Weather?")
+        return agent
+
+    if agent_class is AsyncAgent:
+        agent = asyncio.run(arun())
+    else:
+        agent = Agent([], *tools, "mock-model", 0.0, client=client(server), call_timeout=0.2)
+        with pytest.raises(DeadlineExceeded, match="Call"):
+            list(agent.run_stream("Weather?")) if stream else agent.run("Weather?")
+    assert agent.status == "timeout"
+
+
+@pytest.mark.parametrize("agent_class", [Agent, AsyncAgent])
+def test_call_timeouts_are_retried(mock_server, client, async_client, tools, agent_class):
+    server = mock_server(latency="constant:0.5")
+    kwargs = dict(call_timeout=0.1, retry=NO_BACKOFF)
+
+    async def arun():
+        agent = AsyncAgent([], *tools, "mock-model", 0.0, client=async_client(server), **kwargs)
+        with pytest.raises(DeadlineExceeded):
+            await agent.arun("Weather?")
+
+    if agent_class is AsyncAgent:
+        asyncio.run(arun())
+    else:
+        with pytest.raises(DeadlineExceeded):
+            Agent([], *tools, "mock-model", 0.0, client=client(server), **kwargs).run("Weather?")
+    assert server.requests == 3
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agent import Agent, AsyncAgent
+from budget import CancelToken, RunCancelled
+from resilience import DeadlineExceeded
+from single_flight import SingleFlight
+
+
+def slow(result, seconds=0.2, calls=None):
+    def compute():
+        if calls is not None:
+            calls.append(1)
+        time.sleep(seconds)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+    return compute
+
+
+def test_concurrent_duplicates_share_one_call():
+    flight, calls = SingleFlight(), []
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: flight.do("key", slow("answer", calls=calls)), range(8)))
+    assert results == ["answer"] * 8
+    assert len(calls) == 1
+    assert flight.stats() == {"hits": 7, "misses": 1, "bypassed": 0, "in_flight": 0}
+
+
+def test_followers_get_the_leaders_error():
+    flight = SingleFlight()
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flight.do, "key", slow(ValueError("boom"))) for _ in range(4)]
+    for future in futures:
+        with pytest.raises(ValueError, match="boom"):
+            future.result()
+
+
+def test_follower_timeout():
+    flight = SingleFlight()
+    leader = threading.Thread(target=flight.do, args=("key", slow("answer", seconds=0.5)))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(DeadlineExceeded):
+        flight.do("key", slow("mine"), timeout=0.1)
+    leader.join()
+
+
+def test_finished_calls_are_not_reused():
+    flight, calls = SingleFlight(), []
+    flight.do("key", slow("first", 0, calls))
+    assert flight.do("key", slow("second", 0, calls)) == "second"
+    assert len(calls) == 2
+
+
+def test_temperature_limit():
+    flight = SingleFlight(max_temperature=0.2)
+    assert flight.applies(0.0) and flight.applies(None)
+    assert not flight.applies(0.7)
+    assert not SingleFlight(enabled=False).applies(0.0)
+    assert flight.stats()["bypassed"] == 1
+
+
+def test_async_call_survives_a_cancelled_waiter():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "answer"
+
+    async def run():
+        first = asyncio.ensure_future(flight.ado("key", compute))
+        second = asyncio.ensure_future(flight.ado("key", compute))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "answer"
+    assert len(calls) == 1
+
+
+def test_async_call_is_cancelled_without_waiters():
+    flight = SingleFlight()
+
+    async def run():
+        state = {}
+
+        async def compute():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        waiter = asyncio.ensure_future(flight.ado("key", compute))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.sleep(0.05)
+        return state
+
+    assert asyncio.run(run()) == {"cancelled": True}
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_identical_agents_share_calls(mock_server, client, tools):
+    server = mock_server(latency="constant:0.3")
+    flight = SingleFlight()
+    agents = [Agent([], *tools, "mock-model", 0.0, client=client(server), single_flight=flight) for _ in range(6)]
+    with ThreadPoolExecutor(6) as pool:
+        results = list(pool.map(lambda agent: agent.run("Weather?"), agents))
+    assert len(set(results)) == 1
+    assert server.requests == 2
+    assert flight.stats()["hits"] == 10
+
+
+def test_identical_async_agents_share_calls(mock_server, async_client, tools):
+    server = mock_server(latency="constant:0.3")
+    flight = SingleFlight()
+
+    async def run():
+        client = async_client(server)
+        agents = [AsyncAgent([], *tools, "mock-model", 0.0, client=client, single_flight=flight) for _ in range(6)]
+        return await asyncio.gather(*(agent.arun("Weather?") for agent in agents))
+
+    assert len(set(asyncio.run(run()))) == 1
+    assert server.requests == 2
+
+
+def test_cancelling_the_leader_leaves_the_shared_call_running(mock_server, client, tools):
+    server = mock_server(script=[{"content": "answer"}], latency="constant:0.4")
+    flight = SingleFlight()
+    token = CancelToken()
+    leader = Agent([], *tools, "mock-model", 0.0, client=client(server), single_flight=flight, cancel_token=token)
+    follower = Agent([], *tools, "mock-model", 0.0, client=client(server), single_flight=flight)
+    with ThreadPoolExecutor(2) as pool:
+        led = pool.submit(leader.run, "Hi")
+        time.sleep(0.1)
+        followed = pool.submit(follower.run, "Hi")
+        time.sleep(0.1)
+        token.cancel()
+        with pytest.raises(RunCancelled):
+            led.result()
+        assert followed.result() == "answer"
+    assert server.requests == 1
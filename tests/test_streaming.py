@@ -0,0 +1,103 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import tool_backends
+import xml_utils
+from agent import Agent
+from streaming import ToolCallAssembler
+
+CALL = "<function=get_weather><parameter=location>Paris</parameter><parameter=unit>celsius</parameter></function>"
+
+
+def feed_chunks(parser, text, size):
+    calls = []
+    for start in range(0, len(text), size):
+        calls.extend(parser.feed(text[start:start + size]))
+    return calls
+
+
+def test_xml_parser_handles_markers_split_across_chunks():
+    text = f"Let me check. {CALL} and {CALL.replace('Paris', 'Oslo')} done"
+    for size in (1, 2, 3, 7, len(text)):
+        calls = feed_chunks(xml_utils.XmlToolCallParser(), text, size)
+        assert [call["arguments"]["location"] for call in calls] == ["Paris", "Oslo"], size
+        assert calls[0] == {"name": "get_weather", "arguments": {"location": "Paris", "unit": "celsius"}}
+
+
+def test_xml_parser_reports_call_when_its_closing_tag_arrives():
+    parser = xml_utils.XmlToolCallParser()
+    closing = CALL.index("</function>")
+    assert parser.feed(CALL[:closing + 5]) == []
+    assert len(parser.feed(CALL[closing + 5:])) == 1
+
+
+def test_xml_parser_close_returns_call_cut_off_by_stop_sequence():
+    parser = xml_utils.XmlToolCallParser()
+    assert parser.feed("<function=read_file><parameter=filename>notes</parameter><parameter=extension>txt") == []
+    assert parser.close() == [{"name": "read_file", "arguments": {"filename": "notes", "extension": "txt"}}]
+    assert parser.close() == []
+
+
+def delta(index, id=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def test_assembler_completes_call_once_arguments_are_valid_json():
+    assembler = ToolCallAssembler()
+    assert assembler.feed([delta(0, "call_a", "get_weather", "")]) == []
+    assert assembler.feed([delta(0, arguments='{"location": ')]) == []
+    assert assembler.feed([delta(0, arguments='"Paris"}')]) == [0]
+    assert assembler.finish() == []
+    assert assembler.call(0) == {"id": "call_a", "name": "get_weather", "arguments": {"location": "Paris"},
+                                 "raw_args": '{"location": "Paris"}'}
+
+
+def test_assembler_completes_earlier_call_when_next_index_starts():
+    assembler = ToolCallAssembler()
+    assembler.feed([delta(0, "call_a", "list_files", '{"path": "."')])
+    assert assembler.feed([delta(1, "call_b", "get_weather", "")]) == [0]
+    assembler.feed([delta(1, arguments='{"location": "Oslo"')])
+    assert assembler.finish() == [1]
+    assert [call["id"] for call in assembler.tool_calls()] == ["call_a", "call_b"]
+
+
+def test_streamed_run_dispatches_xml_and_native_tool_calls(mock_server, client, tools):
+    schemas, funcs = tools
+    for xml in (False, True):
+        server = mock_server(xml_tool_calls=xml, tokens_per_s=2000)
+        agent = Agent([], schemas, funcs, "mock-model", 0.0, client=client(server))
+        deltas = list(agent.run_stream("What's the weather?"))
+        assert "".join(deltas).endswith(agent.messages[-1]["content"])
+        assert agent.status == "completed"
+        assert agent.run_usage == {"turns": 2, "tool_calls": 1, "tokens": agent.run_usage["tokens"]}
+
+
+def test_closing_a_stream_cancels_its_dispatched_tool_calls(mock_server, client):
+    started, release, ran = threading.Event(), threading.Event(), []
+
+    def slow(arguments):
+        started.set()
+        release.wait(5)
+        ran.append(("slow", tool_backends.cancel_event.get().is_set()))
+
+    def save(arguments):
+        ran.append(("save", False))
+
+    script = [{"tool_calls": [{"name": "slow", "arguments": {}}, {"name": "save", "arguments": {}}]}]
+    server = mock_server(script=script, xml_tool_calls=True, tokens_per_s=200)
+    agent = Agent([], [], {"slow": slow, "save": save}, "mock-model", 0.0, client=client(server))
+    stream = agent.run_stream("Go")
+    for _ in stream:
+        if started.is_set():
+            break
+    stream.close()
+    release.set()
+    # The dispatcher's worker finishes the running call right after release
+    for _ in range(50):
+        if ran:
+            break
+        time.sleep(0.1)
+    assert started.is_set()
+    assert ran == [("slow", True)]
+    assert agent.status == "cancelled"
@@ -0,0 +1,128 @@
+import io
+import json
+import urllib.request
+
+import pytest
+
+import telemetry
+from agent import Agent
+
+
+@pytest.fixture
+def spans():
+    exporter = telemetry.InMemoryExporter()
+    telemetry.tracer.add_exporter(exporter)
+    yield exporter
+    telemetry.tracer.remove_exporter(exporter)
+
+
+def test_agent_run_records_nested_spans(mock_server, client, tools, spans):
+    server = mock_server(latency="constant:0.05")
+    agent = Agent([], *tools, "mock-model", 0.0, client=client(server))
+    agent.run("Weather?")
+    (run,) = spans.spans("agent_run")
+    calls = spans.spans("llm_call")
+    (tool,) = spans.spans("tool_call")
+    assert len(calls) == 2
+    assert {span.trace_id for span in calls + [tool]} == {run.trace_id}
+    assert all(span.parent_id == run.span_id for span in calls + [tool])
+    assert run.attributes["turns"] == 2 and run.attributes["tool_calls"] == 1
+    assert tool.attributes["tool"] == "get_weather"
+    for call in calls:
+        assert call.attributes["model"] == "mock-model"
+        assert call.attributes["prompt_tokens"] > 0 and call.attributes["completion_tokens"] > 0
+        assert call.duration >= 0.05
+
+
+def test_streamed_calls_record_time_to_first_token(mock_server, client, tools, spans):
+    server = mock_server(script=[{"content": "hello"}], latency="constant:0.05", tokens_per_s=200,
+                         completion_tokens=20)
+    agent = Agent([], *tools, "mock-model", 0.0, client=client(server))
+    list(agent.run_stream("Hi"))
+    (call,) = spans.spans("llm_call")
+    assert call.attributes["stream"] is True
+    assert 0.05 <= call.attributes["ttft_s"] < call.duration
+    assert call.attributes["tokens_per_s"] > 0
+    assert "completion_tokens_estimated" not in call.attributes
+
+
+def test_failed_run_is_marked_as_an_error(mock_server, client, tools, spans):
+    server = mock_server(error_rate=1.0)
+    agent = Agent([], *tools, "mock-model", 0.0, client=client(server))
+    with pytest.raises(Exception):
+        agent.run("Hi")
+    (run,) = spans.spans("agent_run")
+    (call,) = spans.spans("llm_call")
+    assert run.status == call.status == "error"
+    assert "InternalServerError" in call.error
+
+
+def test_metrics_snapshot_and_prometheus_text():
+    metrics = telemetry.Metrics()
+    metrics.describe("calls_total", "Calls made")
+    metrics.inc("calls_total", model="m")
+    metrics.inc("calls_total", 2, model="m")
+    metrics.observe("latency_seconds", 0.2, model="m")
+    metrics.observe("latency_seconds", 3.0, model="m")
+    snapshot = metrics.snapshot()
+    assert snapshot["calls_total"] == [{"labels": {"model": "m"}, "value": 3}]
+    (histogram,) = snapshot["latency_seconds"]
+    assert histogram["count"] == 2 and histogram["sum"] == pytest.approx(3.2)
+    assert histogram["buckets"]["0.25"] == 1 and histogram["buckets"]["+Inf"] == 2
+    text = metrics.prometheus_text()
+    assert '# HELP calls_total Calls made' in text
+    assert 'calls_total{model="m"} 3' in text
+    assert 'latency_seconds_bucket{model="m",le="+Inf"} 2' in text
+    assert 'latency_seconds_count{model="m"} 2' in text
+
+
+def test_spans_feed_the_metrics():
+    metrics = telemetry.Metrics()
+    tracer = telemetry.Tracer(metrics)
+    with tracer.span("llm_call", model="m") as span:
+        span.set(prompt_tokens=10, completion_tokens=5)
+    with pytest.raises(ValueError):
+        with tracer.span("tool_call", tool="t"):
+            raise ValueError("boom")
+    snapshot = metrics.snapshot()
+    assert snapshot["llm_calls_total"] == [{"labels": {"model": "m", "status": "ok"}, "value": 1}]
+    assert snapshot["llm_completion_tokens_total"][0]["value"] == 5
+    assert snapshot["tool_calls_total"] == [{"labels": {"status": "error", "tool": "t"}, "value": 1}]
+
+
+def test_jsonl_exporter_writes_one_line_per_span(tmp_path):
+    tracer = telemetry.Tracer(telemetry.Metrics())
+    exporter = telemetry.JsonlExporter(str(tmp_path / "spans.jsonl"))
+    tracer.add_exporter(exporter)
+    with tracer.span("agent_run") as parent:
+        with tracer.span("llm_call", parent, model="m"):
+            pass
+    exporter.close()
+    lines = [json.loads(line) for line in (tmp_path / "spans.jsonl").read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["llm_call", "agent_run"]
+    assert lines[0]["parent_id"] == lines[1]["span_id"]
+
+
+def test_metrics_server_serves_prometheus_text():
+    server = telemetry.start_metrics_server(port=0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert response.read().decode() == telemetry.prometheus_text()
+    finally:
+        server.shutdown()
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_log_modes(mode):
+    stream = io.StringIO()
+    try:
+        telemetry.configure_logging(mode, stream=stream)
+        telemetry.logger.info("hello")
+        telemetry.logger.debug("hidden")
+        telemetry.configure_logging("off")
+        telemetry.logger.info("dropped")
+    finally:
+        telemetry.configure_logging("off")
+    assert stream.getvalue() == "hello\n"
@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+
+import pytest
+
+import tool_backends
+from tool_backends import (InlineBackend, ProcessBackend, SubprocessBackend, ThreadBackend, ToolCancelled,
+                           ToolError, ToolTimeout)
+from tool_registry import ToolRegistry
+
+
+# Module-level so worker processes and subprocesses can import them
+def square(x):
+    return x * x
+
+
+def nap(seconds):
+    time.sleep(seconds)
+    return "woke"
+
+
+def fail():
+    raise RuntimeError("broken tool")
+
+
+def crash():
+    os._exit(3)
+
+
+@pytest.fixture(scope="module")
+def process_backend():
+    backend = ProcessBackend(max_workers=2)
+    yield backend
+    backend.shutdown()
+
+
+@pytest.fixture(params=["inline", "thread", "process", "subprocess"])
+def backend(request, process_backend):
+    return {"inline": InlineBackend(), "thread": ThreadBackend(), "process": process_backend,
+            "subprocess": SubprocessBackend()}[request.param]
+
+
+def test_backends_return_the_result(backend):
+    assert backend.run(square, {"x": 7}) == 49
+
+
+def test_backends_report_tool_errors(backend):
+    expected = RuntimeError if isinstance(backend, InlineBackend) else ToolError
+    with pytest.raises(expected, match="broken tool"):
+        backend.run(fail, {})
+
+
+@pytest.mark.parametrize("backend", ["thread", "process", "subprocess"], indirect=True)
+def test_timeouts_stop_waiting(backend):
+    started = time.monotonic()
+    with pytest.raises(ToolTimeout):
+        backend.run(nap, {"seconds": 5}, timeout=0.2)
+    assert time.monotonic() - started < 2
+    # The backend is still usable afterwards
+    assert backend.run(square, {"x": 3}) == 9
+
+
+@pytest.mark.parametrize("backend", ["thread", "process", "subprocess"], indirect=True)
+def test_cancel_event_stops_a_running_call(backend):
+    event = threading.Event()
+    token = tool_backends.cancel_event.set(event)
+    threading.Timer(0.2, event.set).start()
+    started = time.monotonic()
+    try:
+        with pytest.raises(ToolCancelled):
+            backend.run(nap, {"seconds": 5})
+    finally:
+        tool_backends.cancel_event.reset(token)
+    assert time.monotonic() - started < 2
+
+
+def test_crashed_worker_is_replaced(process_backend):
+    with pytest.raises(ToolError, match="Worker process died"):
+        process_backend.run(crash, {})
+    assert process_backend.run(square, {"x": 2}) == 4
+
+
+def test_registry_reports_backend_failures_to_the_model():
+    registry = ToolRegistry()
+    registry.register(nap, backend="thread", timeout=0.2)
+    registry.register(fail, backend="thread")
+    funcs = registry.funcs()
+    assert funcs["nap"]({"seconds": 5}) == "Error: nap timed out after 0.2s"
+    assert funcs["fail"]({}) == "Error: fail failed: RuntimeError: broken tool"
@@ -0,0 +1,65 @@
+import pytest
+
+from agent import Agent
+from tool_registry import ToolRegistry
+
+TWO_CALLS = [
+    {"tool_calls": [{"name": "get_weather", "arguments": {"location": "Paris"}},
+                    {"name": "get_weather", "arguments": {"location": "Oslo"}}]},
+    {"content": "Done."},
+]
+
+
+def as_dict(message):
+    return message if isinstance(message, dict) else dict(message)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_tool_turn_is_recorded_as_tool_messages(mock_server, client, tools, stream):
+    server = mock_server(script=TWO_CALLS)
+    agent = Agent([], *tools, "mock-model", 0.0, client=client(server), tool_messages=True)
+    list(agent.run_stream("Weather?")) if stream else agent.run("Weather?")
+    assistant, *results, final = [as_dict(message) for message in agent.messages[2:]]
+    assert [call["function"]["name"] for call in assistant["tool_calls"]] == ["get_weather", "get_weather"]
+    assert [result["role"] for result in results] == ["tool", "tool"]
+    assert [result["tool_call_id"] for result in results] == [call["id"] for call in assistant["tool_calls"]]
+    assert "Paris" in results[0]["content"] and "Oslo" in results[1]["content"]
+    assert final == {"role": "assistant", "content": "Done."}
+
+
+def test_xml_calls_get_stable_ids_and_no_duplicate_content(mock_server, client, tools):
+    server = mock_server(script=TWO_CALLS, xml_tool_calls=True)
+    runs = []
+    for _ in range(2):
+        agent = Agent([], *tools, "mock-model", 0.0, client=client(server), tool_messages=True)
+        agent.run("Weather?")
+        runs.append(as_dict(agent.messages[2]))
+    assert runs[0]["tool_calls"] == runs[1]["tool_calls"]
+    assert [call["id"] for call in runs[0]["tool_calls"]] == ["call_2_0", "call_2_1"]
+    assert runs[0]["content"] is None
+
+
+def test_long_results_are_truncated(mock_server, client, tools):
+    server = mock_server(script=TWO_CALLS)
+    agent = Agent([], *tools, "mock-model", 0.0, client=client(server), tool_messages=True,
+                  max_tool_result_chars=10)
+    agent.run("Weather?")
+    result = as_dict(agent.messages[3])["content"]
+    assert result.startswith(agent.tool_funcs["get_weather"]({"location": "Paris"})[:10])
+    assert result.endswith("chars]") and "[truncated" in result
+
+
+def test_tool_limit_overrides_the_agent_limit(mock_server, client):
+    registry = ToolRegistry()
+
+    @registry.tool(max_result_chars=5)
+    def shout(text: str):
+        """Repeat text loudly"""
+        return text.upper() * 10
+
+    server = mock_server(script=[{"tool_calls": [{"name": "shout", "arguments": {"text": "hey"}}]},
+                                 {"content": "ok"}])
+    agent = Agent([], registry.schemas(), registry.funcs(), "mock-model", 0.0, client=client(server),
+                  tool_messages=True, max_tool_result_chars=1000)
+    agent.run("Shout")
+    assert as_dict(agent.messages[3])["content"] == "HEYHE... [truncated 25 chars]"
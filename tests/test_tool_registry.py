@@ -0,0 +1,97 @@
+from typing import List, Literal, Optional
+
+import pytest
+
+from agent import Agent
+from tool_registry import ToolRegistry, default_registry
+
+
+@pytest.fixture
+def registry():
+    registry = ToolRegistry()
+
+    @registry.tool(read_only=True, keywords=("forecast",))
+    def get_weather(location: str, unit: Literal["celsius", "fahrenheit"] = "celsius"):
+        """
+        Get current weather for a location
+
+        Args:
+            location: City and country, e.g. 'Paris, France'
+            unit: Temperature unit
+        """
+        return f"Weather in {location}"
+
+    @registry.tool(keywords=("save", "write"))
+    def save_note(title: str, lines: List[str], pinned: bool = False, size: Optional[int] = None):
+        """
+        Save a note
+
+        Args:
+            title: Title of the note
+            lines: Lines of text, one per entry
+                (continued on a second line)
+            pinned: Keep the note at the top
+            size: Font size
+        """
+        return f"Saved {title}"
+
+    return registry
+
+
+def test_schema_is_generated_from_signature_and_docstring(registry):
+    weather, note = registry.schemas()
+    assert weather["function"]["description"] == "Get current weather for a location"
+    assert weather["function"]["parameters"] == {
+        "type": "object",
+        "properties": {
+            "location": {"type": "string", "description": "City and country, e.g. 'Paris, France'"},
+            "unit": {"type": "string", "enum": ["celsius", "fahrenheit"], "description": "Temperature unit"},
+        },
+        "required": ["location"],
+    }
+    properties = note["function"]["parameters"]["properties"]
+    assert properties["lines"] == {"type": "array", "items": {"type": "string"},
+                                   "description": "Lines of text, one per entry (continued on a second line)"}
+    assert properties["pinned"]["type"] == "boolean"
+    assert properties["size"]["type"] == "integer"
+
+
+def test_adapter_checks_required_and_drops_unknown_arguments(registry):
+    funcs = registry.funcs()
+    assert funcs["get_weather"]({"location": "Oslo", "bogus": 1}) == "Weather in Oslo"
+    assert funcs["get_weather"]({}).startswith("Error: get_weather is missing required argument(s): location")
+    assert funcs["get_weather"].read_only and not funcs["save_note"].read_only
+
+
+def test_select_ranks_by_relevance(registry):
+    assert [s["function"]["name"] for s in registry.select("What's the forecast for Oslo?")] == ["get_weather"]
+    assert [s["function"]["name"] for s in registry.select("Save a note titled groceries")] == ["save_note"]
+
+
+def test_select_needs_more_than_one_description_word(registry):
+    # "location" is only a parameter and description word of get_weather
+    assert [s["function"]["name"] for s in registry.select("Save a note with the office location")] == ["save_note"]
+
+
+def test_file_prompts_do_not_select_the_weather_tool():
+    for text in ("List the files in the src folder", "Show the location of the config file",
+                 "Find the path of the biggest file", "Save the report to out.txt"):
+        names = [s["function"]["name"] for s in default_registry.select(text)]
+        assert "get_weather" not in names, text
+
+
+def test_select_falls_back_to_every_tool(registry):
+    assert registry.select("Tell me a joke") is registry.schemas()
+
+
+def test_same_selection_returns_the_same_list(registry):
+    assert registry.select("forecast please") is registry.select("weather forecast")
+    assert registry.schemas(["save_note"]) is registry.schemas(["save_note"])
+
+
+def test_agent_sends_the_selected_tools(mock_server, client, registry):
+    server = mock_server(script=[{"content": "ok"}])
+    agent = Agent([], registry.schemas(), registry.funcs(), "mock-model", 0.0, client=client(server),
+                  tool_selector=registry.selector(max_tools=1))
+    agent.run("Save a note about the forecast")
+    assert [s["function"]["name"] for s in agent._request_tools] == ["save_note"]
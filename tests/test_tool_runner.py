@@ -0,0 +1,61 @@
+import concurrent.futures
+import threading
+
+import pytest
+
+import tool_backends
+from tool_runner import StreamingDispatcher, plan_lanes, tool_traits
+
+
+def make_tool(read_only=False, resource=None):
+    return tool_traits(read_only=read_only, resource=resource)(lambda arguments: None)
+
+
+FUNCS = {
+    "read": make_tool(read_only=True, resource=lambda arguments: arguments["path"]),
+    "write": make_tool(resource=lambda arguments: arguments["path"]),
+    "weather": make_tool(read_only=True),
+    "untyped": lambda arguments: None,
+}
+
+
+def calls(*specs):
+    return [{"name": name, "arguments": {"path": path}} for name, path in specs]
+
+
+def test_read_only_calls_each_get_a_lane():
+    assert plan_lanes(calls(("read", "a"), ("read", "b"), ("weather", None)), FUNCS) == [[0], [1], [2]]
+
+
+def test_calls_sharing_a_written_resource_run_in_order():
+    lanes = plan_lanes(calls(("read", "a"), ("write", "a"), ("read", "b"), ("read", "a")), FUNCS)
+    assert lanes == [[0, 1, 3], [2]]
+
+
+def test_mutating_tools_without_traits_share_one_serial_lane():
+    lanes = plan_lanes(calls(("untyped", None), ("read", "a"), ("untyped", None)), FUNCS)
+    assert lanes == [[0, 2], [1]]
+
+
+def test_cancel_stops_dispatched_calls():
+    started, release, ran = threading.Event(), threading.Event(), []
+
+    def execute(name, arguments):
+        if name == "slow":
+            started.set()
+            release.wait(5)
+            ran.append(("slow", tool_backends.cancel_event.get().is_set()))
+        else:
+            ran.append((name, False))
+
+    # Untyped tools share the serial lane, so "next" waits for "slow"
+    dispatcher = StreamingDispatcher(execute, {"slow": FUNCS["untyped"], "next": FUNCS["untyped"]})
+    dispatcher.submit({"name": "slow", "arguments": {}})
+    dispatcher.submit({"name": "next", "arguments": {}})
+    assert started.wait(5)
+    dispatcher.cancel()
+    release.set()
+    with pytest.raises((tool_backends.ToolCancelled, concurrent.futures.CancelledError)):
+        dispatcher.results()
+    # The running call saw the cancellation; the queued one never started
+    assert ran == [("slow", True)]
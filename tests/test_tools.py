@@ -0,0 +1,102 @@
+import os
+import stat
+
+import pytest
+
+import tools
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    for name in ("a.txt", "b.py", "c.txt"):
+        (tmp_path / name).write_text(name)
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "d.txt").write_text("d")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def entries(result):
+    return [line for line in result.splitlines()[1:] if not line.startswith("[")]
+
+
+def test_list_files_cursor_pages_through_every_entry_once(tree):
+    seen, cursor = [], None
+    while True:
+        result = tools.list_files(".", depth=1, limit=2, cursor=cursor)
+        seen.extend(entries(result))
+        if "continue with cursor=" not in result:
+            break
+        cursor = result.rsplit("cursor='", 1)[1].rstrip("']")
+    assert seen == entries(tools.list_files(".", depth=1))
+    assert len(seen) == len(set(seen)) == 5
+
+
+def test_list_files_cursor_respects_filters(tree):
+    first = tools.list_files(".", depth=1, pattern="*.txt", kind="files", limit=1)
+    assert entries(first) == ["a.txt"]
+    rest = tools.list_files(".", depth=1, pattern="*.txt", kind="files", cursor="a.txt")
+    assert entries(rest) == ["c.txt", "sub/d.txt"]
+
+
+def test_read_file_pages_with_offsets(tree):
+    (tree / "big.txt").write_text("".join(f"line {i}\n" for i in range(100)))
+    first = tools.read_file("big", "txt", max_bytes=100)
+    assert "continue with offset=94" in first
+    rest = tools.read_file("big", "txt", offset=94)
+    assert rest.split(":\n", 1)[1].startswith("line 13\n")
+
+
+@pytest.mark.parametrize("arguments", [{"max_bytes": 0}, {"head": 0}, {"tail": 0}, {"length": 0}, {"max_bytes": -1}])
+def test_read_file_rejects_empty_selections(tree, arguments):
+    assert tools.read_file("a", "txt", **arguments).startswith("Error:")
+
+
+def test_read_file_clamps_max_bytes(tree):
+    (tree / "huge.txt").write_text("x" * (200 * 1024))
+    result = tools.read_file("huge", "txt", max_bytes=10 ** 9)
+    assert f"bytes 0-{64 * 1024} of" in result
+
+
+def test_adapter_converts_string_arguments(tree):
+    funcs = tools.get_tool_funcs()
+    assert funcs["read_file"]({"filename": "a", "extension": "txt", "head": "1"}).endswith("a.txt")
+    assert "sub/d.txt" in funcs["list_files"]({"path": ".", "depth": "1"})
+
+
+@pytest.mark.parametrize("arguments", [{"head": "one"}, {"head": "1.5"}, {"max_bytes": True}])
+def test_adapter_reports_unconvertible_arguments(tree, arguments):
+    result = tools.get_tool_funcs()["read_file"]({"filename": "a", "extension": "txt", **arguments})
+    assert result.startswith("Error: invalid value for")
+
+
+def test_list_files_string_limit_and_details(tree):
+    result = tools.get_tool_funcs()["list_files"]({"path": ".", "limit": "2", "details": "false"})
+    assert entries(result) == ["a.txt", "b.py"]
+    assert "cursor='b.py'" in result
+
+
+@pytest.mark.parametrize("limit", [0, -3])
+def test_list_files_rejects_non_positive_limit(tree, limit):
+    assert tools.list_files(".", limit=limit).startswith("Error:")
+
+
+def test_list_files_caps_limit(tree, monkeypatch):
+    monkeypatch.setattr(tools, "_LIST_LIMIT", 3)
+    result = tools.list_files(".", limit=10 ** 6)
+    assert len(entries(result)) == 3
+    assert "cursor='c.txt'" in result
+
+
+def test_save_file_modes(tree):
+    umask = os.umask(0o022)
+    try:
+        assert tools.save_file("new", "txt", "x").startswith("Successfully")
+        assert stat.S_IMODE(os.stat(tree / "new.txt").st_mode) == 0o644
+        os.chmod(tree / "new.txt", 0o600)
+        tools.save_file("new", "txt", "y")
+        assert stat.S_IMODE(os.stat(tree / "new.txt").st_mode) == 0o600
+    finally:
+        os.umask(umask)
+    assert (tree / "new.txt").read_text() == "y"
+    assert not [path for path in os.listdir(tree) if path.endswith(".tmp")]
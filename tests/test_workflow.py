@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from workflow import TaskCancelled, TaskSkipped, Workflow
+
+
+def run(workflow, run_task):
+    return asyncio.run(workflow.run(run_task))
+
+
+def test_tasks_start_as_soon_as_their_dependencies_finish():
+    started = []
+
+    async def run_task(task_id, upstream):
+        started.append(task_id)
+        await asyncio.sleep({"slow": 0.05}.get(task_id, 0))
+        return sum(upstream.values()) + 1
+
+    workflow = Workflow({"fast": [], "slow": [], "after_fast": ["fast"], "join": ["after_fast", "slow"]})
+    outcomes = run(workflow, run_task)
+    assert outcomes == {"fast": 1, "slow": 1, "after_fast": 2, "join": 4}
+    # after_fast didn't wait for the unrelated slow task
+    assert started.index("after_fast") < started.index("join")
+    assert started[:2] == ["fast", "slow"] and started[2] == "after_fast"
+
+
+def test_failure_skips_downstream_only():
+    async def run_task(task_id, upstream):
+        if task_id == "bad":
+            raise RuntimeError("boom")
+        return task_id
+
+    outcomes = run(Workflow({"bad": [], "child": ["bad"], "grandchild": ["child"], "other": []}), run_task)
+    assert isinstance(outcomes["bad"], RuntimeError)
+    assert isinstance(outcomes["child"], TaskSkipped) and isinstance(outcomes["grandchild"], TaskSkipped)
+    assert outcomes["other"] == "other"
+
+
+def test_cancel_running_task():
+    workflow = Workflow({"long": [], "after": ["long"]})
+
+    async def run_task(task_id, upstream):
+        await asyncio.sleep(10)
+
+    async def main():
+        running = asyncio.ensure_future(workflow.run(run_task))
+        await asyncio.sleep(0.01)
+        workflow.cancel("long")
+        return await running
+
+    outcomes = asyncio.run(main())
+    assert isinstance(outcomes["long"], TaskCancelled) and isinstance(outcomes["after"], TaskSkipped)
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError):
+        Workflow({"a": ["missing"]})
+    with pytest.raises(ValueError):
+        Workflow({"a": ["b"], "b": ["a"]})
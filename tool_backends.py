@@ -0,0 +1,286 @@
+import concurrent.futures
+import contextvars
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+# How often a waiting call checks for cancellation
+_POLL_INTERVAL = 0.05
+
+# Set by the caller (AsyncAgent sets it per tool call) to cancel a running call;
+# asyncio.to_thread copies it into the worker thread
+cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("tool_cancel_event", default=None)
+
+
+class ToolError(Exception):
+    """A tool call failed inside its backend (e.g. the worker process crashed)."""
+
+
+class ToolTimeout(ToolError):
+    """A tool call ran past its timeout."""
+
+
+class ToolCancelled(ToolError):
+    """A tool call was cancelled through cancel_event."""
+
+
+def _cancelled() -> bool:
+    event = cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def _wait(ready: Callable[[float], bool], timeout: Optional[float], on_abort: Callable[[], None]):
+    """
+    Wait until ready(poll_timeout) returns True, checking for cancellation and
+    the timeout in between. Calls on_abort() before raising either.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            on_abort()
+            raise ToolTimeout(f"Timed out after {timeout}s")
+        if _cancelled():
+            on_abort()
+            raise ToolCancelled("Cancelled")
+        if ready(min(_POLL_INTERVAL, remaining) if remaining is not None else _POLL_INTERVAL):
+            return
+
+
+class InlineBackend:
+    """
+    Runs the tool on the calling thread.
+
+    Cheapest option for fast tools. A running call can't be interrupted, so
+    timeouts and cancellation are only checked before it starts.
+    """
+
+    name = "inline"
+
+    def run(self, func: Callable, kwargs: Dict[str, Any], timeout: Optional[float] = None):
+        if _cancelled():
+            raise ToolCancelled("Cancelled")
+        return func(**kwargs)
+
+
+class ThreadBackend:
+    """
+    Runs the tool on a dedicated thread pool.
+
+    The caller stops waiting on timeout or cancellation; the thread itself
+    can't be killed and finishes in the background. Suits I/O-bound tools.
+    """
+
+    name = "thread"
+
+    def __init__(self, max_workers: int = 32):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-backend")
+
+    def run(self, func: Callable, kwargs: Dict[str, Any], timeout: Optional[float] = None):
+        if _cancelled():
+            raise ToolCancelled("Cancelled")
+        future = self._executor.submit(func, **kwargs)
+        _wait(lambda poll: bool(concurrent.futures.wait([future], poll).done), timeout, future.cancel)
+        try:
+            return future.result()
+        except Exception as e:
+            # Reported the same way as a failure in a worker process
+            raise ToolError(f"{type(e).__name__}: {e}") from e
+
+
+def _worker_main(conn):
+    """Process worker loop: receive (func, kwargs), send back (ok, result or error)."""
+    while True:
+        try:
+            func, kwargs = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            conn.send((True, func(**kwargs)))
+        except BaseException as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ProcessBackend:
+    """
+    Runs the tool in a pool of worker processes.
+
+    CPU-bound tools run in parallel across cores instead of contending for
+    the GIL. A call that times out or is cancelled has its worker killed and
+    replaced, so the work really stops. Tool functions, arguments and results
+    must be picklable (module-level functions are).
+    """
+
+    name = "process"
+
+    def __init__(self, max_workers: Optional[int] = None, start_method: str = "spawn"):
+        """
+        Args:
+            max_workers: Worker processes (defaults to the CPU count)
+            start_method: multiprocessing start method; "spawn" is safe in a
+                process that already runs threads
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._context = multiprocessing.get_context(start_method)
+        self._idle = []
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def _acquire(self) -> _Worker:
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._count < self.max_workers:
+                    self._count += 1
+                    break
+                self._condition.wait()
+        try:
+            return _Worker(self._context)
+        except BaseException:
+            self._discard(None)
+            raise
+
+    def _release(self, worker: _Worker):
+        with self._condition:
+            self._idle.append(worker)
+            self._condition.notify()
+
+    def _discard(self, worker: Optional[_Worker]):
+        if worker is not None:
+            worker.kill()
+        with self._condition:
+            self._count -= 1
+            self._condition.notify()
+
+    def run(self, func: Callable, kwargs: Dict[str, Any], timeout: Optional[float] = None):
+        if _cancelled():
+            raise ToolCancelled("Cancelled")
+        worker = self._acquire()
+        try:
+            worker.conn.send((func, kwargs))
+            _wait(worker.conn.poll, timeout, lambda: None)
+            ok, value = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            self._discard(worker)
+            raise ToolError(f"Worker process died (exit code {worker.process.exitcode})") from e
+        except BaseException:
+            # Timed out, cancelled or unpicklable: the worker's state is unknown
+            self._discard(worker)
+            raise
+        self._release(worker)
+        if not ok:
+            raise ToolError(value)
+        return value
+
+    def shutdown(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            self._discard(worker)
+
+
+_SUBPROCESS_RUNNER = """
+import importlib, json, sys
+module_name, qualname = sys.argv[1], sys.argv[2]
+kwargs = json.loads(sys.stdin.read())
+out = sys.stdout
+sys.stdout = sys.stderr  # keep the tool's own prints out of the result channel
+func = importlib.import_module(module_name)
+for part in qualname.split("."):
+    func = getattr(func, part)
+out.write(json.dumps(func(**kwargs), default=str))
+"""
+
+
+class SubprocessBackend:
+    """
+    Runs each call in a fresh Python interpreter.
+
+    The strongest isolation: a crash, leak or hang can't affect the agent
+    process, and timeouts kill the interpreter. Startup costs tens of
+    milliseconds per call. The tool must be importable by module name, and
+    its arguments and result must be JSON serializable.
+    """
+
+    name = "subprocess"
+
+    def run(self, func: Callable, kwargs: Dict[str, Any], timeout: Optional[float] = None):
+        if _cancelled():
+            raise ToolCancelled("Cancelled")
+        if func.__module__ == "__main__":
+            raise ToolError(f"{func.__qualname__} is defined in __main__ and can't be imported by a subprocess")
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+        process = subprocess.Popen(
+            [sys.executable, "-c", _SUBPROCESS_RUNNER, func.__module__, func.__qualname__],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env
+        )
+        request = [json.dumps(kwargs).encode()]
+        output = {}
+
+        def ready(poll):
+            try:
+                # Input can only be passed on the first call; later calls keep waiting
+                output["stdout"], output["stderr"] = process.communicate(request.pop() if request else None, timeout=poll)
+                return True
+            except subprocess.TimeoutExpired:
+                return False
+
+        def kill():
+            process.kill()
+            process.communicate()
+
+        _wait(ready, timeout, kill)
+        if process.returncode != 0:
+            error = output["stderr"].decode(errors="replace").strip().splitlines()
+            raise ToolError(error[-1] if error else f"Exited with status {process.returncode}")
+        return json.loads(output["stdout"])
+
+
+Backend = Union[InlineBackend, ThreadBackend, ProcessBackend, SubprocessBackend]
+
+_backend_types = {
+    "inline": InlineBackend,
+    "thread": ThreadBackend,
+    "process": ProcessBackend,
+    "subprocess": SubprocessBackend,
+}
+_backends: Dict[str, Backend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(backend: Union[str, Backend]) -> Backend:
+    """Return the shared backend for a name ("inline", "thread", "process", "subprocess"), or `backend` itself."""
+    if not isinstance(backend, str):
+        return backend
+    with _backends_lock:
+        instance = _backends.get(backend)
+        if instance is None:
+            if backend not in _backend_types:
+                raise ValueError(f"Unknown tool backend: {backend!r}")
+            instance = _backends[backend] = _backend_types[backend]()
+        return instance
+
+
+def configure_backend(name: str, backend: Backend):
+    """Replace the shared backend registered under `name`, e.g. ProcessBackend(max_workers=8)."""
+    with _backends_lock:
+        _backends[name] = backend
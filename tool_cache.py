@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from tool_runner import resource_key
+
+
+class CachePolicy:
+    """TTL and size bound for one tool's cached results."""
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "resource")
+
+    def __init__(self, value, expires_at, resource):
+        self.value = value
+        self.expires_at = expires_at
+        self.resource = resource
+
+
+def canonical_arguments(arguments: Optional[Dict[str, Any]]) -> str:
+    """Serialize call arguments so equal arguments always give the same key."""
+    return json.dumps(arguments or {}, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def _covers(entry_resource, changed) -> bool:
+    """True if a change to `changed` can affect a result cached for `entry_resource`."""
+    if entry_resource == changed:
+        return True
+    # A directory listing is affected by changes to anything inside it
+    return (isinstance(entry_resource, str) and isinstance(changed, str)
+            and changed.startswith(entry_resource.rstrip(os.sep) + os.sep))
+
+
+class ToolResultCache:
+    """
+    Memoizes results of read-only tools, shared by every agent that uses it.
+
+    Entries are keyed by tool name plus canonicalized arguments and expire
+    after the tool's TTL; each tool's entries are LRU-bounded. Running a
+    mutating tool drops cached results for the resource it touches (e.g.
+    save_file drops read_file of that file and list_files of its directory),
+    or the whole cache if the tool doesn't declare a resource.
+    """
+
+    def __init__(self, default_policy: Optional[CachePolicy] = None, policies: Optional[Dict[str, CachePolicy]] = None):
+        """
+        Args:
+            default_policy: Policy for tools without an entry in `policies`
+            policies: Per-tool policies keyed by tool name
+        """
+        self.default_policy = default_policy or CachePolicy()
+        self.policies = dict(policies or {})
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, "OrderedDict[str, _Entry]"] = {}
+        # Bumped on every invalidation so reads that overlapped a write are not stored
+        self._generation = 0
+
+    def set_policy(self, tool_name: str, ttl: float, max_entries: int = 256):
+        """Set the TTL and size bound for one tool."""
+        with self._lock:
+            self.policies[tool_name] = CachePolicy(ttl, max_entries)
+
+    def _policy(self, tool_name: str) -> CachePolicy:
+        return self.policies.get(tool_name, self.default_policy)
+
+    def get(self, tool_name: str, arguments) -> tuple:
+        """
+        Returns:
+            Tuple of (hit, value)
+        """
+        key = canonical_arguments(arguments)
+        with self._lock:
+            entries = self._entries.get(tool_name)
+            entry = entries.get(key) if entries else None
+            if entry is not None and entry.expires_at > time.monotonic():
+                entries.move_to_end(key)
+                self.hits += 1
+                return True, entry.value
+            if entry is not None:
+                del entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, tool_name: str, arguments, value, resource=None, generation: Optional[int] = None):
+        """Store a result, unless the cache was invalidated since `generation`."""
+        policy = self._policy(tool_name)
+        if policy.ttl <= 0 or policy.max_entries <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            key = canonical_arguments(arguments)
+            entries = self._entries.setdefault(tool_name, OrderedDict())
+            entries[key] = _Entry(value, time.monotonic() + policy.ttl, resource)
+            entries.move_to_end(key)
+            while len(entries) > policy.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate_resource(self, resource):
+        """Drop every entry whose result may depend on `resource`."""
+        with self._lock:
+            self._generation += 1
+            for entries in self._entries.values():
+                stale = [key for key, entry in entries.items()
+                         if entry.resource is not None and _covers(entry.resource, resource)]
+                for key in stale:
+                    del entries[key]
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def call(self, tool_name: str, func: Callable, arguments):
+        """
+        Run a tool through the cache.
+
+        Read-only tools are served from the cache when possible; mutating
+        tools always run and then invalidate what they touched.
+        """
+        if getattr(func, "read_only", False):
+            hit, value = self.get(tool_name, arguments)
+            if hit:
+                return value
+            with self._lock:
+                generation = self._generation
+            value = func(arguments)
+            if value is not None:
+                self.put(tool_name, arguments, value, resource_key(func, arguments), generation)
+            return value
+
+        try:
+            return func(arguments)
+        finally:
+            changed = resource_key(func, arguments)
+            if changed is None:
+                self.clear()
+            else:
+                self.invalidate_resource(changed)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the number of cached entries."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": sum(len(entries) for entries in self._entries.values())
+            }
+
+
+_default_cache: Optional[ToolResultCache] = None
+_default_lock = threading.Lock()
+
+
+def get_tool_cache() -> ToolResultCache:
+    """Return the process-wide ToolResultCache, creating it on first use."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ToolResultCache()
+        return _default_cache
@@ -0,0 +1,380 @@
+import importlib
+import inspect
+import math
+import re
+import threading
+import typing
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import tool_backends
+
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+}
+
+_SECTION_HEADER = re.compile(r'^[A-Z][A-Za-z ]*:\s*$')
+_ARG_LINE = re.compile(r'^\s*(\w+)(?:\s*\([^)]*\))?:\s*(.*)$')
+_WORD = re.compile(r'[a-z0-9]+')
+
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from get help how i if in into is it "
+    "its me my of on or please quickly some that the then this to use using what when "
+    "which with you your anything else don t assistant".split()
+)
+
+
+def _json_schema(annotation) -> Dict[str, Any]:
+    """Map a Python type annotation to a JSON schema fragment."""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Literal:
+        values = list(typing.get_args(annotation))
+        schema = _json_schema(type(values[0])) if values else {}
+        schema["enum"] = values
+        return schema
+    if origin is typing.Union:
+        # Optional[X] is described as X; the default makes it optional
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return _json_schema(args[0]) if len(args) == 1 else {}
+    if origin in (list, List):
+        args = typing.get_args(annotation)
+        schema = {"type": "array"}
+        if args:
+            schema["items"] = _json_schema(args[0])
+        return schema
+    json_type = _JSON_TYPES.get(origin or annotation)
+    return {"type": json_type} if json_type else {}
+
+
+def _parse_docstring(doc: Optional[str]):
+    """
+    Split a Google-style docstring into its summary and Args descriptions.
+
+    Returns:
+        Tuple of (description, {argument name: description})
+    """
+    if not doc:
+        return "", {}
+    summary: List[str] = []
+    arg_docs: Dict[str, str] = {}
+    section = "summary"
+    current = None
+    arg_indent = None
+    for line in inspect.cleandoc(doc).splitlines():
+        stripped = line.strip()
+        if _SECTION_HEADER.match(line):
+            section = "args" if stripped == "Args:" else "other"
+            current = None
+            continue
+        if section == "summary":
+            if stripped:
+                summary.append(stripped)
+            elif summary:
+                # Only the first paragraph is used as the description
+                section = "body"
+        elif section == "args" and stripped:
+            indent = len(line) - len(line.lstrip())
+            match = _ARG_LINE.match(line)
+            if match and (arg_indent is None or indent <= arg_indent):
+                arg_indent = indent
+                current = match.group(1)
+                arg_docs[current] = match.group(2).strip()
+            elif current:
+                arg_docs[current] += " " + stripped
+    return " ".join(summary), arg_docs
+
+
+def _tokens(text: str) -> set:
+    """Lower-cased word stems used for lexical relevance matching."""
+    tokens = set()
+    for word in _WORD.findall(text.lower()):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return tokens
+
+
+_TRUE = frozenset(("true", "yes", "1"))
+_FALSE = frozenset(("false", "no", "0"))
+
+
+def _coerce(value, schema: Dict[str, Any]):
+    """
+    Convert an argument to its schema type.
+
+    Models often send numbers and booleans as strings (the XML tool call
+    format only has strings), so "3", "2.5" and "false" are accepted.
+
+    Raises:
+        ValueError: If the value cannot be read as the schema type
+    """
+    json_type = schema.get("type")
+    if value is None or json_type not in ("integer", "number", "boolean"):
+        return value
+    if json_type == "boolean":
+        text = str(value).strip().lower()
+        if isinstance(value, bool) or text in _TRUE or text in _FALSE:
+            return value if isinstance(value, bool) else text in _TRUE
+        raise ValueError(f"expected true or false, got {value!r}")
+    expected = "an integer" if json_type == "integer" else "a number"
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"expected {expected}, got {value!r}")
+    try:
+        number = float(value)
+    except (ValueError, OverflowError):
+        raise ValueError(f"expected {expected}, got {value!r}") from None
+    if not math.isfinite(number) or (json_type == "integer" and not number.is_integer()):
+        raise ValueError(f"expected {expected}, got {value!r}")
+    if json_type == "integer":
+        return value if isinstance(value, int) else int(number)
+    return value if isinstance(value, (int, float)) else number
+
+
+class ToolSpec:
+    """A registered tool: its Python function, schema and scheduling traits."""
+
+    def __init__(
+        self,
+        func: Callable,
+        name: str,
+        description: str,
+        parameters: Dict[str, Any],
+        read_only: bool,
+        resource: Optional[Callable[[Dict[str, Any]], Any]],
+        keywords: Sequence[str],
+        backend="inline",
+        timeout: Optional[float] = None,
+        max_result_chars: Optional[int] = None
+    ):
+        self.func = func
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.read_only = read_only
+        self.resource = resource
+        self.keywords = tuple(keywords)
+        # A backend name is looked up per call, so tool_backends.configure_backend() applies
+        self.backend = backend
+        self.timeout = timeout
+        self.max_result_chars = max_result_chars
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": parameters
+            }
+        }
+        self.required = tuple(parameters.get("required", ()))
+        self.properties = parameters.get("properties", {})
+        self.accepted = frozenset(self.properties)
+        # Name and keywords count double against description and parameter words.
+        # Parameter names ("path", "location", ...) are left out: they are too
+        # generic to say whether a tool applies.
+        self.strong_tokens = _tokens(name.replace("_", " ") + " " + " ".join(self.keywords))
+        property_text = " ".join(schema.get('description', '') for schema in self.properties.values())
+        self.weak_tokens = _tokens(description + " " + property_text) - self.strong_tokens
+        self.adapter = self._make_adapter()
+
+    def _make_adapter(self) -> Callable[[Dict[str, Any]], Any]:
+        """Wrap the function in the agent's tool calling convention (one arguments dict)."""
+        spec = self
+
+        def call(arguments):
+            arguments = arguments or {}
+            missing = [name for name in spec.required if arguments.get(name) in (None, "")]
+            if missing:
+                return f"Error: {spec.name} is missing required argument(s): {', '.join(missing)}"
+            kwargs = {}
+            for key, value in arguments.items():
+                if key not in spec.accepted:
+                    continue
+                try:
+                    kwargs[key] = _coerce(value, spec.properties[key])
+                except ValueError as e:
+                    return f"Error: invalid value for {key}: {e}"
+            if spec.backend == "inline":
+                return spec.func(**kwargs)
+            try:
+                return tool_backends.get_backend(spec.backend).run(spec.func, kwargs, spec.timeout)
+            except tool_backends.ToolTimeout:
+                return f"Error: {spec.name} timed out after {spec.timeout}s"
+            except tool_backends.ToolCancelled:
+                raise
+            except tool_backends.ToolError as e:
+                return f"Error: {spec.name} failed: {e}"
+
+        call.__name__ = self.name
+        call.__doc__ = self.func.__doc__
+        call.read_only = self.read_only
+        call.resource = self.resource
+        call.backend = self.backend
+        call.max_result_chars = self.max_result_chars
+        call.spec = self
+        return call
+
+    def score(self, tokens: set) -> int:
+        """Lexical relevance of this tool to a set of query tokens."""
+        return 2 * len(self.strong_tokens & tokens) + len(self.weak_tokens & tokens)
+
+
+class ToolRegistry:
+    """
+    Holds tools defined with the @tool decorator.
+
+    The schema sent to the model is generated from each function's signature,
+    type hints and docstring, so a tool is only defined once. Modules that
+    define tools can be registered by name and are imported the first time
+    the registry is queried.
+    """
+
+    def __init__(self, modules: Iterable[str] = ()):
+        self._specs: Dict[str, ToolSpec] = {}
+        self._pending_modules: List[str] = list(modules)
+        self._lock = threading.RLock()
+        self._schema_lists: Dict[tuple, List[Dict[str, Any]]] = {}
+
+    def add_module(self, module_name: str):
+        """Register a module of tools to import lazily."""
+        with self._lock:
+            self._pending_modules.append(module_name)
+
+    def _load(self):
+        with self._lock:
+            while self._pending_modules:
+                importlib.import_module(self._pending_modules.pop(0))
+
+    def tool(
+        self,
+        func: Optional[Callable] = None,
+        *,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        read_only: bool = False,
+        resource: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        keywords: Sequence[str] = (),
+        backend="inline",
+        timeout: Optional[float] = None,
+        max_result_chars: Optional[int] = None
+    ):
+        """
+        Decorator registering a function as a tool.
+
+        Args:
+            name: Tool name (defaults to the function name)
+            description: Tool description (defaults to the docstring summary)
+            read_only: True if the tool has no side effects (see tool_runner.tool_traits)
+            resource: Function mapping call arguments to the resource the tool touches
+            keywords: Extra words that make the tool relevant to a request
+            backend: Where the tool runs: "inline" (the calling thread), "thread",
+                "process" or "subprocess", or a tool_backends backend instance
+            timeout: Seconds after which the call is abandoned and reported to the
+                model as an error (not enforced by the inline backend)
+            max_result_chars: Longest result the agent puts into the conversation
+                (see tool_runner.tool_traits)
+
+        Returns:
+            The undecorated function, so it can still be called directly
+        """
+        def decorator(func):
+            self.register(func, name=name, description=description, read_only=read_only,
+                          resource=resource, keywords=keywords, backend=backend, timeout=timeout,
+                          max_result_chars=max_result_chars)
+            return func
+        return decorator(func) if func is not None else decorator
+
+    def register(self, func: Callable, name: Optional[str] = None, description: Optional[str] = None,
+                 read_only: bool = False, resource=None, keywords: Sequence[str] = (),
+                 backend="inline", timeout: Optional[float] = None,
+                 max_result_chars: Optional[int] = None) -> ToolSpec:
+        """Register a function as a tool and return its spec."""
+        doc_description, arg_docs = _parse_docstring(func.__doc__)
+        hints = typing.get_type_hints(func)
+        properties = {}
+        required = []
+        for param in inspect.signature(func).parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            schema = _json_schema(hints.get(param.name, str))
+            if param.name in arg_docs:
+                schema["description"] = arg_docs[param.name]
+            properties[param.name] = schema
+            if param.default is param.empty:
+                required.append(param.name)
+        parameters = {"type": "object", "properties": properties, "required": required}
+
+        if isinstance(backend, str) and backend not in ("inline", "thread", "process", "subprocess"):
+            raise ValueError(f"Unknown tool backend: {backend!r}")
+        spec = ToolSpec(func, name or func.__name__, description or doc_description,
+                        parameters, read_only, resource, keywords, backend, timeout, max_result_chars)
+        with self._lock:
+            self._specs[spec.name] = spec
+            self._schema_lists.clear()
+        return spec
+
+    def specs(self) -> List[ToolSpec]:
+        """Return every registered tool spec, loading pending modules first."""
+        self._load()
+        with self._lock:
+            return list(self._specs.values())
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        self._load()
+        return self._specs.get(name)
+
+    def schemas(self, names: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Return tool schemas in the format the chat completions API expects.
+
+        The same list object is returned for the same selection, so agents
+        using it share compiled request templates.
+        """
+        self._load()
+        with self._lock:
+            key = tuple(names) if names is not None else tuple(self._specs)
+            schemas = self._schema_lists.get(key)
+            if schemas is None:
+                schemas = self._schema_lists[key] = [self._specs[name].schema for name in key if name in self._specs]
+            return schemas
+
+    def funcs(self) -> Dict[str, Callable[[Dict[str, Any]], Any]]:
+        """Return {name: callable(arguments)} for every registered tool."""
+        return {spec.name: spec.adapter for spec in self.specs()}
+
+    def select(self, text: str, max_tools: Optional[int] = None, min_score: int = 2) -> List[Dict[str, Any]]:
+        """
+        Return the schemas of the tools that plausibly apply to `text`.
+
+        Tools are ranked by lexical overlap between the text and each tool's
+        name, keywords, description and parameter descriptions. A name or
+        keyword match scores 2 and a description match 1, so by default a tool
+        needs a name or keyword match, or two description words. If no tool
+        reaches `min_score`, every tool is returned so the model is never left
+        without the one it needs.
+        """
+        tokens = _tokens(text)
+        specs = self.specs()
+        scored = [(spec.score(tokens), index, spec) for index, spec in enumerate(specs)]
+        relevant = [entry for entry in scored if entry[0] >= min_score]
+        if not relevant:
+            return self.schemas()
+        relevant.sort(key=lambda entry: (-entry[0], entry[1]))
+        if max_tools is not None:
+            relevant = relevant[:max_tools]
+        # Keep registration order so equal selections give the same list
+        names = [spec.name for _, _, spec in sorted(relevant, key=lambda entry: entry[1])]
+        return self.schemas(names)
+
+    def selector(self, max_tools: Optional[int] = None, min_score: int = 2) -> Callable[[str], List[Dict[str, Any]]]:
+        """Return a function mapping request text to a tool subset, for Agent(tool_selector=...)."""
+        return lambda text: self.select(text, max_tools=max_tools, min_score=min_score)
+
+
+default_registry = ToolRegistry(modules=["tools"])
+tool = default_registry.tool
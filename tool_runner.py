@@ -0,0 +1,275 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import tool_backends
+
+# Lane key shared by mutating tools that don't name the resource they touch
+_SERIAL = object()
+
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def tool_traits(read_only: bool = False, resource: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                max_result_chars: Optional[int] = None):
+    """
+    Declare how a tool function may be scheduled alongside other calls.
+
+    Args:
+        read_only: True if the tool has no side effects and may run
+            concurrently with any other call in the same turn
+        resource: Function mapping the call arguments to the resource the
+            tool touches (e.g. a file path). Calls that share a resource with
+            a mutating call run one after another in their original order.
+        max_result_chars: Longest result the agent puts into the conversation;
+            longer results are truncated (overrides the agent's default)
+    """
+    def decorator(func):
+        func.read_only = read_only
+        func.resource = resource
+        func.max_result_chars = max_result_chars
+        return func
+    return decorator
+
+
+def _get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=32, thread_name_prefix="tool"
+            )
+        return _executor
+
+
+def resource_key(func, arguments):
+    """Return the resource a tool call touches, as declared with tool_traits."""
+    resource = getattr(func, "resource", None)
+    if resource is None:
+        return None
+    try:
+        return resource(arguments or {})
+    except Exception:
+        return None
+
+
+def plan_lanes(tool_calls: List[Dict[str, Any]], tool_funcs: Dict[str, Callable]) -> List[List[int]]:
+    """
+    Split a turn's tool calls into lanes of call indices.
+
+    Calls within a lane run sequentially in their original order; lanes run
+    concurrently. Read-only calls get a lane of their own unless they touch a
+    resource that a mutating call in the same turn also touches. Tools that
+    don't declare traits are treated as mutating.
+    """
+    keys = []
+    mutating = []
+    for call in tool_calls:
+        func = tool_funcs.get(call['name'])
+        read_only = getattr(func, "read_only", False)
+        key = resource_key(func, call['arguments'])
+        if not read_only and key is None:
+            key = _SERIAL
+        keys.append(key)
+        mutating.append(not read_only)
+
+    conflicted = {key for key, is_mutating in zip(keys, mutating) if is_mutating}
+
+    lanes: List[List[int]] = []
+    lane_by_key: Dict[Any, List[int]] = {}
+    for index, key in enumerate(keys):
+        if key is not None and key in conflicted:
+            lane = lane_by_key.get(key)
+            if lane is None:
+                lane = lane_by_key[key] = []
+                lanes.append(lane)
+            lane.append(index)
+        else:
+            lanes.append([index])
+    return lanes
+
+
+def execute_tool_calls(
+    tool_calls: List[Dict[str, Any]],
+    execute: Callable[[str, Dict[str, Any]], Any],
+    tool_funcs: Dict[str, Callable]
+) -> List[Any]:
+    """
+    Execute a turn's tool calls on the shared tool thread pool.
+
+    Args:
+        tool_calls: Parsed tool calls with 'name' and 'arguments' keys
+        execute: Function called as execute(name, arguments)
+        tool_funcs: Tool functions, consulted for their declared traits
+
+    Returns:
+        Results in the same order as tool_calls
+    """
+    results: List[Any] = [None] * len(tool_calls)
+
+    def run_lane(lane):
+        for index in lane:
+            call = tool_calls[index]
+            results[index] = execute(call['name'], call['arguments'])
+
+    lanes = plan_lanes(tool_calls, tool_funcs)
+    if len(lanes) <= 1:
+        for lane in lanes:
+            run_lane(lane)
+        return results
+
+    executor = _get_executor()
+    futures = [executor.submit(run_lane, lane) for lane in lanes[1:]]
+    # The calling thread takes the first lane instead of idling
+    try:
+        run_lane(lanes[0])
+    finally:
+        concurrent.futures.wait(futures)
+    for future in futures:
+        future.result()
+    return results
+
+
+async def aexecute_tool_calls(
+    tool_calls: List[Dict[str, Any]],
+    execute: Callable[[str, Dict[str, Any]], Any],
+    tool_funcs: Dict[str, Callable]
+) -> List[Any]:
+    """
+    Async version of execute_tool_calls(); `execute` is a coroutine function.
+    """
+    results: List[Any] = [None] * len(tool_calls)
+
+    async def run_lane(lane):
+        for index in lane:
+            call = tool_calls[index]
+            results[index] = await execute(call['name'], call['arguments'])
+
+    await asyncio.gather(*(run_lane(lane) for lane in plan_lanes(tool_calls, tool_funcs)))
+    return results
+
+
+class _ChainState:
+    """Futures/tasks recently scheduled against one resource key."""
+
+    def __init__(self):
+        self.writer = None
+        self.readers = []
+
+
+def _dependencies(chains: Dict[Any, _ChainState], func, arguments, parallel: bool):
+    """
+    Work out which earlier calls a newly dispatched call has to wait for.
+
+    Returns:
+        Tuple of (dependencies, register) where register(handle) records the
+        new call's future or task against its resource key
+    """
+    read_only = getattr(func, "read_only", False) if parallel else False
+    key = resource_key(func, arguments) if parallel else _SERIAL
+    if key is None and not read_only:
+        key = _SERIAL
+    if key is None:
+        return [], lambda handle: None
+
+    state = chains.setdefault(key, _ChainState())
+    if read_only:
+        dependencies = [state.writer] if state.writer is not None else []
+    else:
+        dependencies = ([state.writer] if state.writer is not None else []) + state.readers
+
+    def register(handle):
+        if read_only:
+            state.readers.append(handle)
+        else:
+            state.writer = handle
+            state.readers = []
+    return dependencies, register
+
+
+class StreamingDispatcher:
+    """
+    Starts tool calls one at a time as they finish streaming in.
+
+    Each call starts immediately on the shared tool thread pool unless it has
+    to wait for an earlier call on the same resource, following the same
+    rules as plan_lanes().
+    """
+
+    def __init__(self, execute: Callable[[str, Dict[str, Any]], Any], tool_funcs: Dict[str, Callable], parallel: bool = True):
+        self._execute = execute
+        self._tool_funcs = tool_funcs
+        self._parallel = parallel
+        self._chains: Dict[Any, _ChainState] = {}
+        self._futures: List[concurrent.futures.Future] = []
+        self._cancelled = threading.Event()
+
+    def submit(self, call: Dict[str, Any]):
+        """Schedule a call; results are reported in submission order."""
+        func = self._tool_funcs.get(call['name'])
+        dependencies, register = _dependencies(self._chains, func, call['arguments'], self._parallel)
+
+        def run():
+            token = tool_backends.cancel_event.set(self._cancelled)
+            try:
+                # Dependencies were submitted earlier, so they are already running
+                concurrent.futures.wait(dependencies)
+                if self._cancelled.is_set():
+                    raise tool_backends.ToolCancelled("Cancelled")
+                return self._execute(call['name'], call['arguments'])
+            finally:
+                tool_backends.cancel_event.reset(token)
+
+        future = _get_executor().submit(run)
+        register(future)
+        self._futures.append(future)
+
+    def results(self) -> List[Any]:
+        """Wait for every submitted call and return results in submission order."""
+        return [future.result() for future in self._futures]
+
+    def cancel(self):
+        """
+        Cancel calls that haven't finished (e.g. when the stream fails): queued
+        calls and calls waiting on a dependency never start, and running calls
+        on a non-inline backend are cancelled through tool_backends.cancel_event.
+        """
+        self._cancelled.set()
+        for future in self._futures:
+            future.cancel()
+
+
+class AsyncStreamingDispatcher:
+    """Async version of StreamingDispatcher; `execute` is a coroutine function."""
+
+    def __init__(self, execute: Callable[[str, Dict[str, Any]], Any], tool_funcs: Dict[str, Callable], parallel: bool = True):
+        self._execute = execute
+        self._tool_funcs = tool_funcs
+        self._parallel = parallel
+        self._chains: Dict[Any, _ChainState] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def submit(self, call: Dict[str, Any]):
+        """Schedule a call; results are reported in submission order."""
+        func = self._tool_funcs.get(call['name'])
+        dependencies, register = _dependencies(self._chains, func, call['arguments'], self._parallel)
+
+        async def run():
+            if dependencies:
+                await asyncio.wait(dependencies)
+            return await self._execute(call['name'], call['arguments'])
+
+        task = asyncio.ensure_future(run())
+        register(task)
+        self._tasks.append(task)
+
+    async def results(self) -> List[Any]:
+        """Wait for every submitted call and return results in submission order."""
+        return [await task for task in self._tasks]
+
+    def cancel(self):
+        """Cancel calls that haven't finished (e.g. when the stream fails)."""
+        for task in self._tasks:
+            task.cancel()
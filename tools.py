@@ -1,60 +1,341 @@
+from collections import OrderedDict
+from datetime import datetime
 from pathlib import Path
+from typing import Literal, Optional
+import bisect
+import fnmatch
+import itertools
 import json
+import mmap
 import os
+import threading
+import time
+from tool_registry import default_registry, tool
 
-def get_weather(arguments):
-    if not "location" in arguments and not "unit" in arguments:
-        print("Missing required arguments")
-        return
-    location = arguments.get("location")
-    unit = arguments.get("unit")
+def _file_path(arguments):
+    """Resource key for tools addressing a file by filename and extension"""
+    return os.path.abspath(f"{arguments.get('filename')}.{arguments.get('extension')}")
 
+def _dir_path(arguments):
+    """Resource key for tools addressing a directory"""
+    path = (arguments.get("path") or ".").strip() or "."
+    return os.path.abspath(path)
+
+@tool(read_only=True, keywords=("weather", "temperature", "forecast", "rain", "sunny", "climate"))
+def get_weather(location: str, unit: Literal["celsius", "fahrenheit"] = "fahrenheit"):
+    """
+    Get current weather for a location
+
+    Args:
+        location: City and country, e.g. 'Paris, France'
+        unit: Temperature unit
+    """
     print(f"Fetching weather for {location}...")
 
     temp = "22°C" if unit == "celsius" else "72°F"
     return f"Weather in {location}: Clear skies, {temp}, light breeze"
 
-def list_files(arguments):  
-    path = arguments.get("path", ".")
+class _ListingCache:
+    """
+    Sorted directory listings keyed by absolute path, shared by every list_files call.
+
+    A listing is reused while the directory's mtime is unchanged. Adding,
+    removing or renaming an entry updates the mtime; a listing taken within
+    a second of the last change is not trusted, since a second change in the
+    same mtime tick would go unnoticed.
+    """
+
+    _RACY_NS = 1_000_000_000
+
+    def __init__(self, max_directories: int = 1024):
+        self.max_directories = max_directories
+        self.hits = 0
+        self.misses = 0
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def entries(self, directory):
+        """Return [(name, is_dir, is_symlink)] for `directory`, sorted by name."""
+        mtime_ns = os.stat(directory).st_mtime_ns
+        with self._lock:
+            cached = self._listings.get(directory)
+            if cached is not None and cached[0] == mtime_ns and cached[1] - mtime_ns > self._RACY_NS:
+                self._listings.move_to_end(directory)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+        listed_ns = time.time_ns()
+        with os.scandir(directory) as scan:
+            entries = sorted((entry.name, entry.is_dir(), entry.is_symlink()) for entry in scan)
+        with self._lock:
+            self._listings[directory] = (mtime_ns, listed_ns, entries)
+            self._listings.move_to_end(directory)
+            while len(self._listings) > self.max_directories:
+                self._listings.popitem(last=False)
+        return entries
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+
+listing_cache = _ListingCache()
+
+def _walk(directory, parts, depth, cursor):
+    """
+    Yield (relative parts, is_dir) depth-first in name order, starting after `cursor`.
+
+    Depth-first name order is the tuple order of the path parts, so whole
+    subtrees before the cursor are skipped without being listed.
+    """
+    entries = listing_cache.entries(directory)
+    first = bisect.bisect_left(entries, (cursor[len(parts)],)) if cursor is not None else 0
+    for name, is_dir, is_symlink in itertools.islice(entries, first, None):
+        key = parts + (name,)
+        on_cursor_path = cursor is not None and cursor[:len(key)] == key
+        if cursor is not None and key < cursor and not on_cursor_path:
+            continue
+        if cursor is None or key > cursor:
+            yield key, is_dir
+        # Symlinked directories are listed but not followed, to avoid cycles
+        if is_dir and not is_symlink and depth > 0:
+            yield from _walk(os.path.join(directory, name), key, depth - 1, cursor if on_cursor_path and len(cursor) > len(key) else None)
+
+def _describe(directory, relative, is_dir):
+    """One listing line with type, size and modification time"""
+    try:
+        info = os.stat(os.path.join(directory, relative))
+    except OSError:
+        return f"{relative}  (unavailable)"
+    modified = datetime.fromtimestamp(info.st_mtime).strftime("%Y-%m-%d %H:%M")
+    if is_dir:
+        return f"{relative}/  directory  {modified}"
+    return f"{relative}  {info.st_size} bytes  {modified}"
+
+# Ceiling on limit, so one call can't put a whole large tree into the conversation
+_LIST_LIMIT = 1000
+
+@tool(read_only=True, resource=_dir_path, keywords=("directory", "folder", "ls", "dir", "contents", "find", "glob"))
+def list_files(
+    path: str = ".",
+    pattern: Optional[str] = None,
+    depth: int = 0,
+    kind: Literal["all", "files", "directories"] = "all",
+    details: bool = False,
+    limit: int = 200,
+    cursor: Optional[str] = None
+):
+    """
+    List files and directories in a specified path
+
+    Args:
+        path: Directory path to list files from
+        pattern: Glob pattern to match names against, e.g. '*.py' (a pattern containing '/' matches the relative path)
+        depth: How many levels of subdirectories to descend into (0 lists only this directory)
+        kind: Which entries to include
+        details: Include type, size and modification time for each entry
+        limit: Most entries to return in one call (at most 1000)
+        cursor: Continue a previous listing after this entry (use the cursor given in its result)
+    """
     if path == " " or path == "":
         path = "."
     if not os.path.exists(path):
         return f"Error: Path '{path}' does not exist"
     if not os.path.isdir(path):
         return f"Error: '{path}' is not a directory"
-    files = os.listdir(path)
-    result = f"Contents of '{path}':\n" + "\n".join(files)
+    if limit < 1:
+        return f"Error: limit must be positive, got {limit}"
+    limit = min(limit, _LIST_LIMIT)
+    directory = os.path.abspath(path)
+    start = tuple(cursor.strip("/").split("/")) if cursor else None
+    lines = []
+    last = None
+    more = False
+    for parts, is_dir in _walk(directory, (), max(depth, 0), start):
+        if kind == "files" and is_dir or kind == "directories" and not is_dir:
+            continue
+        relative = "/".join(parts)
+        if pattern and not fnmatch.fnmatch(relative if "/" in pattern else parts[-1], pattern):
+            continue
+        if len(lines) == limit:
+            more = True
+            break
+        lines.append(_describe(directory, relative, is_dir) if details else relative + ("/" if is_dir else ""))
+        last = relative
+    result = f"Contents of '{path}':\n" + ("\n".join(lines) if lines else "(no matching entries)")
+    if more and last is not None:
+        result += f"\n[More entries; continue with cursor='{last}']"
     return result
 
-def save_file(arguments):
-    if not "filename" in arguments and not "extension" in arguments and not "content" in arguments:
-        print("Missing required arguments")
-        return
-    filename = arguments.get("filename")
-    extension = arguments.get("extension")
-    content = arguments.get("content")
+@tool(resource=_file_path, keywords=("write", "create", "store", "save", "append"))
+def save_file(filename: str, extension: str, content: str, mode: Literal["overwrite", "append"] = "overwrite"):
+    """
+    Save content to a file with specified filename and extension
 
+    Args:
+        filename: Name of the file (without extension)
+        extension: File extension (e.g., 'txt', 'py', 'json', 'md')
+        content: Content to write to the file
+        mode: 'overwrite' replaces the file, 'append' adds content to its end
+    """
     full_filename = f"{filename}.{extension}"
     try:
-        with open(full_filename, 'w', encoding='utf-8') as f:
-            f.write(content)
+        if mode == "append":
+            with open(full_filename, 'a', encoding='utf-8') as f:
+                f.write(content)
+            return f"Successfully appended to '{full_filename}' ({os.path.getsize(full_filename)} bytes total)"
+        _atomic_write(full_filename, content)
         result = f"Successfully saved '{full_filename}'"
     except Exception as e:
         result = f"Error saving file: {str(e)}"
     return result
 
-def read_file(arguments):
-    if not "filename" in arguments and not "extension" in arguments:
-        print("Missing required arguments")
-        return
-    filename = arguments.get("filename")
-    extension = arguments.get("extension")
+def _create_temp(path):
+    """Create a new temporary file next to `path`; the kernel applies the umask to its 0o666 mode"""
+    directory, name = os.path.split(os.path.abspath(path))
+    while True:
+        temp_path = os.path.join(directory, f".{name}.{os.urandom(4).hex()}.tmp")
+        try:
+            return os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+def _atomic_write(path, content):
+    """Write to a temporary file next to `path` and rename it over `path`, so readers never see a partial file"""
+    fd, temp_path = _create_temp(path)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass  # a new file keeps the mode it was created with
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+# Files above this size are read through mmap instead of into memory
+_MMAP_THRESHOLD = 1024 * 1024
+_CHUNK = 1024 * 1024
+# Ceiling on max_bytes, so one call can't put a whole large file into the conversation
+_READ_LIMIT = 64 * 1024
+
+def _line_start(data, line):
+    """Byte offset where 1-based `line` starts (len(data) if the file is shorter)"""
+    remaining = line - 1
+    position = 0
+    size = len(data)
+    while remaining > 0 and position < size:
+        chunk = data[position:position + _CHUNK]
+        newlines = chunk.count(b"\n")
+        if newlines < remaining:
+            remaining -= newlines
+            position += len(chunk)
+            continue
+        for _ in range(remaining):
+            position = data.find(b"\n", position, size) + 1
+        remaining = 0
+    return min(position, size)
 
+def _tail_start(data, lines):
+    """Byte offset where the last `lines` lines start"""
+    end = len(data)
+    if end and data[end - 1:end] == b"\n":
+        end -= 1
+    position = end
+    for _ in range(lines):
+        position = data.rfind(b"\n", 0, position)
+        if position < 0:
+            return 0
+    return position + 1
+
+def _read_range(data, offset, length, start_line, end_line, head, tail, max_bytes):
+    """
+    Pick the byte range to return from `data` (bytes or mmap).
+
+    Returns:
+        Tuple of (start, end, description) where description names the selection
+    """
+    size = len(data)
+    if offset is not None or length is not None:
+        start = min(max(offset or 0, 0), size)
+        end = size if length is None else min(size, start + length)
+        description = None
+    elif start_line is not None or end_line is not None:
+        first = max(start_line or 1, 1)
+        start = _line_start(data, first)
+        end = size if end_line is None else _line_start(data, end_line + 1)
+        description = f"lines {first}-{end_line}" if end_line is not None else f"from line {first}"
+    elif head is not None:
+        start, end = 0, _line_start(data, head + 1)
+        description = f"first {head} lines"
+    elif tail is not None:
+        start, end = _tail_start(data, tail), size
+        description = f"last {tail} lines"
+    else:
+        start, end, description = 0, size, None
+    if end - start > max_bytes:
+        end = start + max_bytes
+        # Prefer to stop at a line boundary so the next page starts on a fresh line
+        newline = data.rfind(b"\n", start, end)
+        if newline > start:
+            end = newline + 1
+    return start, max(start, end), description
+
+@tool(read_only=True, resource=_file_path, keywords=("open", "show", "contents", "txt", "view", "head", "tail", "lines"))
+def read_file(
+    filename: str,
+    extension: str,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+    head: Optional[int] = None,
+    tail: Optional[int] = None,
+    offset: Optional[int] = None,
+    length: Optional[int] = None,
+    max_bytes: int = 16384
+):
+    """
+    Read content from a file with specified filename and extension
+
+    Args:
+        filename: Name of the file (without extension)
+        extension: File extension (e.g., 'txt', 'py', 'json', 'md')
+        start_line: First line to read (1-based)
+        end_line: Last line to read (inclusive)
+        head: Read only the first N lines
+        tail: Read only the last N lines
+        offset: Byte offset to start reading at (use the offset given in a previous result to continue)
+        length: Number of bytes to read
+        max_bytes: Most bytes to return in one call (at most 65536)
+    """
     full_filename = f"{filename}.{extension}"
+    for name, value in (("head", head), ("tail", tail), ("length", length), ("max_bytes", max_bytes)):
+        if value is not None and value <= 0:
+            return f"Error: {name} must be a positive number, got {value}"
+    max_bytes = min(max_bytes, _READ_LIMIT)
     try:
-        with open(full_filename, 'r', encoding='utf-8') as f:
-            content = f.read()
-        result = f"Successfully read '{full_filename}':\n{content}"
+        with open(full_filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= _MMAP_THRESHOLD:
+                # Only the pages in the selected range are read
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    start, end, description = _read_range(data, offset, length, start_line, end_line, head, tail, max_bytes)
+                    chunk = data[start:end]
+            else:
+                data = f.read()
+                start, end, description = _read_range(data, offset, length, start_line, end_line, head, tail, max_bytes)
+                chunk = data[start:end]
+        content = chunk.decode('utf-8', errors='replace')
+        if start == 0 and end == size:
+            return f"Successfully read '{full_filename}':\n{content}"
+        selection = f"{description}, " if description else ""
+        result = f"Successfully read '{full_filename}' ({selection}bytes {start}-{end} of {size}):\n{content}"
+        if end < size:
+            result += f"\n[{size - end} more bytes; continue with offset={end}]"
+        return result
     except FileNotFoundError:
         result = f"Error: File '{full_filename}' not found"
     except Exception as e:
@@ -62,15 +343,18 @@ def read_file(arguments):
     return result
 
 def get_tool_funcs():
-    TOOLS_funcs = {
-        "get_weather": get_weather,
-        "list_files": list_files,
-        "save_file": save_file,
-        "read_file": read_file
-    }
-    return TOOLS_funcs
-
-def get_tools(path="tools.json"):
+    """Return {name: callable(arguments)} for every registered tool"""
+    return default_registry.funcs()
+
+def get_tools(path=None):
+    """
+    Return the tool schemas to send with each request.
+
+    Schemas are generated from the registered functions; pass `path` to load
+    a JSON tools file instead.
+    """
+    if path is None:
+        return default_registry.schemas()
     file_path = Path(path)
-    TOOLS = json.loads(file_path.read_text(encoding='utf-8'))        
-    return TOOLS
\ No newline at end of file
+    TOOLS = json.loads(file_path.read_text(encoding='utf-8'))
+    return TOOLS
@@ -1,3 +1,6 @@
+from pathlib import Path
+import json
+
 def load_tools_from_json(path="tools.json"):
     file_path = Path(path)
     TOOLS = json.loads(file_path.read_text(encoding='utf-8'))
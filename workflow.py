@@ -0,0 +1,125 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List
+
+
+class TaskSkipped(Exception):
+    """A task never ran because a task it depends on failed or was cancelled."""
+
+
+class TaskCancelled(Exception):
+    """A task was cancelled with Workflow.cancel()."""
+
+
+class Workflow:
+    """
+    Runs tasks as a dependency graph on the current event loop.
+
+    Every task whose dependencies have finished runs immediately, so
+    independent branches run concurrently and a downstream task starts the
+    moment its last input is ready. A task that fails (or is cancelled)
+    skips everything downstream of it; unrelated branches keep running.
+    """
+
+    def __init__(self, dependencies: Dict[Hashable, Iterable[Hashable]]):
+        """
+        Args:
+            dependencies: Maps each task id to the ids of the tasks it depends on
+
+        Raises:
+            ValueError: If a dependency is unknown or the graph has a cycle
+        """
+        self.dependencies = {task_id: list(deps) for task_id, deps in dependencies.items()}
+        self.dependents: Dict[Hashable, List[Hashable]] = {task_id: [] for task_id in self.dependencies}
+        for task_id, deps in self.dependencies.items():
+            for dep in deps:
+                if dep not in self.dependencies:
+                    raise ValueError(f"Task {task_id!r} depends on unknown task {dep!r}")
+                self.dependents[dep].append(task_id)
+        self._check_acyclic()
+        self.outcomes: Dict[Hashable, Any] = {}
+        self._running: Dict[Hashable, asyncio.Task] = {}
+
+    def _check_acyclic(self):
+        remaining = {task_id: len(deps) for task_id, deps in self.dependencies.items()}
+        ready = [task_id for task_id, count in remaining.items() if count == 0]
+        while ready:
+            task_id = ready.pop()
+            del remaining[task_id]
+            for dependent in self.dependents[task_id]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if remaining:
+            raise ValueError(f"Dependency cycle among tasks: {sorted(map(repr, remaining))}")
+
+    def downstream(self, task_id: Hashable) -> List[Hashable]:
+        """Every task that depends on `task_id`, directly or transitively."""
+        seen, stack = [], list(self.dependents[task_id])
+        while stack:
+            dependent = stack.pop()
+            if dependent not in seen:
+                seen.append(dependent)
+                stack.extend(self.dependents[dependent])
+        return seen
+
+    def _skip_downstream(self, task_id: Hashable):
+        for dependent in self.downstream(task_id):
+            if dependent not in self.outcomes and dependent not in self._running:
+                self.outcomes[dependent] = TaskSkipped(f"Upstream task {task_id!r} did not complete")
+
+    def cancel(self, task_id: Hashable):
+        """Cancel a task (running or not yet started) and everything downstream of it."""
+        running = self._running.get(task_id)
+        if running is not None:
+            running.cancel()
+        elif task_id not in self.outcomes:
+            self.outcomes[task_id] = TaskCancelled(f"Task {task_id!r} was cancelled")
+            self._skip_downstream(task_id)
+
+    async def run(self, run_task: Callable[[Hashable, Dict[Hashable, Any]], Awaitable[Any]]) -> Dict[Hashable, Any]:
+        """
+        Run every task.
+
+        Args:
+            run_task: Coroutine function called as run_task(task_id, upstream), where
+                upstream maps each dependency's id to its result
+
+        Returns:
+            Dictionary mapping every task id to its result, or to the exception it
+            failed with (TaskSkipped / TaskCancelled for tasks that never finished)
+        """
+        waiting = {task_id: len(deps) for task_id, deps in self.dependencies.items()}
+        # Finished tasks report here, so each completion costs O(1) however many are running
+        finished: asyncio.Queue = asyncio.Queue()
+
+        def start(task_id):
+            upstream = {dep: self.outcomes[dep] for dep in self.dependencies[task_id]}
+            task = self._running[task_id] = asyncio.create_task(run_task(task_id, upstream))
+            task.add_done_callback(lambda _: finished.put_nowait(task_id))
+
+        for task_id, count in waiting.items():
+            if count == 0 and task_id not in self.outcomes:
+                start(task_id)
+
+        try:
+            while self._running:
+                task_id = await finished.get()
+                task = self._running.pop(task_id)
+                if task.cancelled():
+                    self.outcomes[task_id] = TaskCancelled(f"Task {task_id!r} was cancelled")
+                elif task.exception() is not None:
+                    self.outcomes[task_id] = task.exception()
+                else:
+                    self.outcomes[task_id] = task.result()
+                    for dependent in self.dependents[task_id]:
+                        waiting[dependent] -= 1
+                        if waiting[dependent] == 0 and dependent not in self.outcomes:
+                            start(dependent)
+                    continue
+                self._skip_downstream(task_id)
+        finally:
+            # Only non-empty if the run itself was cancelled: don't leave tasks behind
+            for task in self._running.values():
+                task.cancel()
+        return self.outcomes
+
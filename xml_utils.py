@@ -1,10 +1,25 @@
 import re
+from typing import List
+
+FUNCTION_OPEN = '<function='
+FUNCTION_CLOSE = '</function>'
+
+# Sent as `stop` so the server stops decoding once a tool call is closed.
+# The server drops the stop string itself, so the call arrives unterminated
+# and is completed with XmlToolCallParser.close().
+TOOL_CALL_STOP_SEQUENCES = (FUNCTION_CLOSE,)
+
+_PARAMETER_PATTERN = re.compile(r'<parameter=([^>]+)>(.*?)</parameter>', re.DOTALL)
+_FUNCTION_PATTERN = re.compile(r'<function=([^>]+)>(.*?)</function>', re.DOTALL)
+# Parameter left open when generation was cut off
+_TRAILING_PARAMETER_PATTERN = re.compile(r'<parameter=([^>]+)>((?:(?!</parameter>).)*)$', re.DOTALL)
+# Call left open when generation was cut off (e.g. by TOOL_CALL_STOP_SEQUENCES)
+_TRAILING_FUNCTION_PATTERN = re.compile(r'<function=[^>]*>(?:(?!</function>).)*$', re.DOTALL)
 
 def parse_xml_parameters(xml_string: str) -> dict:
     """Parse XML-style function parameters"""
     params = {}
-    pattern = r'<parameter=([^>]+)>(.*?)</parameter>'
-    matches = re.findall(pattern, xml_string, re.DOTALL)
+    matches = _PARAMETER_PATTERN.findall(xml_string)
     for param_name, param_value in matches:
         params[param_name] = param_value.strip()
     return params
@@ -13,8 +28,7 @@ def parse_xml_tool_calls_from_content(content: str) -> list:
     """Parse XML tool calls from content"""
     tool_calls = []
     # Pattern to match <function=name>...</function>
-    function_pattern = r'<function=([^>]+)>(.*?)</function>'
-    function_matches = re.findall(function_pattern, content, re.DOTALL)
+    function_matches = _FUNCTION_PATTERN.findall(content)
     for func_name, func_content in function_matches:
         # Parse parameters within this function call
         params = parse_xml_parameters(func_content)
@@ -24,6 +38,96 @@ def parse_xml_tool_calls_from_content(content: str) -> list:
         })
     return tool_calls
 
+def strip_xml_tool_calls(content: str) -> str:
+    """Content with its XML tool calls (including one cut off at the end) removed"""
+    content = _FUNCTION_PATTERN.sub('', content)
+    return _TRAILING_FUNCTION_PATTERN.sub('', content).strip()
+
 def contains_xml_tool_call(content: str) -> bool:
     """Check if content contains XML tool call format"""
-    return '<function=' in content and '</function>' in content
\ No newline at end of file
+    return FUNCTION_OPEN in content and FUNCTION_CLOSE in content
+
+_TEXT, _NAME, _BODY = range(3)
+
+class XmlToolCallParser:
+    """
+    Incremental parser for `<function=...><parameter=...>` tool calls.
+
+    Feed it response text in chunks as they stream in; each call is returned
+    from feed() as soon as its closing `</function>` tag arrives.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._state = _TEXT
+        self._name = ""
+        # Offset in the buffer before which the current marker can't start
+        self._scan = 0
+
+    def _find(self, marker: str) -> int:
+        index = self._buffer.find(marker, self._scan)
+        if index < 0:
+            # Keep the tail that could be the start of a split marker
+            self._scan = max(0, len(self._buffer) - len(marker) + 1)
+        return index
+
+    def _consume(self, count: int):
+        self._buffer = self._buffer[count:]
+        self._scan = 0
+
+    def feed(self, chunk: str) -> List[dict]:
+        """
+        Add a chunk of response text.
+
+        Returns:
+            Tool calls (dicts with 'name' and 'arguments') completed by this chunk
+        """
+        self._buffer += chunk
+        completed = []
+        while True:
+            if self._state == _TEXT:
+                index = self._find(FUNCTION_OPEN)
+                if index < 0:
+                    # Plain text before any call is never needed again
+                    self._consume(self._scan)
+                    break
+                self._consume(index + len(FUNCTION_OPEN))
+                self._state = _NAME
+            elif self._state == _NAME:
+                index = self._find('>')
+                if index < 0:
+                    break
+                self._name = self._buffer[:index].strip()
+                self._consume(index + 1)
+                self._state = _BODY
+            else:
+                index = self._find(FUNCTION_CLOSE)
+                if index < 0:
+                    break
+                completed.append(self._make_call(self._buffer[:index]))
+                self._consume(index + len(FUNCTION_CLOSE))
+                self._state = _TEXT
+        return completed
+
+    def _make_call(self, body: str, truncated: bool = False) -> dict:
+        params = parse_xml_parameters(body)
+        if truncated:
+            trailing = _TRAILING_PARAMETER_PATTERN.search(body)
+            if trailing and trailing.group(1) not in params:
+                params[trailing.group(1)] = trailing.group(2).strip()
+        return {'name': self._name, 'arguments': params}
+
+    def close(self) -> List[dict]:
+        """
+        Finish a response that was cut off by a stop sequence.
+
+        Returns:
+            The call still open at the end of the text, if any
+        """
+        completed = []
+        if self._state == _BODY:
+            completed.append(self._make_call(self._buffer, truncated=True))
+        self._buffer = ""
+        self._state = _TEXT
+        self._scan = 0
+        return completed